@@ -0,0 +1,49 @@
+"""Shared helpers for benchmark scripts."""
+
+import os
+import sys
+import time
+import platform
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_stats(timings):
+    """Return min/median/mean/max statistics (in ms) of timings (in s)."""
+    timings = [x * 1000.0 for x in timings]
+    return {
+        "runs": len(timings),
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "max_ms": round(max(timings), 3)
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Call func(*args, **kwargs) and return (elapsed seconds, result)."""
+    before = time.perf_counter()
+    res = func(*args, **kwargs)
+    return (time.perf_counter() - before, res)
+
+
+def get_mfplugin_version():
+    try:
+        from importlib.metadata import version
+        return version("mfplugin")
+    except Exception:
+        return None
+
+
+def get_meta(**params):
+    """Return the meta informations of a benchmark result."""
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "mfplugin_version": get_mfplugin_version(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params
+    }
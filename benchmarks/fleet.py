@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""Synthetic plugin fleet generator (for benchmarks).
+
+Plugins are named plugin0000, plugin0001... Each one has:
+
+- a config.ini with some custom keys and APPS app sections
+- FILES data files of FILE_SIZE bytes (in a data/ subdirectory)
+- a .layerapi2_dependencies file: plugins are grouped in chains of DEPTH
+  plugins (each plugin of a chain depends on the previous one)
+- (optional) a configuration override file in
+  $MFMODULE_RUNTIME_HOME/config/plugins/
+
+"""
+
+import os
+import argparse
+
+MFMODULE_LOWERCASE = os.environ.get("MFMODULE_LOWERCASE", "generic")
+
+CONFIG_TEMPLATE = """[general]
+_version=1.0.%(index)i
+_release=1
+_summary=synthetic plugin %(name)s
+_license=BSD
+_url=http://localhost
+_maintainer=bench
+_vendor=bench
+
+[custom]
+%(custom)s
+"""
+APP_TEMPLATE = """
+[app_%(app)s]
+_cmd_and_args=sleep 3600
+numprocesses=%(numprocesses)i
+graceful_timeout=5
+"""
+OVERRIDE_TEMPLATE = """[custom]
+key0=overridden
+
+[app_app0]
+numprocesses=2
+"""
+
+
+def get_plugin_name(index):
+    return "plugin%04i" % index
+
+
+def get_plugin_label(name):
+    return "plugin_%s@%s" % (name, MFMODULE_LOWERCASE)
+
+
+def write_file(path, content, mode="w"):
+    with open(path, mode) as f:
+        f.write(content)
+
+
+def generate_plugin(directory, index, apps=1, files=0, file_size=1024,
+                    keys=10, dependencies=()):
+    """Generate a synthetic plugin home in directory.
+
+    Args:
+        directory (string): the directory where to create the plugin home.
+        index (int): the plugin index (used to build its name).
+        apps (int): number of app sections.
+        files (int): number of data files.
+        file_size (int): size of each data file (in bytes).
+        keys (int): number of custom keys.
+        dependencies (list): list of plugin names this plugin depends on.
+
+    Returns:
+        (string): the plugin home.
+
+    """
+    name = get_plugin_name(index)
+    home = os.path.join(directory, name)
+    os.makedirs(os.path.join(home, "data"))
+    custom = "\n".join("key%i=value%i" % (x, x) for x in range(0, keys))
+    config = CONFIG_TEMPLATE % {"index": index, "name": name,
+                                "custom": custom}
+    for app in range(0, apps):
+        config = config + APP_TEMPLATE % {"app": "app%i" % app,
+                                          "numprocesses": app % 4 + 1}
+    write_file(os.path.join(home, "config.ini"), config)
+    write_file(os.path.join(home, ".layerapi2_label"),
+               get_plugin_label(name) + "\n")
+    write_file(os.path.join(home, ".plugin_format_version"), "1.0.0\n")
+    write_file(os.path.join(home, ".releaseignore"), "*.tobeignored\n")
+    write_file(os.path.join(home, "build.tobeignored"), "ignored\n")
+    if dependencies:
+        write_file(os.path.join(home, ".layerapi2_dependencies"),
+                   "".join("%s\n" % get_plugin_label(x)
+                           for x in dependencies))
+    for i in range(0, files):
+        write_file(os.path.join(home, "data", "file%04i.dat" % i),
+                   os.urandom(file_size), "wb")
+    return home
+
+
+def write_override(runtime_home, name):
+    """Write a configuration override file for a plugin.
+
+    Args:
+        runtime_home (string): the MFMODULE_RUNTIME_HOME value.
+        name (string): the plugin name.
+
+    Returns:
+        (string): the override file path.
+
+    """
+    directory = os.path.join(runtime_home, "config", "plugins")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "%s.ini" % name)
+    write_file(path, OVERRIDE_TEMPLATE)
+    return path
+
+
+def generate_fleet(directory, plugins=10, apps=1, files=0, file_size=1024,
+                   keys=10, depth=1, overrides=0, runtime_home=None):
+    """Generate a synthetic plugin fleet in directory.
+
+    Args:
+        directory (string): the directory where to create plugin homes.
+        plugins (int): number of plugins.
+        apps (int): number of app sections per plugin.
+        files (int): number of data files per plugin.
+        file_size (int): size of each data file (in bytes).
+        keys (int): number of custom keys per plugin.
+        depth (int): length of dependency chains (1 means no dependency).
+        overrides (int): number of plugins with a configuration override
+            file (the first ones).
+        runtime_home (string): MFMODULE_RUNTIME_HOME value (used to write
+            override files, default to MFMODULE_RUNTIME_HOME env var).
+
+    Returns:
+        (list): list of plugin homes.
+
+    """
+    if runtime_home is None:
+        runtime_home = os.environ.get("MFMODULE_RUNTIME_HOME", "/tmp")
+    os.makedirs(directory, exist_ok=True)
+    homes = []
+    for index in range(0, plugins):
+        dependencies = []
+        if depth > 1 and index % depth != 0:
+            dependencies = [get_plugin_name(index - 1)]
+        homes.append(generate_plugin(directory, index, apps=apps,
+                                     files=files, file_size=file_size,
+                                     keys=keys, dependencies=dependencies))
+        if index < overrides:
+            write_override(runtime_home, get_plugin_name(index))
+    return homes
+
+
+def add_fleet_arguments(parser):
+    parser.add_argument("--plugins", type=int, default=20,
+                        help="number of plugins")
+    parser.add_argument("--apps", type=int, default=2,
+                        help="number of apps per plugin")
+    parser.add_argument("--files", type=int, default=20,
+                        help="number of data files per plugin")
+    parser.add_argument("--file-size", type=int, default=4096,
+                        help="size of each data file (in bytes)")
+    parser.add_argument("--keys", type=int, default=10,
+                        help="number of custom configuration keys per "
+                        "plugin")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="length of dependency chains (1 means no "
+                        "dependency)")
+    parser.add_argument("--overrides", type=int, default=5,
+                        help="number of plugins with a configuration "
+                        "override file")
+
+
+def get_fleet_kwargs(args):
+    return {
+        "plugins": args.plugins,
+        "apps": args.apps,
+        "files": args.files,
+        "file_size": args.file_size,
+        "keys": args.keys,
+        "depth": args.depth,
+        "overrides": args.overrides
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="synthetic plugin fleet "
+                                     "generator")
+    parser.add_argument("directory", type=str,
+                        help="directory where to create plugin homes")
+    add_fleet_arguments(parser)
+    args = parser.parse_args()
+    for home in generate_fleet(args.directory, **get_fleet_kwargs(args)):
+        print(home)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+"""Benchmark mfplugin hot paths on a synthetic plugin fleet.
+
+A synthetic fleet (see fleet.py) is generated in a temporary directory
+(which is also used as MFMODULE_RUNTIME_HOME for configuration overrides),
+then following operations are timed:
+
+- build: Plugin.build() (each plugin)
+- install_plugin: PluginsManager.install_plugin() (each plugin)
+- load_cold_registry: PluginsManager.load() + plugins list (after a
+  registry removal)
+- load: PluginsManager.load() + plugins list (valid registry)
+- load_full: PluginsManager.load_full()
+- get_plugin: PluginsManager.get_plugin() (each plugin)
+- attribute_access: attribute reads (ns per read) on loaded plugins,
+  compared to a plain instance attribute read ("baseline")
+- command_memory: memory (bytes per object) of built and duplicated
+  commands (apps)
+- snapshot_dump_<fmt>: PluginsManager.dump_snapshot() (json / marshal)
+- snapshot_load_<fmt>: PluginsManager.load_snapshot() (json / marshal)
+- get_plugin_env_dict_cold: get_plugin_env_dict() without env cache
+- get_plugin_env_dict_warm: get_plugin_env_dict() with a warm env cache
+- plugin_wrapper: plugin_wrapper --bash-cmds subprocess (warm env cache)
+- uninstall_plugin: PluginsManager.uninstall_plugin() (each plugin)
+
+Results are written as json (see --output) so they can be compared between
+releases.
+
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import timeit
+import tempfile
+import tracemalloc
+import subprocess
+from common import ROOT, get_stats, get_meta, timed
+from fleet import generate_fleet, add_fleet_arguments, get_fleet_kwargs
+
+
+def setup_env(tmpdir):
+    # must be done before any mfplugin import (module level constants)
+    runtime_home = os.path.join(tmpdir, "runtime")
+    plugins_base_dir = os.path.join(runtime_home, "var", "plugins")
+    os.makedirs(plugins_base_dir)
+    os.environ["MFMODULE_RUNTIME_HOME"] = runtime_home
+    os.environ["MFMODULE_PLUGINS_BASE_DIR"] = plugins_base_dir
+    # (set by the module environment in a real installation, needed by apps)
+    mfmodule = os.environ.get("MFMODULE", "GENERIC")
+    for suffix in ("STDOUT_STDERR", "MULTIPLE_WORKERS"):
+        os.environ.setdefault("%s_LOG_TRY_TO_SPLIT_%s" % (mfmodule, suffix),
+                              "0")
+    os.environ["PYTHONPATH"] = ROOT + ":" + os.environ.get("PYTHONPATH", "")
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return runtime_home, plugins_base_dir
+
+
+def bench_build(homes, build_dir):
+    from mfplugin.plugin import Plugin
+    from mfplugin.utils import get_default_plugins_base_dir
+    timings = []
+    paths = []
+    cwd = os.getcwd()
+    os.chdir(build_dir)
+    try:
+        for home in homes:
+            plugin = Plugin(get_default_plugins_base_dir(), home)
+            elapsed, path = timed(plugin.build)
+            timings.append(elapsed)
+            paths.append(os.path.abspath(path))
+    finally:
+        os.chdir(cwd)
+    return get_stats(timings), paths
+
+
+def bench_install(manager, paths):
+    return get_stats([timed(manager.install_plugin, x)[0] for x in paths])
+
+
+def bench_uninstall(manager, names):
+    return get_stats([timed(manager.uninstall_plugin, x)[0] for x in names])
+
+
+def bench_load(plugins_base_dir, runs, cold=False):
+    from mfplugin.manager import PluginsManager
+    from mfplugin.registry import get_plugins_registry
+
+    def load():
+        manager = PluginsManager(plugins_base_dir)
+        manager.load()
+        return sorted(manager.plugins.keys())
+
+    timings = []
+    for _ in range(0, runs):
+        if cold:
+            get_plugins_registry(plugins_base_dir).save()
+            os.unlink(os.path.join(plugins_base_dir,
+                                   ".plugins_registry.json"))
+        timings.append(timed(load)[0])
+    return get_stats(timings)
+
+
+def bench_load_full(plugins_base_dir, runs):
+    from mfplugin.manager import PluginsManager
+
+    def load_full():
+        PluginsManager(plugins_base_dir).load_full()
+
+    return get_stats([timed(load_full)[0] for _ in range(0, runs)])
+
+
+def bench_get_plugin(plugins_base_dir, names):
+    from mfplugin.manager import PluginsManager
+    manager = PluginsManager(plugins_base_dir)
+    return get_stats([timed(manager.get_plugin, x)[0] for x in names])
+
+
+def bench_attribute_access(plugins_base_dir, number=100000):
+    from mfplugin.manager import PluginsManager
+    manager = PluginsManager(plugins_base_dir)
+    manager.load_full()
+    plugins = list(manager.plugins.values())
+    attributes = {
+        "baseline": "plugin.name",
+        "plugin.version": "plugin.version",
+        "plugin.configuration": "plugin.configuration",
+        "configuration.version": "configuration.version",
+        "configuration.apps": "configuration.apps"
+    }
+    res = {}
+    for key, stmt in attributes.items():
+        timings = []
+        for plugin in plugins:
+            namespace = {"plugin": plugin,
+                         "configuration": plugin.configuration}
+            # (first access)
+            eval(stmt, namespace)
+            timer = timeit.Timer(stmt, globals=namespace)
+            timings.append(min(timer.repeat(3, number)) / number)
+        res["%s_ns" % key] = round(min(timings) * 1e9, 2)
+    return res
+
+
+def bench_command_memory(plugins_base_dir, number=10000):
+    from mfplugin.manager import PluginsManager
+    manager = PluginsManager(plugins_base_dir)
+    manager.load_full()
+    apps = [x for p in manager.plugins.values()
+            for x in p.configuration.apps]
+    if not apps:
+        return None
+    app = apps[0]
+    doc_fragment = app._doc_fragment
+    custom_fragment = app._custom_fragment
+
+    def measure(func):
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            objects = [func(i) for i in range(0, number)]
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del objects
+        return round(float(after - before) / number, 1)
+
+    return {
+        "built_bytes": measure(lambda i: app.__class__(
+            app.plugin_home, app.plugin_name, "app%i" % i, doc_fragment,
+            custom_fragment)),
+        "duplicated_bytes": measure(lambda i: app.duplicate())
+    }
+
+
+def bench_snapshot(plugins_base_dir, tmpdir, fmt, runs):
+    from mfplugin.manager import PluginsManager
+    path = os.path.join(tmpdir, "snapshot.%s" % fmt)
+    dump_timings = []
+    load_timings = []
+    for _ in range(0, runs):
+        manager = PluginsManager(plugins_base_dir)
+        dump_timings.append(timed(manager.dump_snapshot, path, fmt=fmt)[0])
+        load_timings.append(timed(manager.load_snapshot, path)[0])
+    return get_stats(dump_timings), get_stats(load_timings)
+
+
+def bench_get_plugin_env_dict(plugins_base_dir, names, cold=False):
+    from mfplugin.manager import PluginsManager
+    from mfplugin.env_cache import ENV_CACHE_FILENAME
+    timings = []
+    for name in names:
+        plugin = PluginsManager(plugins_base_dir).get_plugin(name)
+        cache_path = os.path.join(plugin.home, ENV_CACHE_FILENAME)
+        if cold and os.path.exists(cache_path):
+            os.unlink(cache_path)
+        timings.append(timed(plugin.get_plugin_env_dict, cache=True)[0])
+    return get_stats(timings)
+
+
+def bench_plugin_wrapper(plugins_base_dir, name, runs):
+    cmd = [sys.executable, "-m", "mfplugin.cli_tools.plugin_wrapper",
+           "--bash-cmds", "--plugins-base-dir", plugins_base_dir, name,
+           "true"]
+    # warm the env cache
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return get_stats([timed(subprocess.run, cmd, check=True,
+                            stdout=subprocess.DEVNULL)[0]
+                      for _ in range(0, runs)])
+
+
+def run(tmpdir, args):
+    runtime_home, plugins_base_dir = setup_env(tmpdir)
+    from mfplugin.manager import PluginsManager
+    src_dir = os.path.join(tmpdir, "src")
+    build_dir = os.path.join(tmpdir, "build")
+    os.mkdir(build_dir)
+    homes = generate_fleet(src_dir, runtime_home=runtime_home,
+                           **get_fleet_kwargs(args))
+    names = [os.path.basename(x) for x in homes]
+    results = {}
+    results["build"], paths = bench_build(homes, build_dir)
+    manager = PluginsManager(plugins_base_dir)
+    results["install_plugin"] = bench_install(manager, paths)
+    results["load_cold_registry"] = \
+        bench_load(plugins_base_dir, args.runs, cold=True)
+    results["load"] = bench_load(plugins_base_dir, args.runs)
+    results["load_full"] = bench_load_full(plugins_base_dir, args.runs)
+    results["get_plugin"] = bench_get_plugin(plugins_base_dir, names)
+    results["attribute_access"] = bench_attribute_access(plugins_base_dir)
+    results["command_memory"] = bench_command_memory(plugins_base_dir)
+    for fmt in ("json", "marshal"):
+        results["snapshot_dump_%s" % fmt], \
+            results["snapshot_load_%s" % fmt] = \
+            bench_snapshot(plugins_base_dir, tmpdir, fmt, args.runs)
+    results["get_plugin_env_dict_cold"] = \
+        bench_get_plugin_env_dict(plugins_base_dir, names, cold=True)
+    results["get_plugin_env_dict_warm"] = \
+        bench_get_plugin_env_dict(plugins_base_dir, names)
+    # the last plugin is the deepest one in its dependency chain
+    results["plugin_wrapper"] = \
+        bench_plugin_wrapper(plugins_base_dir, names[-1], args.runs)
+    results["uninstall_plugin"] = bench_uninstall(manager, names)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mfplugin hot paths "
+                                     "benchmark")
+    add_fleet_arguments(parser)
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of runs for whole fleet operations "
+                        "(load, load_full, snapshot, plugin_wrapper)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="json output file (default: stdout)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the temporary directory")
+    args = parser.parse_args()
+    tmpdir = tempfile.mkdtemp(prefix="mfplugin_bench_")
+    try:
+        results = run(tmpdir, args)
+    finally:
+        if args.keep:
+            print("temporary directory: %s" % tmpdir, file=sys.stderr)
+        else:
+            shutil.rmtree(tmpdir, True)
+    output = json.dumps({
+        "meta": get_meta(runs=args.runs, **get_fleet_kwargs(args)),
+        "results": results
+    }, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
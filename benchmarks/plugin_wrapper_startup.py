@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""Benchmark plugin_wrapper startup (wall clock and -X importtime profile).
+
+A plugin (tests/data/plugin1) is installed in a temporary plugins base
+directory, then plugin_wrapper --bash-cmds is run several times in
+following modes:
+
+- nocache: --ignore-cache (slow path)
+- cache: warm .configuration_cache (fast path)
+- snapshot: warm env snapshot (fast path)
+
+With --check, the exit code is 1 if a heavy module is imported by a fast
+path (regression).
+
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from common import ROOT, get_stats, timed
+
+HEAVY_MODULES = ("mfplugin.manager", "mfplugin.plugin",
+                 "mfplugin.configuration", "cerberus",
+                 "opinionated_configparser", "configupdater",
+                 "gitignore_parser", "filelock", "mfutil")
+FAST_MODES = ("cache", "snapshot")
+
+
+def get_env(plugins_base_dir):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + ":" + env.get("PYTHONPATH", "")
+    env["MFMODULE_PLUGINS_BASE_DIR"] = plugins_base_dir
+    return env
+
+
+def install_plugin(plugins_base_dir, plugin_home):
+    sys.path.insert(0, ROOT)
+    from mfplugin.manager import PluginsManager
+    manager = PluginsManager(plugins_base_dir)
+    cwd = os.getcwd()
+    os.chdir(plugins_base_dir)
+    try:
+        path = manager.make_plugin(plugin_home).build()
+    finally:
+        os.chdir(cwd)
+    manager.install_plugin(path)
+    os.unlink(path)
+    return manager
+
+
+def wrapper_cmd(name, ignore_cache=False, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd = cmd + ["-X", "importtime"]
+    cmd = cmd + ["-m", "mfplugin.cli_tools.plugin_wrapper", "--bash-cmds"]
+    if ignore_cache:
+        cmd.append("--ignore-cache")
+    return cmd + [name, "true"]
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package" lines
+    # (nested imports are indented)
+    modules = {}
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        module = module[1:]
+        modules[module.strip()] = int(cumulative)
+        if not module.startswith(" "):
+            top_level[module] = int(cumulative)
+    return modules, top_level
+
+
+def bench(cmd, env, runs):
+    return get_stats([timed(subprocess.run, cmd, env=env, check=True,
+                            stdout=subprocess.DEVNULL)[0]
+                      for _ in range(0, runs)])
+
+
+def bench_mode(mode, name, env, runs):
+    ignore_cache = (mode == "nocache")
+    res = bench(wrapper_cmd(name, ignore_cache=ignore_cache), env, runs)
+    p = subprocess.run(wrapper_cmd(name, ignore_cache=ignore_cache,
+                                   importtime=True),
+                       env=env, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.PIPE, universal_newlines=True)
+    modules, top_level = parse_importtime(p.stderr)
+    res["imports_total_us"] = sum(top_level.values())
+    res["imports_top"] = sorted(top_level.items(),
+                                key=lambda x: -x[1])[0:10]
+    res["heavy_modules"] = sorted(x for x in HEAVY_MODULES if x in modules)
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="plugin_wrapper startup "
+                                     "benchmark")
+    parser.add_argument("--runs", type=int, default=20,
+                        help="number of runs per mode")
+    parser.add_argument("--output", type=str, default=None,
+                        help="json output file (default: stdout)")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with code 1 if a heavy module is "
+                        "imported in a fast path")
+    args = parser.parse_args()
+    tmpdir = tempfile.mkdtemp(prefix="mfplugin_bench_")
+    try:
+        plugins_base_dir = os.path.join(tmpdir, "plugins")
+        os.mkdir(plugins_base_dir)
+        os.environ["MFMODULE_PLUGINS_BASE_DIR"] = plugins_base_dir
+        manager = install_plugin(plugins_base_dir,
+                                 os.path.join(ROOT, "tests", "data",
+                                              "plugin1"))
+        env = get_env(plugins_base_dir)
+        results = {
+            "python": bench([sys.executable, "-c", "pass"], env, args.runs)
+        }
+        results["nocache"] = bench_mode("nocache", "plugin1", env,
+                                        args.runs)
+        # the first run with cache enabled writes the env cache
+        subprocess.run(wrapper_cmd("plugin1"), env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        results["cache"] = bench_mode("cache", "plugin1", env, args.runs)
+        manager.compile_env_snapshot()
+        results["snapshot"] = bench_mode("snapshot", "plugin1", env,
+                                         args.runs)
+    finally:
+        shutil.rmtree(tmpdir, True)
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.check:
+        for mode in FAST_MODES:
+            if results[mode]["heavy_modules"]:
+                print("ERROR: heavy modules imported in %s mode: %s" %
+                      (mode, ", ".join(results[mode]["heavy_modules"])),
+                      file=sys.stderr)
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +0,0 @@
-import lazy_import
-
-
-lazy_import.lazy_module("configupdater")
-lazy_import.lazy_module("cerberus")
-lazy_import.lazy_module("mfutil")
-opinionated_configparser = lazy_import.lazy_module("opinionated_configparser")
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 
-import lazy_import
+# only light modules must be imported here (fast paths), other ones are
+# imported when needed
 import os
+import sys
 import argparse
-from mfplugin.compat import PluginsManager
-from mfplugin.utils import NotInstalledPlugin
-
-sys = lazy_import.lazy_module("sys")
-shlex = lazy_import.lazy_module("shlex")
+from mfplugin.env_snapshot import get_plugin_env_from_snapshot
+from mfplugin.env_cache import get_plugin_env_from_cache
 
 DESCRIPTION = "execute a command in a plugin environment"
 
@@ -68,6 +67,20 @@ def main():
     else:
         plugins_base_dir = None
 
+    if cache and '/' not in args.PLUGIN_NAME_OR_PLUGIN_HOME:
+        # fast paths (without any configuration import)
+        for get_plugin_env in (get_plugin_env_from_snapshot,
+                               get_plugin_env_from_cache):
+            res = get_plugin_env(args.PLUGIN_NAME_OR_PLUGIN_HOME,
+                                 plugins_base_dir)
+            if res is not None:
+                run(args, command_args, res["env"], res["home"],
+                    res["layer"], res["add_plugin_dir_to_python_path"],
+                    add_plugin_home=False)
+                return
+
+    from mfplugin.compat import PluginsManager
+    from mfplugin.utils import NotInstalledPlugin
     manager = PluginsManager(plugins_base_dir)
     if '/' in args.PLUGIN_NAME_OR_PLUGIN_HOME:
         p = manager.make_plugin(args.PLUGIN_NAME_OR_PLUGIN_HOME)
@@ -81,48 +94,57 @@ def main():
                   "installed/available" % args.PLUGIN_NAME_OR_PLUGIN_HOME,
                   file=sys.stderr)
             sys.exit(1)
+    plugin_env = p.get_plugin_env_dict(cache=cache)
+    run(args, command_args, plugin_env, p.home, p.layerapi2_layer_name,
+        p.configuration.add_plugin_dir_to_python_path,
+        add_plugin_home=(mode == "file"))
+
 
+def run(args, command_args, plugin_env, home, layer_name,
+        add_plugin_dir_to_python_path, add_plugin_home=False):
     if args.bash_cmds:
+        import shlex
         print("source /etc/profile")
         print("if test -f %s/.bash_profile; then source %s/.bash_profile; fi" %
               (MFMODULE_RUNTIME_HOME, MFMODULE_RUNTIME_HOME))
         print("source %s/share/interactive_profile" % MFMODULE_HOME)
-        plugin_env = p.get_plugin_env_dict(cache=cache)
         for k, v in plugin_env.items():
             if k != 'PYTHONPATH':
                 print("export %s=%s" % (k, shlex.quote(v)))
         new_layerapi2_layers_path = get_new_layerapi2_layers_path(
-            p.home, add_plugin_home=(mode == "file"))
+            home, add_plugin_home=add_plugin_home)
         if new_layerapi2_layers_path != LAYERAPI2_LAYERS_PATH:
             print("export LAYERAPI2_LAYERS_PATH=%s" %
                   new_layerapi2_layers_path)
-        print("layer_load %s >/dev/null" % p.layerapi2_layer_name)
-        if p.configuration.add_plugin_dir_to_python_path:
+        print("layer_load %s >/dev/null" % layer_name)
+        if add_plugin_dir_to_python_path:
             old_python_path = os.environ.get("PYTHONPATH", None)
             if old_python_path:
-                print("export PYTHONPATH=\"%s:${PYTHONPATH}\"" % p.home)
+                print("export PYTHONPATH=\"%s:${PYTHONPATH}\"" % home)
             else:
-                print("export PYTHONPATH=\"%s\"" % p.home)
+                print("export PYTHONPATH=\"%s\"" % home)
         if args.cwd:
-            print("cd %s" % p.home)
+            print("cd %s" % home)
         return
 
-    with p.plugin_env_context(cache=cache):
-        new_layerapi2_layers_path = get_new_layerapi2_layers_path(
-            p.home, add_plugin_home=(mode == "file"))
-        if new_layerapi2_layers_path != LAYERAPI2_LAYERS_PATH:
-            os.environ["LAYERAPI2_LAYERS_PATH"] = new_layerapi2_layers_path
-        lw_args = ["--empty",
-                   "--layers=%s" % p.layerapi2_layer_name]
-        if args.cwd:
-            lw_args.append("--cwd")
-        if args.empty:
-            lw_args.append("--empty")
-        lw_args.append("--")
-        lw_args.append(args.COMMAND_AND_ARGS)
-        for cmd_arg in command_args:
-            lw_args.append(cmd_arg)
-        os.execvp("layer_wrapper", lw_args)
+    # the env is given to execvpe (os.environ is not modified)
+    env = dict(os.environ)
+    env.update(plugin_env)
+    new_layerapi2_layers_path = get_new_layerapi2_layers_path(
+        home, add_plugin_home=add_plugin_home)
+    if new_layerapi2_layers_path != LAYERAPI2_LAYERS_PATH:
+        env["LAYERAPI2_LAYERS_PATH"] = new_layerapi2_layers_path
+    lw_args = ["--empty",
+               "--layers=%s" % layer_name]
+    if args.cwd:
+        lw_args.append("--cwd")
+    if args.empty:
+        lw_args.append("--empty")
+    lw_args.append("--")
+    lw_args.append(args.COMMAND_AND_ARGS)
+    for cmd_arg in command_args:
+        lw_args.append(cmd_arg)
+    os.execvpe("layer_wrapper", lw_args, env)
 
 
 if __name__ == "__main__":
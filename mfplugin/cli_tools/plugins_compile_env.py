@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from mfplugin.manager import PluginsManager
+from mfutil.cli import echo_ok, echo_running, echo_nok, echo_bold
+
+DESCRIPTION = "compile the env of all installed plugins into a snapshot " \
+    "(used by plugin_wrapper fast path)"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--plugins-base-dir", type=str, default=None,
+                            help="can be use to set an alternate "
+                            "plugins-base-dir, if not set the value of "
+                            "MFMODULE_PLUGINS_BASE_DIR env var is used (or a "
+                            "hardcoded standard value).")
+    arg_parser.add_argument("--debug", action="store_true",
+                            help="add some debug informations in "
+                            "case of problems")
+    args = arg_parser.parse_args()
+    echo_running("- Compiling plugins env snapshot...")
+    manager = PluginsManager(args.plugins_base_dir)
+    try:
+        names = manager.compile_env_snapshot()
+    except Exception as e:
+        echo_nok()
+        echo_bold(str(e))
+        if args.debug:
+            print("details of the problem:")
+            raise e
+        sys.exit(1)
+    if names is None:
+        echo_nok()
+        sys.exit(1)
+    echo_ok()
+    echo_bold("%i plugin(s) in the snapshot" % len(names))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,17 +9,83 @@ from mfplugin.utils import inside_a_plugin_env
 from mfplugin.manager import PluginsManager
 from mfplugin.file import PluginFile
 from mfplugin.utils import BadPluginFile, AlreadyInstalledPlugin, \
-    validate_plugin_name, BadPluginName, NotInstalledPlugin
+    validate_plugin_name, BadPluginName, NotInstalledPlugin, \
+    CantUninstallPlugin
 from mfutil.cli import echo_running, echo_nok, echo_ok, echo_bold, echo_warning
 
 DESCRIPTION = "install a plugin file"
 MFMODULE_LOWERCASE = os.environ.get('MFMODULE_LOWERCASE', 'mfext')
 
 
+def print_stderr_warning(stderr):
+    echo_warning()
+    if "pip's dependency resolver does not currently take into account" \
+            in stderr:
+        print(stderr.replace("ERROR", "WARNING"))
+        print("The above message is only a WARNING, don't panic !")
+        print("Your plugin should work anyway")
+        print("To get rid of it, maybe you should remove from your")
+        print("    plugin the optional layers (those starting by")
+        print("    '-' in .layerapi2_dependencies or ask for help from")
+        print("    a Metwork specialist")
+    else:
+        print(stderr)
+
+
+def install_several_plugins(args):
+    manager = PluginsManager(plugins_base_dir=args.plugins_base_dir)
+    names = []
+    for plugin_filepath in args.plugin_filepath:
+        echo_running("- Checking plugin file %s..." % plugin_filepath)
+        try:
+            pf = PluginFile(plugin_filepath)
+            pf.load()
+        except BadPluginFile:
+            echo_nok()
+            sys.exit(1)
+        echo_ok()
+        names.append(pf.name)
+    if args.force:
+        # (old plugins are uninstalled in the same step)
+        echo_running("- Installing (or replacing) plugins %s..." %
+                     ", ".join(names))
+        install = manager.replace_plugins
+    else:
+        echo_running("- Installing plugins %s..." % ", ".join(names))
+        install = manager.install_plugins
+    f = io.StringIO()
+    with contextlib.redirect_stderr(f):
+        results = install(args.plugin_filepath, workers=args.workers)
+    stderr = f.getvalue()
+    if results is None:
+        echo_nok("can't acquire plugin management lock")
+        sys.exit(2)
+    failures = [(x, y) for x, y in results.items() if y is not None]
+    if len(failures) > 0:
+        echo_nok()
+        if stderr != '':
+            print(stderr)
+        for plugin_filepath, e in failures:
+            echo_bold("%s: %s" % (plugin_filepath, e))
+        if any(isinstance(x[1], CantUninstallPlugin) for x in failures):
+            echo_bold("=> try uninstalling with plugins.uninstall for "
+                      "more details")
+        if all(isinstance(x[1], AlreadyInstalledPlugin) for x in failures):
+            sys.exit(1)
+        sys.exit(2)
+    if stderr != '':
+        print_stderr_warning(stderr)
+    else:
+        echo_ok()
+    for name in names:
+        manager.get_plugin(name).print_dangerous_state()
+
+
 def main():
     arg_parser = argparse.ArgumentParser(description=DESCRIPTION)
-    arg_parser.add_argument("plugin_filepath", type=str,
-                            help="plugin filepath")
+    arg_parser.add_argument("plugin_filepath", type=str, nargs="+",
+                            help="plugin filepath (several files can be "
+                            "given to install them in a single step)")
     arg_parser.add_argument("--plugins-base-dir", type=str, default=None,
                             help="can be use to set an alternate "
                             "plugins-base-dir, if not set the value of "
@@ -30,11 +96,23 @@ def main():
                             "with the same name (if already installed)")
     arg_parser.add_argument("--new-name", type=str, default=None,
                             help="install the plugin but with a new name "
-                            "given by this parameter")
+                            "given by this parameter (only when a single "
+                            "plugin file is given)")
+    arg_parser.add_argument("--workers", type=int, default=4,
+                            help="max number of plugin files extracted in "
+                            "parallel (when several plugin files are given)")
     args = arg_parser.parse_args()
     if inside_a_plugin_env():
         print("ERROR: Don't use plugins.install/uninstall inside a plugin_env")
         sys.exit(1)
+    if len(args.plugin_filepath) > 1:
+        if args.new_name is not None:
+            echo_bold("ERROR: --new-name option can't be used with several "
+                      "plugin files")
+            sys.exit(3)
+        install_several_plugins(args)
+        return
+    plugin_filepath = args.plugin_filepath[0]
     if args.new_name is not None:
         try:
             validate_plugin_name(args.new_name)
@@ -45,7 +123,7 @@ def main():
     manager = PluginsManager(plugins_base_dir=args.plugins_base_dir)
     echo_running("- Checking plugin file...")
     try:
-        pf = PluginFile(args.plugin_filepath)
+        pf = PluginFile(plugin_filepath)
         pf.load()
     except BadPluginFile:
         echo_nok()
@@ -77,7 +155,7 @@ def main():
     try:
         f = io.StringIO()
         with contextlib.redirect_stderr(f):
-            manager.install_plugin(args.plugin_filepath,
+            manager.install_plugin(plugin_filepath,
                                    new_name=args.new_name)
     except AlreadyInstalledPlugin:
         echo_nok("already installed")
@@ -91,18 +169,7 @@ def main():
         sys.exit(2)
     stderr = f.getvalue()
     if stderr != '':
-        echo_warning()
-        if "pip's dependency resolver does not currently take into account" \
-                in stderr:
-            print(stderr.replace("ERROR", "WARNING"))
-            print("The above message is only a WARNING, don't panic !")
-            print("Your plugin should work anyway")
-            print("To get rid of it, maybe you should remove from your")
-            print("    plugin the optional layers (those starting by")
-            print("    '-' in .layerapi2_dependencies or ask for help from")
-            print("    a Metwork specialist")
-        else:
-            print(stderr)
+        print_stderr_warning(stderr)
     else:
         echo_ok()
     p = manager.get_plugin(args.new_name if args.new_name is not None
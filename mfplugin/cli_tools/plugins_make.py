@@ -2,6 +2,7 @@
 
 import argparse
 from mfplugin.manager import PluginsManager
+from mfplugin.compression import get_available_codecs, DEFAULT_CODEC
 from mfutil.cli import echo_ok, echo_running, echo_nok, echo_bold
 
 DESCRIPTION = "make a plugin from the current directory"
@@ -17,12 +18,21 @@ def main():
     arg_parser.add_argument("--show-plugin-path", action="store_true",
                             default=False,
                             help="show the generated plugin path")
+    arg_parser.add_argument("--compression", type=str,
+                            default=DEFAULT_CODEC,
+                            choices=get_available_codecs(),
+                            help="compression codec of the plugin file "
+                            "(default: %(default)s)")
+    arg_parser.add_argument("--compression-level", type=int, default=None,
+                            help="compression level (default: codec "
+                            "default)")
     args = arg_parser.parse_args()
     echo_running("- Building plugin...")
     manager = PluginsManager()
     try:
         plugin = manager.make_plugin(args.plugin_path)
-        path = plugin.build()
+        path = plugin.build(compression=args.compression,
+                            level=args.compression_level)
     except Exception as e:
         echo_nok()
         print(e)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import json
+from mfplugin.manager import PluginsManager
+from mfplugin.configuration import opinionated_configparser
+from mfplugin.schema import cerberus
+from mfplugin.profiling import enable, disable, reset, get_records, \
+    format_report, phase
+from mfutil.cli import echo_bold
+
+DESCRIPTION = "profile the loading of installed plugins (per plugin and " \
+    "per phase timings)"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("name", type=str, nargs="?", default=None,
+                            help="plugin name (if not set, all installed "
+                            "plugins are profiled)")
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="use env caches to get plugins env "
+                            "(default: compute them)")
+    arg_parser.add_argument("--top", type=int, default=10,
+                            help="number of slowest offenders to display")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="json output")
+    arg_parser.add_argument("--plugins-base-dir", type=str, default=None,
+                            help="can be use to set an alternate "
+                            "plugins-base-dir, if not set the value of "
+                            "MFMODULE_PLUGINS_BASE_DIR env var is used (or a "
+                            "hardcoded standard value).")
+    args = arg_parser.parse_args()
+    # lazy imported modules are imported here (so their import time is not
+    # included in the first profiled plugin)
+    cerberus.Validator
+    opinionated_configparser.OpinionatedConfigParser
+    reset()
+    enable()
+    manager = PluginsManager(plugins_base_dir=args.plugins_base_dir)
+    if args.name is not None:
+        if args.name not in manager.plugins:
+            echo_bold("ERROR: plugin %s is not installed" % args.name)
+            sys.exit(3)
+        names = [args.name]
+    else:
+        names = list(manager.plugins.keys())
+    errors = {}
+    for name in names:
+        try:
+            with phase("plugin", name):
+                plugin = manager.plugins[name]
+                plugin.load_full()
+                plugin.get_plugin_env_dict(cache=args.cache)
+        except Exception as e:
+            errors[name] = str(e)
+    disable()
+    records = get_records()
+    # (to avoid a second report at exit if MFPLUGIN_PROFILE is set)
+    reset()
+    if args.json:
+        print(json.dumps({"records": records, "errors": errors}, indent=4))
+    else:
+        print(format_report(records, top=args.top))
+        for name, error in sorted(errors.items()):
+            print("ERROR: %s: %s" % (name, error), file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
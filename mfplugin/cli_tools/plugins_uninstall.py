@@ -16,10 +16,34 @@ MFMODULE_RUNTIME_HOME = os.environ.get('MFMODULE_RUNTIME_HOME', '/tmp')
 MFMODULE_LOWERCASE = os.environ.get('MFMODULE_LOWERCASE', 'mfext')
 
 
+def uninstall_several_plugins(manager, names, args):
+    echo_running("- Uninstalling plugins %s..." % ", ".join(names))
+    out = io.StringIO()
+    err = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        with contextlib.redirect_stderr(err):
+            results = manager.uninstall_plugins(names, workers=args.workers)
+    if results is None:
+        echo_nok("can't acquire plugin management lock")
+        sys.exit(2)
+    failures = [(x, y) for x, y in results.items() if y is not None]
+    if len(failures) > 0:
+        echo_nok()
+        print(err.getvalue(), file=sys.stderr)
+        print(out.getvalue())
+        for name, e in failures:
+            print("%s: %s" % (name, e))
+        if all(isinstance(x[1], NotInstalledPlugin) for x in failures):
+            sys.exit(1)
+        sys.exit(2)
+    echo_ok()
+
+
 def main():
     arg_parser = argparse.ArgumentParser(description=DESCRIPTION)
-    arg_parser.add_argument("name_or_path", type=str,
-                            help="plugin name (or path)")
+    arg_parser.add_argument("name_or_path", type=str, nargs="+",
+                            help="plugin name (or path), several plugins "
+                            "can be given to uninstall them in a single step")
     arg_parser.add_argument(
         "--clean", action="store_true",
         help="if set, we drop any configuration override "
@@ -31,12 +55,19 @@ def main():
                             "plugins-base-dir, if not set the value of "
                             "MFMODULE_PLUGINS_BASE_DIR env var is used (or a "
                             "hardcoded standard value).")
+    arg_parser.add_argument("--workers", type=int, default=4,
+                            help="max number of plugin directories removed "
+                            "in parallel (when several plugins are given)")
     args = arg_parser.parse_args()
-    name = pathlib.PurePath(args.name_or_path).name
+    names = [pathlib.PurePath(x).name for x in args.name_or_path]
     if inside_a_plugin_env():
         print("ERROR: Don't use plugins.install/uninstall inside a plugin_env")
         sys.exit(1)
     manager = PluginsManager(plugins_base_dir=args.plugins_base_dir)
+    if len(names) > 1:
+        uninstall_several_plugins(manager, names, args)
+        return
+    name = names[0]
     echo_running("- Uninstalling plugin %s..." % name)
     try:
         out = io.StringIO()
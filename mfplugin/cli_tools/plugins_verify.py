@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from mfplugin.manager import PluginsManager
+from mfutil.cli import echo_ok, echo_running, echo_nok, echo_bold
+
+DESCRIPTION = "check installed plugins files against their manifest"
+
+
+def verify_plugin(plugin, args):
+    echo_running("- Verifying plugin %s..." % plugin.name)
+    try:
+        res = plugin.verify(workers=args.workers)
+    except Exception as e:
+        echo_nok()
+        echo_bold(str(e))
+        if args.debug:
+            raise e
+        return False
+    if not any(res.values()):
+        echo_ok()
+        return True
+    echo_nok()
+    for key in ("missing", "modified", "extra"):
+        for path in res[key]:
+            print("%s: %s" % (key, path))
+    return False
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("name", type=str, nargs="?", default=None,
+                            help="plugin name")
+    arg_parser.add_argument("--all", action="store_true",
+                            help="verify all installed plugins "
+                            "(except dev linked ones)")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="number of threads used to hash files "
+                            "(default: number of cpus)")
+    arg_parser.add_argument("--plugins-base-dir", type=str, default=None,
+                            help="can be use to set an alternate "
+                            "plugins-base-dir, if not set the value of "
+                            "MFMODULE_PLUGINS_BASE_DIR env var is used (or a "
+                            "hardcoded standard value).")
+    arg_parser.add_argument("--debug", action="store_true",
+                            help="add some debug informations in "
+                            "case of problems")
+    args = arg_parser.parse_args()
+    if args.name is None and not args.all:
+        arg_parser.error("you have to give a plugin name or --all")
+    if args.name is not None and args.all:
+        arg_parser.error("you can't give both a plugin name and --all")
+    manager = PluginsManager(args.plugins_base_dir)
+    if args.all:
+        plugins = [x for x in manager.plugins.values()
+                   if not x.is_dev_linked]
+    else:
+        try:
+            plugins = [manager.plugins[args.name]]
+        except KeyError:
+            echo_bold("ERROR: plugin %s is not installed" % args.name)
+            sys.exit(3)
+    ok = True
+    for plugin in plugins:
+        ok = verify_plugin(plugin, args) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
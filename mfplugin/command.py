@@ -1,7 +1,9 @@
 import os
+from types import MappingProxyType
 from mfplugin.utils import NON_REQUIRED_INTEGER_DEFAULT_0, to_bool, \
     NON_REQUIRED_STRING_DEFAULT_EMPTY, NON_REQUIRED_BOOLEAN_DEFAULT_FALSE, \
     NON_REQUIRED_INTEGER
+from mfplugin.snapshot import CommandSnapshot
 
 __pdoc__ = {
     "coerce_log_split_stdout_sterr": False,
@@ -53,67 +55,103 @@ COMMAND_SCHEMA = {
 }
 
 
+def _read_only(fragment):
+    if isinstance(fragment, MappingProxyType):
+        return fragment
+    return MappingProxyType(fragment)
+
+
 class Command(object):
+    """Command (app, extra daemon...) of a plugin.
+
+    Typed fields are extracted from the (validated) document fragment at
+    construction and stored in slots. Fragments (the command section and
+    the custom section of the configuration) are shared, not copied,
+    between the commands of a plugin and their duplicates, so they are
+    stored as read-only mappings (a modification raises a TypeError).
+
+    """
+
+    __slots__ = ("plugin_name", "plugin_home", "name", "_type",
+                 "_doc_fragment", "_custom_fragment", "_cmd_and_args",
+                 "_numprocesses", "_log_split_stdout_stderr",
+                 "_log_split_multiple_workers", "_graceful_timeout",
+                 "_max_age", "_rlimit_as", "_rlimit_nofile", "_rlimit_stack",
+                 "_rlimit_fsize", "_debug")
 
     def __init__(self, plugin_home, plugin_name, name, doc_fragment,
                  custom_fragment):
         self.plugin_name = plugin_name
         self.plugin_home = plugin_home
-        self._doc_fragment = doc_fragment
-        self._custom_fragment = custom_fragment
+        self._doc_fragment = _read_only(doc_fragment)
+        self._custom_fragment = _read_only(custom_fragment)
         self.name = name
         self._type = "command"
+        self._cmd_and_args = doc_fragment["_cmd_and_args"]
+        self._numprocesses = doc_fragment["numprocesses"]
+        self._log_split_stdout_stderr = \
+            doc_fragment["log_split_stdout_stderr"]
+        self._log_split_multiple_workers = \
+            doc_fragment["log_split_multiple_workers"]
+        self._graceful_timeout = doc_fragment["graceful_timeout"]
+        self._max_age = doc_fragment["max_age"]
+        self._rlimit_as = doc_fragment["rlimit_as"]
+        self._rlimit_nofile = doc_fragment["rlimit_nofile"]
+        self._rlimit_stack = doc_fragment["rlimit_stack"]
+        self._rlimit_fsize = doc_fragment["rlimit_fsize"]
+        self._debug = doc_fragment["debug"]
 
     def duplicate(self, new_name=None):
         c = self.__class__
         if new_name is None:
             new_name = self.name
+        # (fragments are shared)
         return c(self.plugin_home, self.plugin_name, new_name,
-                 dict(self._doc_fragment), dict(self._custom_fragment))
+                 self._doc_fragment, self._custom_fragment)
 
     @property
     def cmd_and_args(self):
-        return self._doc_fragment["_cmd_and_args"]
+        return self._cmd_and_args
 
     @property
     def numprocesses(self):
-        return self._doc_fragment["numprocesses"]
+        return self._numprocesses
 
     @property
     def log_split_stdout_stderr(self):
-        return self._doc_fragment["log_split_stdout_stderr"]
+        return self._log_split_stdout_stderr
 
     @property
     def log_split_multiple_workers(self):
-        return self._doc_fragment["log_split_multiple_workers"]
+        return self._log_split_multiple_workers
 
     @property
     def graceful_timeout(self):
-        return self._doc_fragment["graceful_timeout"]
+        return self._graceful_timeout
 
     @property
     def max_age(self):
-        return self._doc_fragment["max_age"]
+        return self._max_age
 
     @property
     def rlimit_as(self):
-        return self._doc_fragment["rlimit_as"]
+        return self._rlimit_as
 
     @property
     def rlimit_nofile(self):
-        return self._doc_fragment["rlimit_nofile"]
+        return self._rlimit_nofile
 
     @property
     def rlimit_stack(self):
-        return self._doc_fragment["rlimit_stack"]
+        return self._rlimit_stack
 
     @property
     def rlimit_fsize(self):
-        return self._doc_fragment["rlimit_fsize"]
+        return self._rlimit_fsize
 
     @property
     def debug(self):
-        return self._doc_fragment["debug"]
+        return self._debug
 
     def _get_log_proxy_args(self):
         if self.log_split_multiple_workers and self.numprocesses > 1:
@@ -149,3 +187,12 @@ class Command(object):
     @property
     def type(self):
         return self._type
+
+    def get_snapshot(self):
+        """Return a frozen snapshot of the command.
+
+        Returns:
+            (CommandSnapshot): the snapshot (see mfplugin.snapshot).
+
+        """
+        return CommandSnapshot.from_command(self)
@@ -0,0 +1,235 @@
+import abc
+import bz2
+import gzip
+import lzma
+import tarfile
+from mfplugin.utils import UnsupportedCompression
+
+try:
+    # python >= 3.14
+    from compression import zstd as _stdlib_zstd
+except ImportError:
+    _stdlib_zstd = None
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+__pdoc__ = {
+    "Codec": False,
+    "GzipCodec": False,
+    "Bz2Codec": False,
+    "XzCodec": False,
+    "ZstdCodec": False,
+    "CODECS": False
+}
+DEFAULT_CODEC = "gzip"
+"""Default compression codec name for plugin files."""
+
+
+class Codec(abc.ABC):
+
+    name = None
+    magic = None
+    default_level = None
+
+    def is_available(self):
+        return True
+
+    @abc.abstractmethod
+    def open_writer(self, fileobj, level):
+        pass
+
+    @abc.abstractmethod
+    def open_reader(self, fileobj):
+        pass
+
+
+class GzipCodec(Codec):
+
+    name = "gzip"
+    magic = b"\x1f\x8b"
+    default_level = 6
+
+    def open_writer(self, fileobj, level):
+        return gzip.GzipFile(filename="", fileobj=fileobj, mode="wb",
+                             compresslevel=level)
+
+    def open_reader(self, fileobj):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+
+class Bz2Codec(Codec):
+
+    name = "bz2"
+    magic = b"BZh"
+    default_level = 9
+
+    def open_writer(self, fileobj, level):
+        return bz2.BZ2File(fileobj, mode="wb", compresslevel=level)
+
+    def open_reader(self, fileobj):
+        return bz2.BZ2File(fileobj, mode="rb")
+
+
+class XzCodec(Codec):
+
+    name = "xz"
+    magic = b"\xfd7zXZ\x00"
+    default_level = 6
+
+    def open_writer(self, fileobj, level):
+        return lzma.LZMAFile(fileobj, mode="wb", preset=level)
+
+    def open_reader(self, fileobj):
+        return lzma.LZMAFile(fileobj, mode="rb")
+
+
+class ZstdCodec(Codec):
+
+    name = "zstd"
+    magic = b"\x28\xb5\x2f\xfd"
+    default_level = 3
+
+    def is_available(self):
+        return _stdlib_zstd is not None or _zstandard is not None
+
+    def open_writer(self, fileobj, level):
+        if _stdlib_zstd is not None:
+            return _stdlib_zstd.ZstdFile(fileobj, mode="wb", level=level)
+        # threads=-1 => use all cpus for compression
+        compressor = _zstandard.ZstdCompressor(level=level, threads=-1)
+        return compressor.stream_writer(fileobj, closefd=False)
+
+    def open_reader(self, fileobj):
+        if _stdlib_zstd is not None:
+            return _stdlib_zstd.ZstdFile(fileobj, mode="rb")
+        decompressor = _zstandard.ZstdDecompressor()
+        return decompressor.stream_reader(fileobj, closefd=False)
+
+
+CODECS = {x.name: x for x in (GzipCodec(), Bz2Codec(), XzCodec(),
+                              ZstdCodec())}
+
+
+def get_available_codecs():
+    """Return the list of available compression codec names.
+
+    Returns:
+        (list): list of codec names (strings), sorted.
+
+    """
+    return sorted(x.name for x in CODECS.values() if x.is_available())
+
+
+def get_codec(name):
+    """Return the codec object corresponding to the given name.
+
+    Args:
+        name (string): codec name (see get_available_codecs()).
+
+    Returns:
+        codec object.
+
+    Raises:
+        UnsupportedCompression: if the codec is unknown or not available.
+
+    """
+    codec = CODECS.get(name)
+    if codec is None:
+        raise UnsupportedCompression("unknown compression codec: %s "
+                                     "(available codecs: %s)" %
+                                     (name, ", ".join(
+                                         get_available_codecs())))
+    if not codec.is_available():
+        raise UnsupportedCompression("compression codec: %s is not "
+                                     "available here (install the "
+                                     "zstandard module?)" % name)
+    return codec
+
+
+def detect_codec(fileobj):
+    """Detect the compression codec of the given (binary) file object.
+
+    The file position is restored after detection.
+
+    Args:
+        fileobj: seekable binary file object.
+
+    Returns:
+        codec object.
+
+    Raises:
+        UnsupportedCompression: if the codec can't be detected or if it is
+            not available.
+
+    """
+    position = fileobj.tell()
+    header = fileobj.read(8)
+    fileobj.seek(position)
+    for codec in CODECS.values():
+        if header.startswith(codec.magic):
+            return get_codec(codec.name)
+    raise UnsupportedCompression("unknown compression format")
+
+
+class _TarFile(tarfile.TarFile):
+
+    _extra_fileobjs = ()
+
+    def close(self):
+        try:
+            tarfile.TarFile.close(self)
+        finally:
+            for fileobj in self._extra_fileobjs:
+                fileobj.close()
+
+    def __exit__(self, type, value, traceback):
+        tarfile.TarFile.__exit__(self, type, value, traceback)
+        if type is not None:
+            # close() is not called by TarFile.__exit__ in this case
+            for fileobj in self._extra_fileobjs:
+                try:
+                    fileobj.close()
+                except Exception:
+                    pass
+
+
+def open_tarfile(path, mode="r", compression=None, level=None):
+    """Open a compressed tar file in stream mode.
+
+    Args:
+        path (string): tar file path.
+        mode (string): "r" (read) or "w" (write).
+        compression (string): codec name (write mode only, default to
+            DEFAULT_CODEC), in read mode, the codec is detected.
+        level (int): compression level (write mode only, default to the
+            codec default level).
+
+    Returns:
+        (tarfile.TarFile): a stream mode TarFile object (to close).
+
+    Raises:
+        UnsupportedCompression: if the codec is unknown or not available.
+
+    """
+    if mode == "w":
+        codec = get_codec(compression or DEFAULT_CODEC)
+        if level is None:
+            level = codec.default_level
+    raw = open(path, mode + "b")
+    try:
+        if mode == "w":
+            stream = codec.open_writer(raw, level)
+        else:
+            stream = detect_codec(raw).open_reader(raw)
+        try:
+            tf = _TarFile.open(fileobj=stream, mode=mode + "|")
+        except Exception:
+            stream.close()
+            raise
+    except Exception:
+        raw.close()
+        raise
+    tf._extra_fileobjs = (stream, raw)
+    return tf
@@ -2,24 +2,59 @@ import os
 import re
 import copy
 import sys
-import fnmatch
-import inspect
-import opinionated_configparser
-import cerberus
-from mfplugin.utils import validate_configparser, \
-    cerberus_errors_to_human_string
+import marshal
+import stat
+import threading
+import hashlib
+from mfutil import get_unique_hexa_identifier
+from mfplugin.utils import configparser_to_document, \
+    cerberus_errors_to_human_string, lazy_module
 from mfplugin.app import APP_SCHEMA, App
 from mfplugin.extra_daemon import EXTRA_DAEMON_SCHEMA, ExtraDaemon
-from mfplugin.utils import BadPlugin, resolve, get_current_envs, \
+from mfplugin.profiling import phase
+from mfplugin.fingerprint import get_files_fingerprint
+from mfplugin.schema import get_compiled_schema
+from mfplugin.resolver import get_resolver
+from mfplugin.snapshot import ConfigurationSnapshot
+from mfplugin.utils import BadPlugin, get_current_envs, \
     PluginEnvContextManager, NON_REQUIRED_BOOLEAN_DEFAULT_TRUE, \
+    get_env_overlay, loaded_property, \
     NON_REQUIRED_STRING_DEFAULT_1, \
-    get_app_class, get_extra_daemon_class, get_nice_dump, is_jsonable, \
+    get_app_class, get_extra_daemon_class, get_nice_dump, \
     get_configuration_path, get_configuration_paths
 
+opinionated_configparser = lazy_module("opinionated_configparser")
 
 MFMODULE = os.environ.get("MFMODULE", "GENERIC")
 MFMODULE_LOWERCASE = os.environ.get("MFMODULE_LOWERCASE", "generic")
 MFMODULE_RUNTIME_HOME = os.environ.get("MFMODULE_RUNTIME_HOME", "/tmp")
+MFPLUGIN_DOCUMENT_CACHE = os.environ.get("MFPLUGIN_DOCUMENT_CACHE", "1")
+__pdoc__ = {
+    "MFPLUGIN_DOCUMENT_CACHE": False
+}
+DOCUMENT_CACHE_DIR = os.path.join(os.environ["MFMODULE_RUNTIME_HOME"],
+                                  "tmp", "mfplugin_document_cache") \
+    if "MFMODULE_RUNTIME_HOME" in os.environ else None
+"""Directory of validated document cache files (one per plugin home).
+
+None (no cache) if MFMODULE_RUNTIME_HOME is not set (we don't want to use
+a shared directory like /tmp). The directory must be owned by the current
+user and must not be writable by others (else the cache is not used).
+"""
+DOCUMENT_CACHE_VERSION = 2
+"""Version of the validated document cache format."""
+DOCUMENT_CACHE_ENV_NAMES = (
+    "MFCONFIG",
+    "%s_LOG_TRY_TO_SPLIT_STDOUT_STDERR" % MFMODULE,
+    "%s_LOG_TRY_TO_SPLIT_MULTIPLE_WORKERS" % MFMODULE
+)
+"""Env vars the validated document depends on (variants and coercions).
+
+Env vars referenced in jinja2 blocks of configuration files are added.
+"""
+_HOOKS_LOCK = threading.RLock()
+JINJA2_BLOCK_REGEX = re.compile(r"\{[{%](.*?)[}%]\}", re.DOTALL)
+IDENTIFIER_REGEX = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 
 SCHEMA = {
     "general": {
@@ -67,6 +102,109 @@ SCHEMA = {
 }
 
 
+def get_document_cache_path(plugin_home):
+    """Return the validated document cache file path of a plugin home.
+
+    Args:
+        plugin_home (string): the plugin home.
+
+    Returns:
+        (string): the cache file path (in DOCUMENT_CACHE_DIR) or None if
+            the cache is disabled (DOCUMENT_CACHE_DIR is None).
+
+    """
+    if DOCUMENT_CACHE_DIR is None:
+        return None
+    h = hashlib.md5(os.path.realpath(plugin_home).encode("utf8"))
+    return os.path.join(DOCUMENT_CACHE_DIR, h.hexdigest())
+
+
+def _is_private(st):
+    # owned by the current user and not writable by others
+    return st.st_uid == os.getuid() and \
+        (st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)) == 0
+
+
+def _is_safe_document_cache_dir(dirname, create=False):
+    if create:
+        try:
+            os.makedirs(dirname, mode=0o700)
+        except FileExistsError:
+            pass
+    st = os.lstat(dirname)
+    return stat.S_ISDIR(st.st_mode) and _is_private(st)
+
+
+def _unsafe_document_cache_warning(path):
+    from mflog import get_logger
+    get_logger("mfplugin.configuration").warning(
+        "%s is not owned by the current user or is writable by others "
+        "=> ignoring the validated document cache" % path)
+
+
+def get_jinja2_env_names(content):
+    """Return the names which may be env vars used in jinja2 blocks.
+
+    This is an over-approximation (all identifiers inside jinja2 blocks
+    are returned).
+
+    Args:
+        content (string): a configuration file content.
+
+    Returns:
+        (set): set of names.
+
+    """
+    res = set()
+    for block in JINJA2_BLOCK_REGEX.findall(content):
+        res.update(IDENTIFIER_REGEX.findall(block))
+    return res
+
+
+def _is_hostname_option(option):
+    return option.endswith("_hostname") or option == "hostname"
+
+
+def _is_hostnames_option(option):
+    return option.endswith("_hostnames") or option == "hostnames"
+
+
+def _get_section_hostnames(values):
+    # hostnames to resolve to compute derived _ip / _ips fields
+    res = []
+    for option, val in values.items():
+        if _is_hostname_option(option):
+            if "%s_ip" % option not in values:
+                res.append(val)
+        elif _is_hostnames_option(option):
+            if "%s_ips" % option not in values:
+                res.extend(val.split(";"))
+    return res
+
+
+def _resolve_section(values, ips):
+    # add derived _ip / _ips fields (ips: hostname => ip or None)
+    res = {}
+    for option, val in values.items():
+        if _is_hostname_option(option):
+            if "%s_ip" % option not in values:
+                new_val = ips[val]
+                if new_val is None:
+                    new_val = "dns_error"
+                res["%s_ip" % option] = new_val
+        elif _is_hostnames_option(option):
+            if "%s_ips" % option not in values:
+                new_vals = []
+                for hostname in val.split(";"):
+                    new_val = ips[hostname]
+                    if new_val is None:
+                        new_val = "dns_error"
+                    new_vals.append(new_val)
+                res["%s_ips" % option] = ";".join(new_vals)
+        res[option] = val
+    return res
+
+
 class Configuration(object):
 
     def __init__(self, plugin_name, plugin_home, config_filepath=None,
@@ -90,16 +228,47 @@ class Configuration(object):
         else:
             paths = get_configuration_paths(plugin_name, plugin_home)
         self.paths = [x for x in paths if os.path.isfile(x)]
+        # (missing ones included, as their creation changes the document)
+        self._candidate_paths = paths
+        self.document_cache_path = None
+        """Validated document cache file path (string).
+
+        None (default) means no cache, it is set by Plugin for installed
+        plugins only (see get_document_cache_path()).
+        """
         self._commands = None
-        self._doc = None
+        self._apps = None
+        self._extra_daemons = None
+        self.__doc = None
+        self.__validated_doc = None
+        self.__sections = {}
         self.__loaded = False
 
+    @property
+    def _doc(self):
+        # the final document (all derived fields resolved)
+        if self.__doc is None and self.__validated_doc is not None:
+            self.resolve_all()
+        return self.__doc
+
+    @_doc.setter
+    def _doc(self, document):
+        self.__doc = document
+
+    def _is_lazy(self):
+        # derived _ip / _ips fields are resolved lazily only if hooks
+        # which may use them are not overridden
+        klass = self.__class__
+        return klass.get_final_document is Configuration.get_final_document \
+            and klass.after_load is Configuration.after_load
+
     def get_schema(self):
         return copy.deepcopy(SCHEMA)
 
     def get_configuration_env_dict(self, ignore_keys_starting_with=None,
                                    limit_to_section=None):
         self.load()
+        self.resolve_all()
         env_var_dict = {}
         if limit_to_section is None:
             sections = self._doc.keys()
@@ -127,71 +296,105 @@ class Configuration(object):
                     env_var_dict[name] = "%s" % val
         return env_var_dict
 
-    def __get_schema(self, parser):
-        schema = self.get_schema()
-        to_delete = [x for x in schema.keys() if "*" in x or "?" in x]
-        for key in to_delete:
-            orig = schema[key]
-            del schema[key]
-            for section in parser.sections():
-                if fnmatch.fnmatch(section, key):
-                    schema[section] = copy.deepcopy(orig)
-        return schema
-
-    def __get_public_schema(self, parser):
-        schema = self.__get_schema(parser)
-        public_schema = {}
-        for section in schema.keys():
-            if section.startswith('_'):
-                continue
-            if 'schema' not in schema[section]:
-                continue
-            public_schema[section] = \
-                {x: y for x, y in schema[section].items() if x != "schema"}
-            public_schema[section]['schema'] = {}
-            for key in schema[section]['schema'].keys():
-                if key.startswith('_'):
-                    continue
-                public_schema[section]['schema'][key] = \
-                    schema[section]['schema'][key]
-        return public_schema
-
     def _get_debug(self):
-        self.load()
-        res = {x: y for x, y in inspect.getmembers(self)
-               if is_jsonable(y) and not x.startswith('_')
-               and not x.startswith('raw_')}
-        res["_doc"] = self._doc
-        return res
+        return self.get_snapshot().to_dict()
+
+    def get_snapshot(self):
+        """Return a frozen snapshot of the loaded configuration.
+
+        Derived fields are resolved (see resolve_all()).
+
+        Returns:
+            (ConfigurationSnapshot): the snapshot (see mfplugin.snapshot).
+
+        """
+        return ConfigurationSnapshot.from_configuration(self)
 
     def get_final_document(self, validated_document):
+        """Hook to compute the final document from the validated one.
+
+        When overridden (as after_load()), the hook is called with current
+        plugin env vars set in os.environ, behind a process wide lock: loads
+        of configurations with overridden hooks are serialized. Prefer
+        get_interpolation_env() to read these env vars.
+
+        Args:
+            validated_document (dict): the validated document.
+
+        Returns:
+            (dict): the final document.
+
+        """
         return validated_document
 
+    def __resolve_hostnames(self, hostnames):
+        if not hostnames:
+            return {}
+        with phase("configuration.dns", self.plugin_name):
+            return get_resolver().resolve_many(hostnames)
+
+    def _get_section(self, section):
+        """Return a section of the final document.
+
+        Derived _ip / _ips fields of the section are resolved if needed
+        (but not the ones of other sections).
+
+        Args:
+            section (string): the section name.
+
+        Returns:
+            (dict): the section.
+
+        Raises:
+            KeyError: if the section does not exist.
+
+        """
+        self.load()
+        if self.__doc is not None or not self._is_lazy():
+            return self._doc[section]
+        try:
+            return self.__sections[section]
+        except KeyError:
+            pass
+        values = self.__validated_doc.get(section)
+        if not values:
+            # (empty sections are not in the final document)
+            raise KeyError(section)
+        ips = self.__resolve_hostnames(_get_section_hostnames(values))
+        self.__sections[section] = _resolve_section(values, ips)
+        return self.__sections[section]
+
+    def resolve_all(self):
+        """Resolve all derived _ip / _ips fields and finalize the document.
+
+        Hostnames are resolved lazily (when a section is accessed) except
+        when this method is called (for example to get the configuration
+        env dict) or if get_final_document() or after_load() are
+        overridden.
+
+        """
+        self.load()
+        if self.__doc is not None or self.__validated_doc is None:
+            return
+        with phase("configuration.final_document", self.plugin_name):
+            self.__doc = self.__get_final_document(self.__validated_doc)
+
     def __get_final_document(self, validated_document):
+        # hostnames of all not already resolved sections are resolved
+        # concurrently
+        hostnames = []
+        for section, values in validated_document.items():
+            if section not in self.__sections:
+                hostnames.extend(_get_section_hostnames(values))
+        ips = self.__resolve_hostnames(hostnames)
         vdocument = {}
-        for section in validated_document.keys():
-            for option in validated_document[section].keys():
-                val = validated_document[section][option]
-                if section not in vdocument:
-                    vdocument[section] = {}
-                if option.endswith("_hostname") or option == "hostname":
-                    if "%s_ip" % option not in validated_document[section]:
-                        new_val = resolve(val)
-                        if new_val is None:
-                            new_val = "dns_error"
-                        vdocument[section]["%s_ip" % option] = new_val
-                elif option.endswith("_hostnames") or option == "hostnames":
-                    if "%s_ips" % option not in validated_document[section]:
-                        hostname_list = val.split(";")
-                        new_vals = []
-                        for hostname in hostname_list:
-                            new_val = resolve(hostname)
-                            if new_val is None:
-                                new_val = "dns_error"
-                            new_vals.append(new_val)
-                        vdocument[section]["%s_ips" % option] = \
-                            ";".join(new_vals)
-                vdocument[section][option] = val
+        for section, values in validated_document.items():
+            if not values:
+                continue
+            if section in self.__sections:
+                vdocument[section] = self.__sections[section]
+            else:
+                vdocument[section] = _resolve_section(values, ips)
         try:
             return self.get_final_document(vdocument)
         except BadPlugin:
@@ -204,99 +407,251 @@ class Configuration(object):
             print("=> reraising", file=sys.stderr)
             raise
 
+    def get_compiled_schema(self, public=False):
+        """Return the compiled schema of the configuration class.
+
+        See mfplugin.schema.get_compiled_schema().
+
+        Args:
+            public (boolean): if True, the public schema is returned.
+
+        Returns:
+            (CompiledSchema): the compiled schema.
+
+        """
+        return get_compiled_schema(self, public=public)
+
+    def get_interpolation_env(self):
+        """Return the env used to render jinja2 blocks of the configuration.
+
+        This is a read-only overlay (nothing is copied, os.environ is not
+        modified) of the current plugin env vars on os.environ.
+
+        Returns:
+            (mapping): the env.
+
+        """
+        return get_env_overlay(get_current_envs(self.plugin_name,
+                                                self.plugin_home))
+
     def __validate(self, paths, public=False):
-        v = cerberus.Validator()
-        v.allow_unknown = False
-        v.require_all = True
+        interpolation = opinionated_configparser.Jinja2Interpolation(
+            self.get_interpolation_env())
         parser = opinionated_configparser.OpinionatedConfigParser(
-            delimiters=("=",), comment_prefixes=("#",))
+            delimiters=("=",), comment_prefixes=("#",),
+            interpolation=interpolation)
         parser.optionxform = str
         try:
-            parser.read(paths)
+            with phase("configuration.parse", self.plugin_name):
+                parser.read(paths)
         except Exception as e:
             raise BadPlugin("can't read configuration paths: %s" %
                             ", ".join(paths), original_exception=e)
-        if public:
-            schema = self.__get_public_schema(parser)
-        else:
-            schema = self.__get_schema(parser)
-        status = validate_configparser(v, parser, schema, public=public)
-        if status is False:
-            return (status, v.errors, None)
-        else:
-            return (True, {}, v.normalized(v.document))
+        with phase("configuration.validate", self.plugin_name):
+            document = configparser_to_document(parser, public=public)
+            return self.get_compiled_schema(public=public).validate(document)
 
     def load(self):
-        with PluginEnvContextManager(get_current_envs(self.plugin_name,
-                                                      self.plugin_home)):
-            if self.__loaded:
-                return False
-            self.__loaded = True
-            status, vv_errors, v_document = self.__validate(self.paths)
+        if self.__loaded:
+            return False
+        self.__loaded = True
+        key = None
+        v_document = None
+        if MFPLUGIN_DOCUMENT_CACHE != "0" and \
+                self.document_cache_path is not None:
+            with phase("configuration.cache_read", self.plugin_name):
+                # the key is computed before reading any input (so a
+                # change during the validation will invalidate the cache)
+                key = self.__get_document_cache_key()
+                v_document = self.__read_document_cache(key)
+        if v_document is None:
+            v_document = self.__validate_or_raise()
+            if key is not None:
+                with phase("configuration.cache_write", self.plugin_name):
+                    try:
+                        self.__write_document_cache(key, v_document)
+                    except Exception as e:
+                        from mflog import get_logger
+                        get_logger("mfplugin.configuration").warning(
+                            "can't write the validated document cache of "
+                            "plugin %s (details: %s)" % (self.plugin_name, e))
+        self.__validated_doc = v_document
+        if not self._is_lazy():
+            self.__load_overridden_hooks()
+
+    def __load_overridden_hooks(self):
+        # overridden hooks may read current plugin env vars in os.environ
+        # (legacy behaviour) => as os.environ is process wide, hooks calls
+        # (and the env change) are serialized behind a process wide lock
+        # (so concurrent loads never see the env of another plugin)
+        with _HOOKS_LOCK:
+            with PluginEnvContextManager(
+                    get_current_envs(self.plugin_name, self.plugin_home)):
+                self.resolve_all()
+                with phase("configuration.load_document",
+                           self.plugin_name):
+                    self.__load_commands()
+
+    def __validate_or_raise(self):
+        status, vv_errors, v_document = self.__validate(self.paths)
+        if status is not False:
+            return v_document
+        if len(self.paths) == 1:
+            errors = cerberus_errors_to_human_string(vv_errors)
+            raise BadPlugin(
+                "invalid configuration file: %s" %
+                self._config_filepath,
+                validation_errors=errors)
+        # we are trying to find the bad file
+        status, v_errors, _ = \
+            self.__validate([self._config_filepath])
+        if status is False:
+            errors = cerberus_errors_to_human_string(v_errors)
+            raise BadPlugin(
+                "invalid configuration file: %s" %
+                self._config_filepath,
+                validation_errors=errors)
+        for p in self.paths:
+            if p == self._config_filepath:
+                continue
+            status, v_errors, _ = \
+                self.__validate([p], public=True)
             if status is False:
-                if len(self.paths) == 1:
-                    errors = cerberus_errors_to_human_string(vv_errors)
-                    raise BadPlugin(
-                        "invalid configuration file: %s" %
-                        self._config_filepath,
-                        validation_errors=errors)
-                else:
-                    # we are trying to find the bad file
-                    status, v_errors, _ = \
-                        self.__validate([self._config_filepath])
-                    if status is False:
-                        errors = cerberus_errors_to_human_string(v_errors)
-                        raise BadPlugin(
-                            "invalid configuration file: %s" %
-                            self._config_filepath,
-                            validation_errors=errors)
-                    for p in self.paths:
-                        if p == self._config_filepath:
-                            continue
-                        status, v_errors, _ = \
-                            self.__validate([p], public=True)
-                        if status is False:
-                            errors = cerberus_errors_to_human_string(v_errors)
-                            raise BadPlugin(
-                                "invalid configuration, please fix: %s" % p,
-                                validation_errors=errors)
-                    errors = cerberus_errors_to_human_string(vv_errors)
-                    candidates = " or ".join(self.paths)
-                    raise BadPlugin(
-                        "invalid configuration, please fix: %s" % candidates,
-                        validation_errors=errors)
-            self._doc = self.__get_final_document(v_document)
-            self._apps = []
-            self._extra_daemons = []
-            # FIXME: step mfdata ?
-            for section in [x for x in self._doc.keys()
-                            if x.startswith("app_") or x.startswith("step_")]:
-                c = self.app_class
-                if section.startswith("app_"):
-                    name = section[4:]
-                elif section.startswith("step_"):
-                    name = section[5:]
-                else:
-                    raise Exception("non handled case: %s" % section)
-                command = c(self.plugin_home, self.plugin_name, name,
-                            self._doc[section], self._doc.get('custom', {}))
-                self.add_app(command)
-            for section in [x for x in self._doc.keys()
-                            if x.startswith("extra_daemon_")]:
-                c = self.extra_daemon_class
-                command = c(self.plugin_home,
-                            self.plugin_name,
-                            section.replace('extra_daemon_', '', 1),
-                            self._doc[section],
-                            self._doc.get('custom', {}))
-                self.add_extra_daemon(command)
-            self.after_load()
+                errors = cerberus_errors_to_human_string(v_errors)
+                raise BadPlugin(
+                    "invalid configuration, please fix: %s" % p,
+                    validation_errors=errors)
+        errors = cerberus_errors_to_human_string(vv_errors)
+        candidates = " or ".join(self.paths)
+        raise BadPlugin(
+            "invalid configuration, please fix: %s" % candidates,
+            validation_errors=errors)
+
+    def __get_document_cache_key(self):
+        klass = self.__class__
+        return {
+            "version": DOCUMENT_CACHE_VERSION,
+            "class": "%s.%s" % (klass.__module__, klass.__qualname__),
+            "schema": self.get_compiled_schema().digest,
+            "fingerprint": get_files_fingerprint(self._candidate_paths)
+        }
+
+    def __read_document_cache(self, key):
+        path = self.document_cache_path
+        try:
+            if not _is_safe_document_cache_dir(os.path.dirname(path)):
+                _unsafe_document_cache_warning(os.path.dirname(path))
+                return None
+            with open(path, "rb") as f:
+                if not _is_private(os.fstat(f.fileno())):
+                    _unsafe_document_cache_warning(path)
+                    return None
+                content = marshal.loads(f.read())
+            if content["key"] != key:
+                return None
+            env = self.get_interpolation_env()
+            for name, value in content["env"].items():
+                if env.get(name, None) != value:
+                    return None
+            return content["document"]
+        except Exception:
+            return None
+
+    def __write_document_cache(self, key, document):
+        names = set(DOCUMENT_CACHE_ENV_NAMES)
+        for path in self.paths:
+            with open(path, "r") as f:
+                names.update(get_jinja2_env_names(f.read()))
+        env = self.get_interpolation_env()
+        content = {
+            "key": key,
+            "env": {x: env.get(x, None) for x in sorted(names)},
+            "document": document
+        }
+        path = self.document_cache_path
+        if not _is_safe_document_cache_dir(os.path.dirname(path),
+                                           create=True):
+            raise Exception("unsafe directory: %s" % os.path.dirname(path))
+        tmpname = "%s.%s" % (path, get_unique_hexa_identifier())
+        try:
+            fd = os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                         0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(marshal.dumps(content))
+            os.rename(tmpname, path)
+        except Exception:
+            try:
+                os.unlink(tmpname)
+            except Exception:
+                pass
+            raise
+
+    def _load_document(self, document):
+        """Load an already validated and finalized document.
+
+        This is used to load a configuration document computed in another
+        process (see PluginsManager.load_full()).
+
+        Args:
+            document (dict): the final document.
+
+        """
+        if self.__loaded:
+            return False
+        self.__loaded = True
+        self.__validated_doc = document
+        self.__doc = document
+        if not self._is_lazy():
+            self.__load_overridden_hooks()
+
+    def __load_commands(self):
+        if self._apps is not None:
+            return
+        self._apps = []
+        self._extra_daemons = []
+        if self.__doc is not None:
+            sections = list(self.__doc.keys())
+        else:
+            sections = list(self.__validated_doc.keys())
+        try:
+            custom = self._get_section("custom")
+        except KeyError:
+            custom = {}
+        # FIXME: step mfdata ?
+        for section in [x for x in sections
+                        if x.startswith("app_") or x.startswith("step_")]:
+            c = self.app_class
+            if section.startswith("app_"):
+                name = section[4:]
+            elif section.startswith("step_"):
+                name = section[5:]
+            else:
+                raise Exception("non handled case: %s" % section)
+            command = c(self.plugin_home, self.plugin_name, name,
+                        self._get_section(section), custom)
+            self.add_app(command)
+        for section in [x for x in sections
+                        if x.startswith("extra_daemon_")]:
+            c = self.extra_daemon_class
+            command = c(self.plugin_home,
+                        self.plugin_name,
+                        section.replace('extra_daemon_', '', 1),
+                        self._get_section(section),
+                        custom)
+            self.add_extra_daemon(command)
+        self.after_load()
 
     def after_load(self):
+        """Hook called after commands are built.
+
+        See get_final_document() about the env and the lock.
+
+        """
         pass
 
     def add_app(self, app):
         self.load()
+        self.__load_commands()
         self._apps.append(app)
 
     def add_step(self, app):
@@ -304,66 +659,62 @@ class Configuration(object):
 
     def add_extra_daemon(self, extra_daemon):
         self.load()
+        self.__load_commands()
         self._extra_daemons.append(extra_daemon)
 
     def load_full(self):
         self.load()
 
-    @property
+    @loaded_property
     def apps(self):
         self.load()
+        self.__load_commands()
         return self._apps
 
-    @property
+    @loaded_property
     def steps(self):
         self.load()
+        self.__load_commands()
         return self._apps
 
-    @property
+    @loaded_property
     def extra_daemons(self):
         self.load()
+        self.__load_commands()
         return self._extra_daemons
 
-    @property
+    @loaded_property
     def version(self):
-        self.load()
-        return self._doc['general']['_version']
+        return self._get_section('general')['_version']
 
-    @property
+    @loaded_property
     def release(self):
-        self.load()
-        return self._doc['general']['_release']
+        return self._get_section('general')['_release']
 
-    @property
+    @loaded_property
     def summary(self):
-        self.load()
-        return self._doc['general']['_summary']
+        return self._get_section('general')['_summary']
 
-    @property
+    @loaded_property
     def license(self):
-        self.load()
-        return self._doc['general']['_license']
+        return self._get_section('general')['_license']
 
-    @property
+    @loaded_property
     def maintainer(self):
-        self.load()
-        return self._doc['general']['_maintainer']
+        return self._get_section('general')['_maintainer']
 
-    @property
+    @loaded_property
     def packager(self):
         return self.maintainer
 
-    @property
+    @loaded_property
     def vendor(self):
-        self.load()
-        return self._doc['general']['_vendor']
+        return self._get_section('general')['_vendor']
 
-    @property
+    @loaded_property
     def url(self):
-        self.load()
-        return self._doc['general']['_url']
+        return self._get_section('general')['_url']
 
-    @property
+    @loaded_property
     def add_plugin_dir_to_python_path(self):
-        self.load()
-        return self._doc['general']['_add_plugin_dir_to_python_path']
+        return self._get_section('general')['_add_plugin_dir_to_python_path']
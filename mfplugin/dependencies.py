@@ -0,0 +1,139 @@
+import os
+import threading
+from mfplugin.utils import layerapi2_label_to_plugin_name, \
+    layerapi2_label_to_plugin_home, PluginDependencyCycle
+
+
+def read_plugin_dependencies(home):
+    """Read the plugin labels listed in the .layerapi2_dependencies file.
+
+    Args:
+        home (string): the plugin home.
+
+    Returns:
+        (list): list of plugin labels (strings), empty if the file is
+        missing.
+
+    """
+    lines = []
+    try:
+        # FIXME: shoud be better to parse this file in layerapi2
+        with open("%s/.layerapi2_dependencies" % home, "r") as f:
+            lines = f.readlines()
+    except Exception:
+        pass
+    res = []
+    for line in lines:
+        tmp = line.strip()
+        if tmp.startswith('-'):
+            tmp = tmp[1:]
+        if tmp.startswith("plugin_"):
+            res.append(tmp)
+    return res
+
+
+class PluginDependencyGraph(object):
+    """Memoized graph of the dependencies between plugins.
+
+    Nodes are plugin homes. The dependencies of each node and the env
+    fragment of each dependency (see get_dependencies_env_dict()) are
+    computed only once, so building the env of all plugins is linear in
+    plugins plus edges.
+
+    This is a snapshot: call clear() after some changes in the plugins
+    base directory (this is done by PluginsManager.refresh()).
+
+    """
+
+    def __init__(self, plugins_base_dir):
+        self.plugins_base_dir = plugins_base_dir
+        """Plugins base directory (string)."""
+        self._dependencies = {}
+        self._fragments = {}
+        self._local = threading.local()
+
+    def clear(self):
+        """Forget all memoized dependencies and env fragments."""
+        self._dependencies = {}
+        self._fragments = {}
+
+    def get_dependencies(self, home):
+        """Return the direct plugin dependencies of a plugin.
+
+        Args:
+            home (string): the plugin home.
+
+        Returns:
+            (list): list of (label, name, home) tuples, name is None if the
+            label is not a valid plugin label, home is None if the
+            dependency is not installed.
+
+        """
+        if home not in self._dependencies:
+            res = []
+            for label in read_plugin_dependencies(home):
+                try:
+                    name = layerapi2_label_to_plugin_name(label)
+                except Exception:
+                    res.append((label, None, None))
+                    continue
+                dep_home = layerapi2_label_to_plugin_home(
+                    self.plugins_base_dir, label)
+                res.append((label, name, dep_home))
+            self._dependencies[home] = res
+        return self._dependencies[home]
+
+    def get_dependencies_env_dict(self, home):
+        """Return the merged env fragments of the dependencies of a plugin.
+
+        The env fragment of a dependency is its env dict without current
+        envs (this includes its own dependencies fragments).
+
+        Args:
+            home (string): the plugin home.
+
+        Returns:
+            (dict): env dict.
+
+        Raises:
+            PluginDependencyCycle: if there is a dependency cycle.
+
+        """
+        stack = self.__get_stack()
+        if home in stack:
+            cycle = stack[stack.index(home):] + [home]
+            raise PluginDependencyCycle(
+                "plugin dependency cycle: %s" %
+                " -> ".join(os.path.basename(x) for x in cycle))
+        stack.append(home)
+        try:
+            res = {}
+            for _, _, dep_home in self.get_dependencies(home):
+                if dep_home is None:
+                    continue
+                fragment = self._get_fragment(dep_home)
+                if fragment is not None:
+                    res.update(fragment)
+            return res
+        finally:
+            stack.pop()
+
+    def __get_stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _get_fragment(self, home):
+        if home not in self._fragments:
+            # to avoid a circular import
+            from mfplugin.plugin import Plugin
+            try:
+                p = Plugin(self.plugins_base_dir, home,
+                           dependency_graph=self)
+                p.load()
+            except Exception:
+                self._fragments[home] = None
+                return None
+            self._fragments[home] = \
+                p.get_plugin_env_dict(add_current_envs=False)
+        return self._fragments[home]
@@ -0,0 +1,133 @@
+"""Light helpers to read plugins env caches.
+
+This module is used by plugin_wrapper fast paths, so it must only import
+light (standard library) modules.
+
+"""
+import os
+import pickle
+from mfplugin.fingerprint import is_fingerprint_unchanged
+
+ENV_CACHE_FILENAME = ".configuration_cache"
+"""Name of the env cache file (in the plugin home)."""
+MFMODULE = os.environ.get("MFMODULE", "GENERIC")
+MFMODULE_LOWERCASE = os.environ.get("MFMODULE_LOWERCASE", "generic")
+MFMODULE_RUNTIME_HOME = os.environ.get("MFMODULE_RUNTIME_HOME", "/tmp")
+__pdoc__ = {
+    "MFMODULE": False,
+    "MFMODULE_LOWERCASE": False,
+    "MFMODULE_RUNTIME_HOME": False
+}
+
+
+def get_plugins_base_dir(plugins_base_dir=None):
+    """Return the given plugins base directory or the default one.
+
+    This is the same than mfplugin.utils.get_default_plugins_base_dir()
+    but without importing mfplugin.utils.
+
+    Args:
+        plugins_base_dir (string): the plugins base directory (if None,
+            the default plugins base directory is returned).
+
+    Returns:
+        (string): the plugins base directory.
+
+    """
+    if plugins_base_dir is not None:
+        return plugins_base_dir
+    if "MFMODULE_PLUGINS_BASE_DIR" in os.environ:
+        return os.environ.get("MFMODULE_PLUGINS_BASE_DIR")
+    return os.path.join(MFMODULE_RUNTIME_HOME, "var", "plugins")
+
+
+def read_env_cache(home):
+    """Read the env cache file of a plugin.
+
+    Args:
+        home (string): the plugin home.
+
+    Returns:
+        (list): [fingerprint, hash, env, add_plugin_dir_to_python_path]
+        list or None if the cache is missing or invalid.
+
+    """
+    try:
+        with open(os.path.join(home, ENV_CACHE_FILENAME), "rb") as f:
+            content = pickle.loads(f.read())
+    except Exception:
+        return None
+    if not isinstance(content, list) or len(content) != 4:
+        return None
+    return content
+
+
+def finalize_cached_env(env, home, add_plugin_dir_to_python_path):
+    """Complete a cached env dict (in place) before using it.
+
+    Args:
+        env (dict): the cached env dict.
+        home (string): the plugin home.
+        add_plugin_dir_to_python_path (boolean): if True, the plugin home is
+            prepended to PYTHONPATH.
+
+    Returns:
+        (dict): the env dict.
+
+    """
+    env["%s_CURRENT_PLUGIN_CACHE" % MFMODULE] = "1"
+    tmpdir = env.get("TMPDIR", "")
+    if tmpdir != "" and not os.path.isdir(tmpdir):
+        try:
+            os.makedirs(tmpdir, exist_ok=True)
+        except OSError:
+            pass
+    if add_plugin_dir_to_python_path:
+        # PYTHONPATH can't be cached (because it depends on loaded layers)
+        old_python_path = os.environ.get("PYTHONPATH", None)
+        if old_python_path:
+            env["PYTHONPATH"] = home + ":" + old_python_path
+        else:
+            env["PYTHONPATH"] = home
+    return env
+
+
+def get_plugin_env_from_cache(name, plugins_base_dir=None):
+    """Get the env of an installed plugin from its env cache (if valid).
+
+    Only the stat fingerprint is checked here (if it changed, None is
+    returned and the caller has to use
+    Plugin.get_plugin_env_dict(cache=True) which can compare contents).
+
+    Args:
+        name (string): the plugin name.
+        plugins_base_dir (string): the plugins base directory (if None,
+            the default plugins base directory is used).
+
+    Returns:
+        (dict): a dict with "env" (same than
+        Plugin.get_plugin_env_dict(cache=True)), "home", "layer" and
+        "add_plugin_dir_to_python_path" keys or None.
+
+    """
+    home = os.path.abspath(os.path.join(
+        get_plugins_base_dir(plugins_base_dir), name))
+    layer = "plugin_%s@%s" % (name, MFMODULE_LOWERCASE)
+    try:
+        with open(os.path.join(home, ".layerapi2_label"), "r") as f:
+            if f.read().strip() != layer:
+                return None
+    except OSError:
+        return None
+    content = read_env_cache(home)
+    if content is None:
+        return None
+    fingerprint, _, env, add_plugin_dir_to_python_path = content
+    if not is_fingerprint_unchanged(fingerprint):
+        return None
+    return {
+        "env": finalize_cached_env(env, home, add_plugin_dir_to_python_path),
+        "home": home,
+        "layer": layer,
+        "add_plugin_dir_to_python_path": add_plugin_dir_to_python_path
+    }
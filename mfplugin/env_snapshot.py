@@ -0,0 +1,211 @@
+"""Read-only snapshot of the env dicts of all installed plugins.
+
+This module is used by plugin_wrapper fast path, so it must only import
+light (standard library) modules.
+
+File format (ENV_SNAPSHOT_FILENAME file in the plugins base directory):
+
+- ENV_SNAPSHOT_MAGIC (8 bytes)
+- header length and index length (2 big endian unsigned 32 bits ints)
+- header (json): format details and validity informations
+- index (json): plugin name => [offset, length] of the plugin entry
+  (offset is relative to the end of the index)
+- plugin entries (json)
+
+So a plugin entry can be read (with mmap) without decoding other ones.
+
+"""
+import os
+import json
+import mmap
+import struct
+from mfplugin.fingerprint import is_fingerprint_unchanged
+from mfplugin.env_cache import get_plugins_base_dir, finalize_cached_env
+
+ENV_SNAPSHOT_FILENAME = ".env_snapshot"
+"""Name of the env snapshot file (in the plugins base directory)."""
+ENV_SNAPSHOT_MAGIC = b"MFPENV01"
+"""Magic bytes at the beginning of env snapshot files."""
+_PREFIX = struct.Struct(">II")
+
+
+def get_env_snapshot_path(plugins_base_dir=None):
+    """Return the env snapshot file path of a plugins base directory.
+
+    Args:
+        plugins_base_dir (string): the plugins base directory (if None,
+            the default plugins base directory is used).
+
+    Returns:
+        (string): the env snapshot file path.
+
+    """
+    return os.path.join(get_plugins_base_dir(plugins_base_dir),
+                        ENV_SNAPSHOT_FILENAME)
+
+
+def get_base_entries(plugins_base_dir):
+    """Return the plugin directory names of a plugins base directory.
+
+    Hidden files (registry, env snapshot, staging directories...) are
+    ignored, so writing them does not change the result (contrary to the
+    plugins base directory mtime).
+
+    Args:
+        plugins_base_dir (string): the plugins base directory.
+
+    Returns:
+        (list): sorted list of names.
+
+    """
+    return sorted(x for x in os.listdir(plugins_base_dir)
+                  if not x.startswith("."))
+
+
+def make_env_snapshot_entry(plugin):
+    """Make the env snapshot entry of a plugin.
+
+    Args:
+        plugin (Plugin): the plugin object.
+
+    Returns:
+        (dict): the entry (jsonable).
+
+    """
+    # the fingerprint is computed before reading any input (so a change
+    # during the computation will invalidate the entry)
+    fingerprint = plugin.get_configuration_fingerprint()
+    env = plugin._get_plugin_env_dict(add_current_envs=True,
+                                      set_tmp_dir=True, cache=False)
+    return {
+        "fingerprint": fingerprint,
+        "home": plugin.home,
+        "layer": plugin.layerapi2_layer_name,
+        "add_plugin_dir_to_python_path":
+            plugin.configuration.add_plugin_dir_to_python_path,
+        "env": env
+    }
+
+
+def write_env_snapshot(path, entries, header):
+    """Write an env snapshot file (atomically).
+
+    Args:
+        path (string): the env snapshot file path.
+        entries (dict): plugin name => entry (see make_env_snapshot_entry()).
+        header (dict): header (jsonable).
+
+    """
+    blobs = []
+    index = {}
+    offset = 0
+    for name in sorted(entries.keys()):
+        blob = json.dumps(entries[name]).encode("utf8")
+        blobs.append(blob)
+        index[name] = [offset, len(blob)]
+        offset = offset + len(blob)
+    header_bytes = json.dumps(header).encode("utf8")
+    index_bytes = json.dumps(index).encode("utf8")
+    tmppath = "%s.%s" % (path, os.getpid())
+    try:
+        with open(tmppath, "wb") as f:
+            f.write(ENV_SNAPSHOT_MAGIC)
+            f.write(_PREFIX.pack(len(header_bytes), len(index_bytes)))
+            f.write(header_bytes)
+            f.write(index_bytes)
+            for blob in blobs:
+                f.write(blob)
+        os.rename(tmppath, path)
+    except Exception:
+        try:
+            os.unlink(tmppath)
+        except Exception:
+            pass
+        raise
+
+
+def read_env_snapshot_entry(path, name):
+    """Read the entry of a plugin in an env snapshot file.
+
+    Args:
+        path (string): the env snapshot file path.
+        name (string): the plugin name.
+
+    Returns:
+        (tuple): (header, entry) tuple (entry is None if the plugin is not
+        in the snapshot) or None if the file is missing or invalid.
+
+    """
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                start = len(ENV_SNAPSHOT_MAGIC)
+                if m[0:start] != ENV_SNAPSHOT_MAGIC:
+                    return None
+                header_len, index_len = \
+                    _PREFIX.unpack(m[start:start + _PREFIX.size])
+                start = start + _PREFIX.size
+                header = json.loads(m[start:start + header_len])
+                start = start + header_len
+                index = json.loads(m[start:start + index_len])
+                if name not in index:
+                    return (header, None)
+                offset, length = index[name]
+                start = start + index_len + offset
+                entry = json.loads(m[start:start + length])
+    except Exception:
+        return None
+    return (header, entry)
+
+
+def get_plugin_env_from_snapshot(name, plugins_base_dir=None):
+    """Get the env of a plugin from the env snapshot (if it is valid).
+
+    The snapshot is valid if the plugin directories of the plugins base
+    directory didn't change since its creation (no plugin
+    installed/uninstalled, see get_base_entries()), if MFCONFIG env
+    var is the same and if the configuration input files of the plugin
+    (see Plugin.get_configuration_input_paths()) didn't change.
+
+    Args:
+        name (string): the plugin name.
+        plugins_base_dir (string): the plugins base directory (if None,
+            the default plugins base directory is used).
+
+    Returns:
+        (dict): a dict with "env" (same than
+        Plugin.get_plugin_env_dict(cache=True)), "home", "layer" and
+        "add_plugin_dir_to_python_path" keys or None if the snapshot is
+        missing or outdated.
+
+    """
+    path = get_env_snapshot_path(plugins_base_dir)
+    tmp = read_env_snapshot_entry(path, name)
+    if tmp is None:
+        return None
+    header, entry = tmp
+    if entry is None:
+        return None
+    base_dir = os.path.dirname(path)
+    try:
+        base_ino = os.stat(base_dir).st_ino
+        base_entries = get_base_entries(base_dir)
+    except OSError:
+        return None
+    if header.get("base_ino") != base_ino or \
+            header.get("base_entries") != base_entries:
+        # plugins were installed/uninstalled since the snapshot creation
+        # (replaced plugins are detected by entry fingerprints)
+        return None
+    if header.get("mfconfig") != os.environ.get("MFCONFIG", None):
+        return None
+    if not is_fingerprint_unchanged(entry["fingerprint"]):
+        return None
+    return {
+        "env": finalize_cached_env(entry["env"], entry["home"],
+                                   entry["add_plugin_dir_to_python_path"]),
+        "home": entry["home"],
+        "layer": entry["layer"],
+        "add_plugin_dir_to_python_path":
+            entry["add_plugin_dir_to_python_path"]
+    }
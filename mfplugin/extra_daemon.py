@@ -7,6 +7,8 @@ EXTRA_DAEMON_SCHEMA = {
 
 class ExtraDaemon(Command):
 
+    __slots__ = ()
+
     def __init__(self, plugin_home, plugin_name, name, doc_fragment,
                  custom_fragment):
         Command.__init__(self, plugin_home, plugin_name, name, doc_fragment,
@@ -1,8 +1,18 @@
 import os
-import tarfile
 import json
+from mfplugin.compression import open_tarfile
 from mfplugin.utils import get_default_plugins_base_dir, \
-    BadPluginFile, layerapi2_label_to_plugin_name
+    BadPluginFile, layerapi2_label_to_plugin_name, loaded_property
+
+PLUGIN_FILE_FORMAT_VERSION = 2
+"""Format version of the plugin files built by this library.
+
+- 1: plain tar of the metwork_plugin directory
+- 2: same with an index (label, metadata and files) as first member
+
+"""
+PLUGIN_FILE_INDEX = "metwork_plugin/.plugin_index.json"
+"""Name of the index member in plugin files (file_format_version >= 2)."""
 
 
 class PluginFile(object):
@@ -16,30 +26,131 @@ class PluginFile(object):
         """Plugin file path (string)."""
         self.__loaded = False
 
-    def load(self):
-        if self.__loaded:
-            return
-        self.__loaded = True
+    def __open(self):
         if not os.path.isfile(self.plugin_filepath):
             raise BadPluginFile("%s does not exist" % self.plugin_filepath)
         try:
-            tf = tarfile.open(name=self.plugin_filepath, mode='r')
+            return open_tarfile(self.plugin_filepath)
         except Exception as e:
             raise BadPluginFile(
-                "can't open %s as a tar.gz file => this is probably not a "
+                "can't open %s as a plugin file => this is probably not a "
                 "metwork >= 1.0 plugin" % self.plugin_filepath,
                 original_exception=e)
+
+    def load(self):
+        if self.__loaded:
+            return
+        self.__loaded = True
+        tf = self.__open()
         try:
-            reader1 = tf.extractfile("metwork_plugin/.layerapi2_label")
-            label = reader1.read().decode('utf8').strip()
-            self._name = layerapi2_label_to_plugin_name(label)
+            # stream mode (the only one available for some codecs)
+            member = tf.next()
+            if member is not None and member.name == PLUGIN_FILE_INDEX:
+                # file_format_version >= 2: the index is the first member, so
+                # we don't have to decompress the payload
+                index = json.loads(tf.extractfile(member).read().
+                                   decode('utf8'))
+                self._load_index(index)
+                return
+            # old plugin file: we read the members we need in a single pass
+            members = self.__read_members(tf, member)
+        except BadPluginFile:
+            raise
+        except Exception as e:
+            raise BadPluginFile("can't read %s" % self.plugin_filepath,
+                                original_exception=e)
+        finally:
+            tf.close()
+        self._load_members(lambda x: members["metwork_plugin/%s" % x])
+
+    def _load_from_index(self):
+        """Load plugin file metadata from the index only (if any).
+
+        Only the first member of the plugin file is read (so the payload
+        is not decompressed).
+
+        Returns:
+            (boolean): True if loaded, False if the plugin file does not
+                have an index (file_format_version 1, see load() or
+                _load_from_directory() in this case).
+
+        """
+        if self.__loaded:
+            return True
+        tf = self.__open()
+        try:
+            member = tf.next()
+            if member is None or member.name != PLUGIN_FILE_INDEX:
+                return False
+            index = json.loads(tf.extractfile(member).read().
+                               decode('utf8'))
+        except Exception as e:
+            raise BadPluginFile("can't read %s" % self.plugin_filepath,
+                                original_exception=e)
+        finally:
+            tf.close()
+        self.__loaded = True
+        self._load_index(index)
+        return True
+
+    def __read_members(self, tf, member):
+        members = {}
+        wanted = set(["metwork_plugin/%s" % x for x in
+                      (".layerapi2_label", ".metadata.json", ".files.json")])
+        while member is not None:
+            if member.name in wanted and member.isfile():
+                members[member.name] = tf.extractfile(member).read()
+                if len(members) == len(wanted):
+                    break
+            member = tf.next()
+        return members
+
+    def _load_from_directory(self, directory):
+        """Load plugin file metadata from an extracted plugin file.
+
+        Args:
+            directory (string): the directory where the plugin file was
+                extracted (the "metwork_plugin" directory).
+
+        """
+        if self.__loaded:
+            return
+        self.__loaded = True
+
+        def read(filename):
+            with open(os.path.join(directory, filename), "rb") as f:
+                return f.read()
+
+        self._load_members(read)
+
+    def _load_members(self, read):
+
+        def load(filename, decode):
+            try:
+                return decode(read(filename).decode('utf8').strip())
+            except Exception as e:
+                raise BadPluginFile(
+                    "can't read/find metwork_plugin/%s file in plugin" %
+                    filename, original_exception=e)
+
+        self._load_index({
+            "format_version": 1,
+            "label": load(".layerapi2_label", str),
+            "metadata": load(".metadata.json", json.loads),
+            "files": load(".files.json", json.loads)
+        })
+
+    def _load_index(self, index):
+        self._file_format_version = index.get("format_version", 1)
+        try:
+            self._name = layerapi2_label_to_plugin_name(index["label"])
         except Exception as e:
             raise BadPluginFile(
                 "can't read/find metwork_plugin/.layerapi2_label file in "
                 "plugin", original_exception=e)
         try:
-            reader2 = tf.extractfile("metwork_plugin/.metadata.json")
-            metadata = json.loads(reader2.read().decode('utf8').strip())
+            metadata = index["metadata"]
+            self._metadata = metadata
             self._version = metadata['version']
             self._release = metadata['release']
             self._build_host = metadata['build_host']
@@ -50,74 +161,86 @@ class PluginFile(object):
             self._packager = metadata['packager']
             self._vendor = metadata['vendor']
             self._url = metadata['url']
+            self._compression = metadata.get('compression', 'gzip')
         except Exception as e:
             raise BadPluginFile(
                 "can't read/find metwork_plugin/.metadata.json file in "
                 "plugin", original_exception=e)
         try:
-            reader3 = tf.extractfile("metwork_plugin/.files.json")
-            self._files = json.loads(reader3.read().decode('utf8').strip())
+            self._files = index["files"]
+            if not isinstance(self._files, list):
+                raise Exception("files must be a list")
         except Exception as e:
             raise BadPluginFile(
                 "can't read/find metwork_plugin/.files.json file in "
                 "plugin", original_exception=e)
 
-    @property
+    @loaded_property
     def summary(self):
         self.load()
         return self._summary
 
-    @property
+    @loaded_property
     def license(self):
         self.load()
         return self._license
 
-    @property
+    @loaded_property
     def packager(self):
         self.load()
         return self._packager
 
-    @property
+    @loaded_property
     def name(self):
         self.load()
         return self._name
 
-    @property
+    @loaded_property
     def vendor(self):
         self.load()
         return self._vendor
 
-    @property
+    @loaded_property
     def url(self):
         self.load()
         return self._url
 
-    @property
+    @loaded_property
     def version(self):
         self.load()
         return self._version
 
-    @property
+    @loaded_property
     def release(self):
         self.load()
         return self._release
 
-    @property
+    @loaded_property
     def size(self):
         self.load()
         return self._size
 
-    @property
+    @loaded_property
     def build_host(self):
         self.load()
         return self._build_host
 
-    @property
+    @loaded_property
     def build_date(self):
         self.load()
         return self._build_date
 
-    @property
+    @loaded_property
+    def file_format_version(self):
+        self.load()
+        return self._file_format_version
+
+    @loaded_property
+    def compression(self):
+        self.load()
+        return self._compression
+
+    @loaded_property
     def files(self):
         self.load()
         return self._files
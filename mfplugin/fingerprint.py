@@ -0,0 +1,52 @@
+import os
+
+
+def get_file_fingerprint(path):
+    """Return a stat based fingerprint of a file.
+
+    A missing (or unreadable) file has a fingerprint too (so its creation
+    changes the fingerprint).
+
+    Args:
+        path (string): the file path.
+
+    Returns:
+        (tuple): (path, inode, size, mtime_ns) tuple (with None values for
+        missing files).
+
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None, None)
+    return (path, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def get_files_fingerprint(paths):
+    """Return a stat based fingerprint of a list of files.
+
+    Args:
+        paths (list): list of file paths.
+
+    Returns:
+        (tuple): tuple of get_file_fingerprint() results.
+
+    """
+    return tuple(get_file_fingerprint(x) for x in paths)
+
+
+def is_fingerprint_unchanged(fingerprint):
+    """Check if a get_files_fingerprint() result is still up to date.
+
+    As paths are part of the fingerprint, only stat calls are needed.
+
+    Args:
+        fingerprint: a get_files_fingerprint() result (tuples can be
+            replaced by lists, after a json round trip for example).
+
+    Returns:
+        (boolean): True if the fingerprint is unchanged.
+
+    """
+    current = get_files_fingerprint([x[0] for x in fingerprint])
+    return [list(x) for x in current] == [list(x) for x in fingerprint]
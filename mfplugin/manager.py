@@ -1,30 +1,44 @@
 import os
 import sys
-import tarfile
 import filelock
 import shutil
-import glob
 from functools import wraps
+from collections.abc import Mapping, ValuesView, ItemsView
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from mfutil import mkdir_p_or_die, BashWrapperOrRaise
 from mfutil import get_unique_hexa_identifier
-import configupdater
 from mfplugin.plugin import Plugin
 from mfplugin.configuration import Configuration
 from mfplugin.app import App
 from mfplugin.extra_daemon import ExtraDaemon
-from mfplugin.file import PluginFile
+from mfplugin.file import PluginFile, PLUGIN_FILE_INDEX
+from mfplugin.compression import open_tarfile
+from mfplugin.manifest import update_manifest_entry
+from mfplugin.registry import get_plugins_registry
+from mfplugin.dependencies import PluginDependencyGraph
+from mfplugin.profiling import profiled
+from mfplugin.env_snapshot import get_env_snapshot_path, \
+    make_env_snapshot_entry, write_env_snapshot, get_base_entries
+from mfplugin.snapshot import dumps as dump_snapshots, \
+    loads as load_snapshots
 from mfplugin.utils import get_default_plugins_base_dir, \
     BadPlugin, plugin_name_to_layerapi2_label, \
     NotInstalledPlugin, AlreadyInstalledPlugin, CantInstallPlugin, \
-    CantUninstallPlugin, \
+    CantUninstallPlugin, BadPluginFile, \
     _touch_conf_monitor_control_file, get_plugin_lock_path, \
     get_extra_daemon_class, get_app_class, get_configuration_class, \
-    layerapi2_label_to_plugin_home, PluginEnvContextManager
+    get_shell_env_prefix, lazy_module, \
+    layerapi2_label_file_to_plugin_name, validate_plugin_name
 
+configupdater = lazy_module("configupdater")
 __pdoc__ = {
-    "with_lock": False
+    "with_lock": False,
+    "with_lock_without_notify": False,
+    "PluginsValuesView": False,
+    "PluginsItemsView": False
 }
 MFMODULE_RUNTIME_HOME = os.environ.get("MFMODULE_RUNTIME_HOME", "/tmp")
+MFPLUGIN_LOAD_WORKERS = os.environ.get("MFPLUGIN_LOAD_WORKERS", "0")
 LOGGER = None
 
 
@@ -36,7 +50,7 @@ def get_logger(*args, **kwargs):
     return LOGGER
 
 
-def with_lock(f):
+def with_lock(f, notify=True):
     @wraps(f)
     def wrapper(*args, **kwargs):
         lock_path = get_plugin_lock_path()
@@ -47,7 +61,8 @@ def with_lock(f):
         try:
             with lock.acquire(poll_interval=1):
                 res = f(*args, **kwargs)
-            _touch_conf_monitor_control_file()
+            if notify:
+                _touch_conf_monitor_control_file()
             return res
         except filelock.Timeout:
             get_logger().warning("can't acquire plugin management lock "
@@ -56,12 +71,203 @@ def with_lock(f):
     return wrapper
 
 
+def with_lock_without_notify(f):
+    # same than with_lock but the configuration monitor is not notified
+    # (nothing changed in plugins)
+    return with_lock(f, notify=False)
+
+
+def _get_configuration_document(configuration_class, app_class,
+                                extra_daemon_class, plugin_name, plugin_home,
+                                dont_read_config_overrides,
+                                document_cache_path):
+    # executed in a worker process by PluginsManager.load_full()
+    configuration = configuration_class(
+        plugin_name, plugin_home,
+        app_class=app_class,
+        extra_daemon_class=extra_daemon_class,
+        dont_read_config_overrides=dont_read_config_overrides
+    )
+    configuration.document_cache_path = document_cache_path
+    configuration.load()
+    return configuration._doc
+
+
+def get_plugin_fingerprint(plugin_home):
+    """Get a cheap fingerprint of a plugin directory.
+
+    The fingerprint is built from stat calls only: inode and mtime of
+    the plugin directory, mtimes of .layerapi2_label and .metadata.json
+    files.
+
+    Args:
+        plugin_home (string): the plugin home.
+
+    Returns:
+        (tuple): the fingerprint.
+
+    """
+    res = []
+    try:
+        st = os.stat(plugin_home)
+        res.append((st.st_ino, st.st_mtime_ns))
+    except OSError:
+        res.append(None)
+    for filename in (".layerapi2_label", ".metadata.json"):
+        try:
+            res.append(os.stat(os.path.join(plugin_home,
+                                            filename)).st_mtime_ns)
+        except OSError:
+            res.append(None)
+    return tuple(res)
+
+
+class PluginsValuesView(ValuesView):
+
+    def __iter__(self):
+        for name in self._mapping:
+            try:
+                yield self._mapping[name]
+            except KeyError:
+                # bad plugin (already logged)
+                continue
+
+
+class PluginsItemsView(ItemsView):
+
+    def __iter__(self):
+        for name in self._mapping:
+            try:
+                yield (name, self._mapping[name])
+            except KeyError:
+                # bad plugin (already logged)
+                continue
+
+
+class PluginsMapping(Mapping):
+    """Read-only mapping plugin name => Plugin object.
+
+    Keys come from the plugins registry (so the plugins base directory is
+    not scanned to list them) and Plugin objects are only built when
+    accessed (and then memoized with a fingerprint of their directory, see
+    refresh()). A registry entry whose label file is not readable or does
+    not match its name anymore is not a key: it is skipped by iteration,
+    len() and the in operator (which only read label files, so they
+    don't build Plugin objects).
+
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+        self._homes = {x["name"]: x["home"]
+                       for x in manager.registry.entries}
+        self._plugins = {}
+        self._fingerprints = {}
+        for entry in manager.registry.bad_entries:
+            get_logger().warning("found bad plugin in %s => ignoring it "
+                                 "(details: %s)" % (entry["home"],
+                                                    entry["error"]))
+
+    def __getitem__(self, name):
+        try:
+            return self._plugins[name]
+        except KeyError:
+            pass
+        home = self._homes[name]
+        fingerprint = get_plugin_fingerprint(home)
+        plugin = self._manager._make_plugin_or_none(home)
+        if plugin is None or plugin.name != name:
+            del self._homes[name]
+            raise KeyError(name)
+        self._plugins[name] = plugin
+        self._fingerprints[name] = fingerprint
+        return plugin
+
+    def _is_valid(self, name):
+        # cheap check (only the label file is read, no Plugin object is
+        # built) of what makes __getitem__ fail
+        if name in self._plugins:
+            return True
+        home = self._homes.get(name)
+        if home is None:
+            return False
+        try:
+            label_name = layerapi2_label_file_to_plugin_name(
+                os.path.join(home, ".layerapi2_label"))
+            validate_plugin_name(label_name)
+        except Exception:
+            return False
+        return label_name == name
+
+    def __iter__(self):
+        for name in list(self._homes.keys()):
+            if self._is_valid(name):
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, name):
+        return self._is_valid(name)
+
+    def values(self):
+        return PluginsValuesView(self)
+
+    def items(self):
+        return PluginsItemsView(self)
+
+    def refresh(self):
+        """Refresh the mapping after some changes in the plugins base dir.
+
+        Keys are read again from the plugins registry. Already built
+        Plugin objects are kept if their directory fingerprint (see
+        get_plugin_fingerprint()) did not change, others will be built
+        again when accessed.
+
+        Returns:
+            (tuple): (added, removed, changed) tuple of sorted lists of
+                plugin names (changed is only about already built plugins).
+
+        """
+        homes = {x["name"]: x["home"]
+                 for x in self._manager.registry.entries}
+        added = sorted(x for x in homes.keys() if x not in self._homes)
+        removed = sorted(x for x in self._homes.keys() if x not in homes)
+        changed = []
+        for name in list(self._plugins.keys()):
+            if name in homes and homes[name] == self._homes[name] and \
+                    get_plugin_fingerprint(homes[name]) == \
+                    self._fingerprints[name]:
+                continue
+            if name in homes:
+                changed.append(name)
+            del self._plugins[name]
+            del self._fingerprints[name]
+        self._homes = homes
+        return (added, removed, sorted(changed))
+
+    def materialize(self, workers=0):
+        """Build all (not already built) Plugin objects.
+
+        Args:
+            workers (int): number of threads to use.
+
+        """
+        names = [x for x in self._homes.keys() if x not in self._plugins]
+        if workers > 1 and len(names) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self.get, names))
+        else:
+            [self.get(x) for x in names]
+
+
 class PluginsManager(object):
 
     def __init__(self, plugins_base_dir=None,
                  configuration_class=None,
                  app_class=None,
-                 extra_daemon_class=ExtraDaemon):
+                 extra_daemon_class=ExtraDaemon,
+                 workers=None):
         self.configuration_class = get_configuration_class(configuration_class,
                                                            Configuration)
         """Configuration class."""
@@ -75,6 +281,21 @@ class PluginsManager(object):
         """Plugin base directory (string)."""
         if not os.path.isdir(self.plugins_base_dir):
             mkdir_p_or_die(self.plugins_base_dir)
+        self.registry = get_plugins_registry(self.plugins_base_dir)
+        """Plugins registry (PluginsRegistry)."""
+        self.dependency_graph = PluginDependencyGraph(self.plugins_base_dir)
+        """Plugin dependency graph (PluginDependencyGraph)."""
+        if workers is None:
+            try:
+                workers = int(MFPLUGIN_LOAD_WORKERS)
+            except ValueError:
+                workers = 0
+        self.workers = workers
+        """Number of workers used by load() and load_full() (integer).
+
+        0 or 1 means that plugins are loaded one after another (default),
+        the default value can be changed with MFPLUGIN_LOAD_WORKERS env var.
+        """
         self.__loaded = False
 
     def make_plugin(self, plugin_home, dont_read_config_overrides=False):
@@ -82,11 +303,12 @@ class PluginsManager(object):
                       configuration_class=self.configuration_class,
                       app_class=self.app_class,
                       extra_daemon_class=self.extra_daemon_class,
-                      dont_read_config_overrides=dont_read_config_overrides)
+                      dont_read_config_overrides=dont_read_config_overrides,
+                      dependency_graph=self.dependency_graph)
 
     def get_plugin(self, name):
         label = plugin_name_to_layerapi2_label(name)
-        home = layerapi2_label_to_plugin_home(self.plugins_base_dir, label)
+        home = self.registry.get_home(label)
         if home is None:
             raise NotInstalledPlugin("plugin: %s not installed" % name)
         return self.make_plugin(home)
@@ -96,51 +318,52 @@ class PluginsManager(object):
 
     def _preuninstall_plugin(self, plugin):
         if shutil.which("_plugins.preuninstall"):
-            env_context = {
+            env_prefix = get_shell_env_prefix({
                 "MFMODULE_PLUGINS_BASE_DIR": self.plugins_base_dir
-            }
+            })
             # FIXME: should be python methods and not shell
-            with PluginEnvContextManager(env_context):
-                x = BashWrapperOrRaise(
-                    "_plugins.preuninstall %s %s %s" %
-                    (plugin.name, plugin.version, plugin.release))
-                if len(x.stderr) != 0:
-                    print(x.stderr, file=sys.stderr)
+            x = BashWrapperOrRaise(
+                "%s_plugins.preuninstall %s %s %s" %
+                (env_prefix, plugin.name, plugin.version, plugin.release))
+            if len(x.stderr) != 0:
+                print(x.stderr, file=sys.stderr)
 
     def _postinstall_plugin(self, plugin):
         if shutil.which("_plugins.postinstall"):
-            env_context = {
+            env_prefix = get_shell_env_prefix({
                 "MFMODULE_PLUGINS_BASE_DIR": self.plugins_base_dir
-            }
+            })
             # FIXME: should be python methods and not shell
-            with PluginEnvContextManager(env_context):
-                x = BashWrapperOrRaise(
-                    "_plugins.postinstall %s %s %s" %
-                    (plugin.name, plugin.version, plugin.release))
-                if len(x.stderr) != 0:
-                    print(x.stderr, file=sys.stderr)
+            x = BashWrapperOrRaise(
+                "%s_plugins.postinstall %s %s %s" %
+                (env_prefix, plugin.name, plugin.version, plugin.release))
+            if len(x.stderr) != 0:
+                print(x.stderr, file=sys.stderr)
 
-    def _uninstall_plugin(self, name):
-        p = self.get_plugin(name)
-        preuninstall_exception = None
+    def _preuninstall_plugin_or_exception(self, plugin):
         try:
-            self._preuninstall_plugin(p)
+            self._preuninstall_plugin(plugin)
         except Exception as e:
-            preuninstall_exception = e
             # we keep the exception but we want to continue to remove the
             # plugin
-        if p.is_dev_linked:
-            os.unlink(p.home)
+            return e
+        return None
+
+    def _remove_plugin_files(self, plugin):
+        if plugin.is_dev_linked:
+            os.unlink(plugin.home)
         else:
-            shutil.rmtree(p.home, ignore_errors=True)
-        self.__loaded = False
+            shutil.rmtree(plugin.home, ignore_errors=True)
+
+    def _check_uninstalled_plugin(self, plugin, preuninstall_exception):
+        name = plugin.name
         try:
             self.get_plugin(name)
         except NotInstalledPlugin:
             pass
         else:
             raise CantUninstallPlugin("can't uninstall plugin: %s" % name)
-        if os.path.exists(p.home):
+        if os.path.exists(plugin.home):
             raise CantUninstallPlugin("can't uninstall plugin: %s "
                                       "(directory still here)" % name)
         if preuninstall_exception is not None:
@@ -149,6 +372,15 @@ class PluginsManager(object):
                 "found some problems during preuninstall script",
                 original_exception=preuninstall_exception)
 
+    def _uninstall_plugin(self, name):
+        p = self.get_plugin(name)
+        preuninstall_exception = self._preuninstall_plugin_or_exception(p)
+        self._remove_plugin_files(p)
+        self.registry.update(name)
+        self.registry.save()
+        self.refresh()
+        self._check_uninstalled_plugin(p, preuninstall_exception)
+
     def __before_install_develop(self, name):
         try:
             self.get_plugin(name)
@@ -175,39 +407,205 @@ class PluginsManager(object):
                 pass
             raise
 
-    def _install_plugin(self, plugin_filepath, new_name=None):
+    def _make_staging_dir(self):
+        # next to the plugins base directory (same filesystem for the final
+        # rename) but not inside it (so the registry is not invalidated)
+        base_dir = os.path.normpath(os.path.abspath(self.plugins_base_dir))
+        basename = ".%s.install_%s" % \
+            (os.path.basename(base_dir), get_unique_hexa_identifier())
+        staging_dir = os.path.join(os.path.dirname(base_dir), basename)
+        try:
+            os.mkdir(staging_dir)
+        except OSError:
+            # (the parent directory is not writable)
+            staging_dir = os.path.join(base_dir, basename)
+            os.mkdir(staging_dir)
+        return staging_dir
+
+    def _extract_plugin(self, plugin_filepath, new_name=None,
+                        replace=False):
         x = PluginFile(plugin_filepath)
-        x.load()
-        self.__before_install_develop(new_name if new_name is not None
-                                      else x.name)
-        if new_name is not None:
-            name = new_name
-        else:
-            name = x.name
+        # with an index (file_format_version >= 2), label and metadata are read
+        # before the extraction (so bad or already installed plugins are
+        # not extracted)
+        has_index = x._load_from_index()
+        if has_index and not replace:
+            self.__before_install_develop(
+                new_name if new_name is not None else x.name)
+        try:
+            # stream mode: the archive is decompressed only once
+            tf = open_tarfile(plugin_filepath)
+        except Exception as e:
+            raise BadPluginFile(
+                "can't open %s as a plugin file => this is probably not a "
+                "metwork >= 1.0 plugin" % plugin_filepath,
+                original_exception=e)
+        staging_dir = None
         try:
-            tf = tarfile.open(plugin_filepath, "r")
+            staging_dir = self._make_staging_dir()
             # extractall without filter is deprecated for Python >= 3.12
             # Filter doesn't exist for Python <= 3.8 (it works as
             #   "fully_trusted")
             # Default filter in Python 3.14 will be "data"
             # See https://peps.python.org/pep-0706/
             try:
-                tf.extractall(self.plugins_base_dir, filter="fully_trusted")
-            except Exception:
-                tf.extractall(self.plugins_base_dir)
-            os.rename(os.path.join(self.plugins_base_dir, "metwork_plugin"),
-                      os.path.join(self.plugins_base_dir, name))
+                try:
+                    tf.extractall(staging_dir, filter="fully_trusted")
+                except TypeError:
+                    tf.extractall(staging_dir)
+            finally:
+                tf.close()
+            try:
+                # the index (file_format_version >= 2) is not installed
+                os.unlink(os.path.join(staging_dir, PLUGIN_FILE_INDEX))
+            except FileNotFoundError:
+                pass
+            plugin_dir = os.path.join(staging_dir, "metwork_plugin")
+            if has_index:
+                # the index must match the extracted files
+                y = PluginFile(plugin_filepath)
+                y._load_from_directory(plugin_dir)
+                if (x.name, x._metadata, x._files) != \
+                        (y.name, y._metadata, y._files):
+                    raise BadPluginFile(
+                        "the index of %s doesn't match its content" %
+                        plugin_filepath)
+            else:
+                # file_format_version 1: no index => metadata are read from
+                # the extracted files (instead of a second pass)
+                x._load_from_directory(plugin_dir)
+            name = new_name if new_name is not None else x.name
+            if not has_index and not replace:
+                self.__before_install_develop(name)
+            if new_name:
+                lalpath = os.path.join(plugin_dir, ".layerapi2_label")
+                with open(lalpath, "w") as f:
+                    f.write(plugin_name_to_layerapi2_label(new_name) + "\n")
+                # (so the renamed plugin is not reported as modified)
+                update_manifest_entry(plugin_dir,
+                                      "metwork_plugin/.layerapi2_label")
+        except (BadPluginFile, AlreadyInstalledPlugin):
+            if staging_dir is not None:
+                shutil.rmtree(staging_dir, True)
+            raise
         except Exception as e:
-            raise CantInstallPlugin("can't install plugin %s" % x.name,
-                                    original_exception=e)
-        if new_name:
-            lalpath = os.path.join(self.plugins_base_dir, name,
-                                   ".layerapi2_label")
-            with open(lalpath, "w") as f:
-                f.write(plugin_name_to_layerapi2_label(new_name) + "\n")
-        self.__loaded = False
-        self.__after_install_develop(new_name if new_name is not None
-                                     else x.name)
+            if staging_dir is not None:
+                shutil.rmtree(staging_dir, True)
+            raise CantInstallPlugin("can't install plugin %s" %
+                                    plugin_filepath, original_exception=e)
+        return (name, staging_dir)
+
+    def _finalize_plugin_install(self, name, staging_dir):
+        try:
+            self.__before_install_develop(name)
+            try:
+                os.rename(os.path.join(staging_dir, "metwork_plugin"),
+                          os.path.join(self.plugins_base_dir, name))
+            except Exception as e:
+                raise CantInstallPlugin("can't install plugin %s" % name,
+                                        original_exception=e)
+        finally:
+            shutil.rmtree(staging_dir, True)
+        self.registry.update(name)
+        self.registry.save()
+        self.refresh()
+        self.__after_install_develop(name)
+
+    def _install_plugin(self, plugin_filepath, new_name=None):
+        name, staging_dir = self._extract_plugin(plugin_filepath,
+                                                 new_name=new_name)
+        self._finalize_plugin_install(name, staging_dir)
+
+    def _install_plugins(self, plugin_filepaths, workers=None,
+                         replace=False):
+        if workers is None:
+            workers = self.workers
+        results = {x: None for x in plugin_filepaths}
+
+        def extract(plugin_filepath):
+            try:
+                return self._extract_plugin(plugin_filepath,
+                                            replace=replace)
+            except Exception as e:
+                results[plugin_filepath] = e
+            return None
+
+        # extractions are independent => they can be done in parallel
+        if workers > 1 and len(plugin_filepaths) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                extracted = list(executor.map(extract, plugin_filepaths))
+        else:
+            extracted = [extract(x) for x in plugin_filepaths]
+        if replace:
+            # old plugins are uninstalled only now (after extractions) to
+            # keep the window without them as short as possible
+            names = [x[0] for x in extracted if x is not None]
+            uninstall_results = self._uninstall_plugins(names,
+                                                        workers=workers)
+            for i, tmp in enumerate(extracted):
+                if tmp is None:
+                    continue
+                e = uninstall_results[tmp[0]]
+                if e is not None and not isinstance(e, NotInstalledPlugin):
+                    shutil.rmtree(tmp[1], True)
+                    results[plugin_filepaths[i]] = e
+                    extracted[i] = None
+        # but final steps (registry, postinstall...) are done one by one
+        for plugin_filepath, tmp in zip(plugin_filepaths, extracted):
+            if tmp is None:
+                continue
+            try:
+                self._finalize_plugin_install(*tmp)
+            except Exception as e:
+                results[plugin_filepath] = e
+        return results
+
+    def _remove_plugin_files_or_exception(self, plugin):
+        try:
+            self._remove_plugin_files(plugin)
+        except Exception as e:
+            return CantUninstallPlugin("can't remove plugin files of %s" %
+                                       plugin.name, original_exception=e)
+        return None
+
+    def _uninstall_plugins(self, names, workers=None):
+        if workers is None:
+            workers = self.workers
+        # (a plugin can't be uninstalled twice)
+        names = list(dict.fromkeys(names))
+        results = {x: None for x in names}
+        plugins = []
+        for name in names:
+            try:
+                plugins.append(self.get_plugin(name))
+            except Exception as e:
+                results[name] = e
+        preuninstall_exceptions = \
+            [self._preuninstall_plugin_or_exception(x) for x in plugins]
+        # removals are independent => they can be done in parallel
+        # (errors are collected per plugin, so they don't stop the batch)
+        if workers > 1 and len(plugins) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                remove_exceptions = list(executor.map(
+                    self._remove_plugin_files_or_exception, plugins))
+        else:
+            remove_exceptions = [self._remove_plugin_files_or_exception(x)
+                                 for x in plugins]
+        for plugin in plugins:
+            self.registry.update(plugin.name)
+        self.registry.save()
+        self.refresh()
+        for plugin, preuninstall_exception, remove_exception in \
+                zip(plugins, preuninstall_exceptions, remove_exceptions):
+            if remove_exception is not None:
+                results[plugin.name] = remove_exception
+                continue
+            try:
+                self._check_uninstalled_plugin(plugin,
+                                               preuninstall_exception)
+            except Exception as e:
+                results[plugin.name] = e
+        return results
 
     def _develop_plugin(self, plugin_home):
         p = self.make_plugin(plugin_home)
@@ -217,10 +615,13 @@ class PluginsManager(object):
             os.symlink(p.home, os.path.join(self.plugins_base_dir, p.name))
         except OSError:
             pass
-        self.__loaded = False
+        self.registry.update(p.name)
+        self.registry.save()
+        self.refresh()
         self.__after_install_develop(p.name)
 
     @with_lock
+    @profiled("manager.install_plugin")
     def install_plugin(self, plugin_filepath, new_name=None):
         """Install a plugin from a .plugin file.
 
@@ -237,6 +638,7 @@ class PluginsManager(object):
         self._install_plugin(plugin_filepath, new_name=new_name)
 
     @with_lock
+    @profiled("manager.uninstall_plugin")
     def uninstall_plugin(self, name):
         """Uninstall a plugin.
 
@@ -251,6 +653,81 @@ class PluginsManager(object):
         self._uninstall_plugin(name)
 
     @with_lock
+    @profiled("manager.install_plugins")
+    def install_plugins(self, plugin_filepaths, workers=None):
+        """Install several plugins from .plugin files.
+
+        The plugin management lock is acquired only once (and the
+        configuration monitor is notified only once at the end).
+        Extractions are done in parallel (if workers > 1), other steps
+        are done plugin after plugin. A failure doesn't stop the
+        installation of other plugins.
+
+        Args:
+            plugin_filepaths (list): list of plugin file paths.
+            workers (int): number of threads to use for extractions
+                (if not set, the workers attribute is used).
+
+        Returns:
+            (dict): plugin file path => None (if the plugin was installed)
+                or the exception raised during the installation (see
+                install_plugin() for the exception classes).
+
+        """
+        return self._install_plugins(plugin_filepaths, workers=workers)
+
+    @with_lock
+    @profiled("manager.replace_plugins")
+    def replace_plugins(self, plugin_filepaths, workers=None):
+        """Install several plugins from .plugin files (replacing old ones).
+
+        This is the same than install_plugins() but already installed
+        plugins with the same names are uninstalled first (after the
+        extraction of the new ones), in the same plugin management lock
+        (and with a single notification of the configuration monitor).
+
+        Args:
+            plugin_filepaths (list): list of plugin file paths.
+            workers (int): number of threads to use for extractions
+                and removals (if not set, the workers attribute is used).
+
+        Returns:
+            (dict): plugin file path => None (if the plugin was installed)
+                or the exception raised during the uninstallation of the
+                old plugin or during the installation (see
+                uninstall_plugin() and install_plugin() for the exception
+                classes).
+
+        """
+        return self._install_plugins(plugin_filepaths, workers=workers,
+                                     replace=True)
+
+    @with_lock
+    @profiled("manager.uninstall_plugins")
+    def uninstall_plugins(self, names, workers=None):
+        """Uninstall several plugins.
+
+        The plugin management lock is acquired only once (and the
+        configuration monitor is notified only once at the end).
+        Removals of plugin directories are done in parallel
+        (if workers > 1). A failure doesn't stop the uninstallation of
+        other plugins.
+
+        Args:
+            names (list): list of plugin names to uninstall.
+            workers (int): number of threads to use for removals
+                (if not set, the workers attribute is used).
+
+        Returns:
+            (dict): plugin name => None (if the plugin was uninstalled)
+                or the exception raised during the uninstallation (see
+                uninstall_plugin() for the exception classes).
+
+        """
+        return self._uninstall_plugins(names, workers=workers)
+
+    @with_lock
+    @profiled("manager.develop_plugin")
     def develop_plugin(self, plugin_home):
         """Install a plugin in development mode.
 
@@ -265,6 +742,112 @@ class PluginsManager(object):
         """
         self._develop_plugin(plugin_home)
 
+    @with_lock_without_notify
+    @profiled("manager.compile_env_snapshot")
+    def compile_env_snapshot(self):
+        """Compile the env of all installed plugins into the env snapshot.
+
+        The env snapshot (see mfplugin.env_snapshot) is used by
+        plugin_wrapper fast path. It is automatically considered as
+        outdated after a plugin installation/uninstallation or a
+        configuration change.
+
+        Returns:
+            (list): sorted list of plugin names in the snapshot (bad plugins
+                are ignored) or None if the plugin management lock can't be
+                acquired.
+
+        """
+        entries = {}
+        for name, plugin in self.plugins.items():
+            try:
+                entries[name] = make_env_snapshot_entry(plugin)
+            except Exception as e:
+                get_logger().warning("can't compile the env of plugin %s "
+                                     "=> ignoring it (details: %s)" %
+                                     (name, e))
+        self.registry.load()
+        header = {
+            "base_ino": os.stat(self.plugins_base_dir).st_ino,
+            "base_entries": get_base_entries(self.plugins_base_dir),
+            "mfconfig": os.environ.get("MFCONFIG", None)
+        }
+        write_env_snapshot(get_env_snapshot_path(self.plugins_base_dir),
+                           entries, header)
+        # the snapshot creation changed the plugins base directory mtime
+        # so the registry must be saved again (this does not invalidate
+        # the snapshot, see get_base_entries())
+        self.registry.save()
+        return sorted(entries.keys())
+
+    @profiled("manager.get_snapshots")
+    def get_snapshots(self):
+        """Return frozen snapshots of all installed plugins.
+
+        Bad plugins are ignored (with a warning).
+
+        Returns:
+            (dict): plugin name => PluginSnapshot (see mfplugin.snapshot).
+
+        """
+        res = {}
+        for name, plugin in self.plugins.items():
+            try:
+                res[name] = plugin.get_snapshot()
+            except Exception as e:
+                get_logger().warning("can't snapshot plugin %s => ignoring "
+                                     "it (details: %s)" % (name, e))
+        return res
+
+    def dump_snapshot(self, path, fmt="json"):
+        """Dump snapshots of all installed plugins into a file.
+
+        The file can be read by load_snapshot() (or by any json reader
+        with the json format) without loading plugins again.
+
+        Args:
+            path (string): the file path.
+            fmt (string): serialization format ("json" or "marshal").
+
+        Returns:
+            (list): sorted list of plugin names in the file (bad plugins
+                are ignored).
+
+        """
+        snapshots = self.get_snapshots()
+        data = dump_snapshots(
+            [snapshots[x] for x in sorted(snapshots.keys())], fmt=fmt)
+        tmpname = "%s.%s" % (path, get_unique_hexa_identifier())
+        try:
+            with open(tmpname, "wb") as f:
+                f.write(data)
+            os.rename(tmpname, path)
+        except Exception:
+            try:
+                os.unlink(tmpname)
+            except Exception:
+                pass
+            raise
+        return sorted(snapshots.keys())
+
+    def load_snapshot(self, path):
+        """Load snapshots dumped by dump_snapshot().
+
+        Args:
+            path (string): the file path.
+
+        Returns:
+            (dict): plugin name => PluginSnapshot (see mfplugin.snapshot).
+
+        Raises:
+            ValueError: if the file can't be decoded.
+
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        return {x.name: x for x in load_snapshots(data)}
+
+    @profiled("manager.repackage_plugin")
     def repackage_plugin(self, name):
         p = self.get_plugin(name)
         p.load_full()
@@ -315,27 +898,91 @@ class PluginsManager(object):
         new_p = self.make_plugin(tmpdir)
         return new_p.build()
 
-    def load(self):
-        if self.__loaded:
-            return
-        self.__loaded = True
-        self._plugins = {}
-        for directory in glob.glob(os.path.join(self.plugins_base_dir, "*")):
-            dname = os.path.basename(directory)
-            if dname == "base":
-                # special directory (not a plugin one)
-                continue
-            try:
-                plugin = self.make_plugin(directory)
-            except BadPlugin as e:
-                get_logger().warning("found bad plugin in %s => ignoring it "
-                                     "(details: %s)" % (directory, e))
-                continue
-            self._plugins[plugin.name] = plugin
+    def refresh(self):
+        """Refresh the plugins list after some changes.
 
-    def load_full(self):
-        self.load()
-        [x.load_full() for x in self.plugins.values()]
+        Only plugins added, removed or changed since the last load (or
+        refresh) are built again (see PluginsMapping.refresh()). The
+        plugin dependency graph is cleared.
+
+        Returns:
+            (tuple): (added, removed, changed) tuple of sorted lists of
+                plugin names (or None if the plugins list is not loaded).
+
+        """
+        self.dependency_graph.clear()
+        if not self.__loaded:
+            return None
+        return self._plugins.refresh()
+
+    def _make_plugin_or_none(self, directory):
+        try:
+            return self.make_plugin(directory)
+        except BadPlugin as e:
+            get_logger().warning("found bad plugin in %s => ignoring it "
+                                 "(details: %s)" % (directory, e))
+        return None
+
+    def load(self, workers=None):
+        """Load the plugins list of the plugins base directory (if needed).
+
+        Plugin objects are built only when accessed, except if
+        workers > 1 (then they are all built with a thread pool).
+
+        Args:
+            workers (int): number of threads to use (if not set, the workers
+                attribute is used).
+
+        """
+        if workers is None:
+            workers = self.workers
+        if not self.__loaded:
+            self.__loaded = True
+            self._plugins = PluginsMapping(self)
+        if workers > 1:
+            self._plugins.materialize(workers)
+
+    def _load_configurations(self, plugins, workers):
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for plugin in plugins:
+                futures.append(executor.submit(
+                    _get_configuration_document,
+                    plugin.configuration_class,
+                    plugin.app_class,
+                    plugin.extra_daemon_class,
+                    plugin.name, plugin.home,
+                    plugin._dont_read_config_overrides,
+                    plugin.configuration.document_cache_path))
+            for plugin, future in zip(plugins, futures):
+                try:
+                    document = future.result()
+                except Exception:
+                    # the configuration will be loaded again (in this
+                    # process) by load_full() to get the real exception
+                    continue
+                plugin.configuration._load_document(document)
+
+    @profiled("manager.load_full")
+    def load_full(self, workers=None):
+        """Load and validate all plugins (including their configuration).
+
+        Args:
+            workers (int): number of threads to use to load plugins and
+                number of processes to use to validate plugins
+                configurations (if not set, the workers attribute is used).
+
+        Raises:
+            BadPlugin: if a plugin has a bad configuration.
+
+        """
+        if workers is None:
+            workers = self.workers
+        self.load(workers=workers)
+        plugins = list(self.plugins.values())
+        if workers > 1 and len(plugins) > 1:
+            self._load_configurations(plugins, workers)
+        [x.load_full() for x in plugins]
 
     @property
     def plugins(self):
@@ -0,0 +1,174 @@
+import os
+import json
+import stat
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_FILENAME = ".manifest.json"
+"""Name of the manifest file (in the plugin home)."""
+MANIFEST_ALGORITHM = "sha256"
+"""Digest algorithm used in manifests."""
+GENERATED_FILENAMES = (".files.json", ".metadata.json", MANIFEST_FILENAME)
+"""Files generated by the build (and not listed in the manifest)."""
+RUNTIME_PREFIXES = (".configuration_cache",)
+"""Name prefixes of plugin home files created at runtime (top level)."""
+RUNTIME_DIRNAMES = ("__pycache__",)
+"""Names of directories created at runtime (at any level)."""
+CHUNK_SIZE = 1024 * 1024
+__pdoc__ = {
+    "CHUNK_SIZE": False,
+    "HashingReader": False
+}
+
+
+class HashingReader(object):
+    """File object wrapper which computes the digest of read data."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hash = hashlib.new(MANIFEST_ALGORITHM)
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hash.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def hash_file(path):
+    """Compute the digest of a file (by chunks).
+
+    Args:
+        path (string): the file path.
+
+    Returns:
+        (string): hexadecimal digest.
+
+    """
+    h = hashlib.new(MANIFEST_ALGORITHM)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def update_manifest_entry(home, key):
+    """Update the manifest entry of a (regular) file changed on purpose.
+
+    This is used when a file is legitimately rewritten at install time
+    (for example the .layerapi2_label file of a renamed plugin), so the
+    plugin is not reported as modified by verify_tree(). Nothing is done
+    if there is no manifest (plugin built by an older version) or if the
+    file is not in it.
+
+    Args:
+        home (string): the plugin home.
+        key (string): the "metwork_plugin/..." path of the file.
+
+    """
+    manifest_path = os.path.join(home, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.loads(f.read())
+    except FileNotFoundError:
+        return
+    if key not in manifest["files"]:
+        return
+    path = os.path.join(home, key[len("metwork_plugin/"):])
+    st = os.stat(path)
+    manifest["files"][key] = {"size": st.st_size,
+                              "mode": stat.S_IMODE(st.st_mode),
+                              MANIFEST_ALGORITHM: hash_file(path)}
+    with open(manifest_path, "w") as f:
+        f.write(json.dumps(manifest, indent=4))
+
+
+def _check_entry(path, entry):
+    # returns None (ok), "missing" or "modified"
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return "missing"
+    if "symlink" in entry:
+        if not stat.S_ISLNK(st.st_mode) or \
+                os.readlink(path) != entry["symlink"]:
+            return "modified"
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return "modified"
+    if st.st_size != entry["size"] or \
+            stat.S_IMODE(st.st_mode) != entry["mode"]:
+        # no need to compute the digest
+        return "modified"
+    try:
+        if hash_file(path) != entry[MANIFEST_ALGORITHM]:
+            return "modified"
+    except OSError:
+        return "modified"
+    return None
+
+
+def _get_extra_files(home, expected, matches=None):
+    extra = []
+    for root, dirs, fles in os.walk(home):
+        # runtime and ignored directories are pruned (never walked)
+        dirs[:] = [x for x in dirs if x not in RUNTIME_DIRNAMES and
+                   (matches is None or not matches(os.path.join(root, x)))]
+        # symlinks to directories are listed in dirs (but not followed)
+        names = fles + [x for x in dirs
+                        if os.path.islink(os.path.join(root, x))]
+        for name in names:
+            if root == home and (name in GENERATED_FILENAMES or
+                                 name.startswith(RUNTIME_PREFIXES)):
+                continue
+            path = os.path.join(root, name)
+            if matches is not None and matches(path):
+                continue
+            key = "metwork_plugin/" + path[len(home) + 1:]
+            if key not in expected:
+                extra.append(key)
+    return extra
+
+
+def verify_tree(home, manifest, workers=None, matches=None):
+    """Check an installed plugin tree against its manifest.
+
+    Args:
+        home (string): the plugin home.
+        manifest (dict): manifest content (see Plugin.build()).
+        workers (int): number of threads used to hash files (default
+            to the number of cpus).
+        matches: function which returns True for ignored paths (see
+            .releaseignore), ignored directories are not walked and
+            ignored files are not reported as extra files.
+
+    Returns:
+        (dict): a dict with "missing", "modified" and "extra" keys (sorted
+        lists of "metwork_plugin/..." paths, like in .files.json).
+
+    """
+    files = manifest["files"]
+    res = {"missing": [], "modified": [], "extra": []}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    paths = sorted(files.keys())
+
+    def check(key):
+        path = os.path.join(home, key[len("metwork_plugin/"):])
+        return _check_entry(path, files[key])
+
+    if workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(check, paths))
+    else:
+        results = [check(x) for x in paths]
+    for key, result in zip(paths, results):
+        if result is not None:
+            res[result].append(key)
+    res["extra"] = sorted(_get_extra_files(home, files, matches=matches))
+    return res
@@ -1,24 +1,38 @@
 import os
+import io
+import stat
+import time
+import tarfile
 import hashlib
 import json
 from datetime import datetime, timezone
 import pickle
 from pathlib import Path
-import inspect
 import shutil
 import socket
 from gitignore_parser import parse_gitignore
 from mfutil import BashWrapper, get_unique_hexa_identifier, mkdir_p_or_die, \
-    mkdir_p, BashWrapperOrRaise, hash_generator
-from mfplugin.configuration import Configuration
+    mkdir_p, hash_generator
+from mfplugin.compression import get_codec, open_tarfile, DEFAULT_CODEC
+from mfplugin.file import PLUGIN_FILE_INDEX, PLUGIN_FILE_FORMAT_VERSION
+from mfplugin.manifest import HashingReader, MANIFEST_ALGORITHM, \
+    MANIFEST_FILENAME, GENERATED_FILENAMES, RUNTIME_PREFIXES, verify_tree
+from mfplugin.fingerprint import get_files_fingerprint, \
+    is_fingerprint_unchanged
+from mfplugin.env_cache import read_env_cache
+from mfplugin.dependencies import PluginDependencyGraph
+from mfplugin.profiling import phase
+from mfplugin.configuration import Configuration, \
+    get_document_cache_path
+from mfplugin.snapshot import PluginSnapshot
 from mfplugin.app import App
 from mfplugin.extra_daemon import ExtraDaemon
 from mfplugin.utils import BadPlugin, get_default_plugins_base_dir, \
     layerapi2_label_file_to_plugin_name, validate_plugin_name, \
     CantBuildPlugin, get_current_envs, PluginEnvContextManager, \
     get_configuration_class, get_app_class, get_extra_daemon_class, \
-    get_configuration_paths, \
-    is_jsonable, layerapi2_label_to_plugin_home, plugin_name_to_layerapi2_label
+    get_configuration_paths, loaded_property, reset_loaded_properties, \
+    plugin_name_to_layerapi2_label
 
 MFEXT_HOME = os.environ.get("MFEXT_HOME", None)
 MFMODULE_RUNTIME_HOME = os.environ.get('MFMODULE_RUNTIME_HOME', '/tmp')
@@ -29,13 +43,46 @@ SPEC_TEMPLATE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
 BUID_HOST = os.environ.get('MFHOSTNAME_FULL', socket.gethostname())
 
 
+def _add_bytes_to_tarfile(tf, arcname, content):
+    if not isinstance(content, bytes):
+        content = content.encode('utf8')
+    tarinfo = tarfile.TarInfo(arcname)
+    tarinfo.size = len(content)
+    tarinfo.mtime = int(time.time())
+    tarinfo.mode = 0o644
+    tarinfo.uid = os.getuid()
+    tarinfo.gid = os.getgid()
+    tf.addfile(tarinfo, io.BytesIO(content))
+
+
+def _add_path_to_tarfile(tf, path, arcname, manifest_files):
+    # add a path to a tarfile (not recursively) and add the corresponding
+    # manifest entry (for non directories) in manifest_files dict
+    tarinfo = tf.gettarinfo(path, arcname=arcname)
+    if tarinfo.isreg():
+        with open(path, "rb") as f:
+            reader = HashingReader(f)
+            tf.addfile(tarinfo, reader)
+        manifest_files[arcname] = {"size": tarinfo.size,
+                                   "mode": stat.S_IMODE(tarinfo.mode),
+                                   MANIFEST_ALGORITHM: reader.hexdigest()}
+        return
+    tf.addfile(tarinfo)
+    if tarinfo.issym():
+        manifest_files[arcname] = {"symlink": tarinfo.linkname}
+    elif tarinfo.islnk():
+        # hard link to an already added file
+        manifest_files[arcname] = dict(manifest_files[tarinfo.linkname])
+
+
 class Plugin(object):
 
     def __init__(self, plugins_base_dir, home,
                  configuration_class=None,
                  extra_daemon_class=None,
                  app_class=None,
-                 dont_read_config_overrides=False):
+                 dont_read_config_overrides=False,
+                 dependency_graph=None):
         self.configuration_class = get_configuration_class(configuration_class,
                                                            Configuration)
         """Configuration class."""
@@ -54,23 +101,38 @@ class Plugin(object):
         self.is_dev_linked = os.path.islink(os.path.join(self.plugins_base_dir,
                                                          self.name))
         """Is the plugin a devlink? (boolean)."""
+        self.dependency_graph = dependency_graph \
+            if dependency_graph is not None \
+            else PluginDependencyGraph(self.plugins_base_dir)
+        """Plugin dependency graph (PluginDependencyGraph)."""
         self._dont_read_config_overrides = dont_read_config_overrides
         self._metadata = {}
         self._files = None
+        self.__cached_add_plugin_dir_to_python_path = None
         self.__loaded = False
         # FIXME: detect broken symlink
 
     def _get_debug(self):
-        self.load()
-        self._load_files()  # as it is not included in load() for perfs reasons
-        res = {x: y for x, y in inspect.getmembers(self)
-               if is_jsonable(y) and not x.startswith('_')}
-        res['configuration'] = self.configuration._get_debug()
+        res = self.get_snapshot().to_dict()
+        res['files'] = self.files
         return res
 
+    def get_snapshot(self):
+        """Return a frozen snapshot of the loaded plugin.
+
+        Returns:
+            (PluginSnapshot): the snapshot (see mfplugin.snapshot).
+
+        Raises:
+            BadPlugin: if the plugin is bad.
+
+        """
+        return PluginSnapshot.from_plugin(self)
+
     def _get_name(self):
         llfpath = os.path.join(self.home, ".layerapi2_label")
-        tmp = layerapi2_label_file_to_plugin_name(llfpath)
+        with phase("plugin.label", os.path.basename(self.home)):
+            tmp = layerapi2_label_file_to_plugin_name(llfpath)
         validate_plugin_name(tmp)
         return tmp
 
@@ -78,17 +140,24 @@ class Plugin(object):
         if self.__loaded is True:
             return
         self.__loaded = True
-        c = self.configuration_class
-        self._configuration = c(
-            self.name, self.home,
-            app_class=self.app_class,
-            extra_daemon_class=self.extra_daemon_class,
-            dont_read_config_overrides=self._dont_read_config_overrides
-        )
-        self._layerapi2_layer_name = plugin_name_to_layerapi2_label(self.name)
-        self._load_format_version()
-        self._load_metadata()
-        self._load_version_release()
+        with phase("plugin.load", self.name):
+            c = self.configuration_class
+            self._configuration = c(
+                self.name, self.home,
+                app_class=self.app_class,
+                extra_daemon_class=self.extra_daemon_class,
+                dont_read_config_overrides=self._dont_read_config_overrides
+            )
+            self._layerapi2_layer_name = \
+                plugin_name_to_layerapi2_label(self.name)
+            self._load_format_version()
+            with phase("plugin.metadata", self.name):
+                self._load_metadata()
+            if self._is_installed:
+                # (no cache file for plugins which are only built/checked)
+                self._configuration.document_cache_path = \
+                    get_document_cache_path(self.home)
+            self._load_version_release()
         # self._load_files() is not included here for perfs reasons
 
     def load_full(self):
@@ -97,6 +166,7 @@ class Plugin(object):
 
     def reload(self):
         self.__loaded = False
+        reset_loaded_properties(self)
         self.load()
 
     def _load_metadata(self):
@@ -125,15 +195,60 @@ class Plugin(object):
         self._build_date = self._metadata.get("build_date", "unknown")
         self._size = self._metadata.get("size", "unknown")
 
-    def get_configuration_hash(self):
+    def get_configuration_input_paths(self):
+        """Return the list of files the plugin environment depends on.
+
+        The configuration files of the (transitive) plugin dependencies
+        are included (as their environment is merged in the plugin one).
+        For an unresolved dependency, the path of its (missing) label file
+        is included (so its installation changes the fingerprint).
+
+        Returns:
+            (list): list of file paths (some of them may not exist).
+
+        """
+        res = []
+        seen = set([plugin_name_to_layerapi2_label(self.name)])
+        self.__add_configuration_input_paths(self.name, self.home, res, seen)
+        return res + ["/etc/metwork.config"]
+
+    def __add_configuration_input_paths(self, name, home, res, seen):
+        res.append("%s/.layerapi2_dependencies" % home)
+        res.extend(get_configuration_paths(name, home))
+        for label, dep_name, dep_home in \
+                self.dependency_graph.get_dependencies(home):
+            if label in seen or dep_name is None:
+                continue
+            seen.add(label)
+            res.append(os.path.join(self.plugins_base_dir, dep_name,
+                                    ".layerapi2_label"))
+            if dep_home is not None:
+                self.__add_configuration_input_paths(dep_name, dep_home,
+                                                     res, seen)
+
+    def get_configuration_fingerprint(self, paths=None):
+        """Return a stat based fingerprint of the configuration inputs.
+
+        This is cheaper than get_configuration_hash() (no file read) but a
+        different fingerprint doesn't always mean a different content.
+
+        Args:
+            paths (list): configuration inputs (if None,
+                get_configuration_input_paths() is used).
+
+        Returns:
+            (tuple): the fingerprint (see mfplugin.fingerprint).
+
+        """
+        if paths is None:
+            paths = self.get_configuration_input_paths()
+        return get_files_fingerprint(paths)
+
+    def get_configuration_hash(self, paths=None):
         args = []
-        try:
-            with open("%s/.layerapi2_dependencies" % self.home, "r") as f:
-                args.append(f.read())
-        except Exception:
-            pass
-        for path in get_configuration_paths(
-                self.name, self.home) + ["/etc/metwork.config"]:
+        if paths is None:
+            paths = self.get_configuration_input_paths()
+        for path in paths:
             try:
                 with open(path, "r") as f:
                     args.append(f.read())
@@ -144,12 +259,18 @@ class Plugin(object):
     def get_plugin_env_dict(self, add_current_envs=True,
                             set_tmp_dir=True,
                             cache=False):
+        self.__cached_add_plugin_dir_to_python_path = None
         res = self._get_plugin_env_dict(add_current_envs=add_current_envs,
                                         set_tmp_dir=set_tmp_dir,
                                         cache=cache)
         # this bloc is here and not inside _get_plugin_env_dict because
         # PYTHONPATH shouldn't be cached (because it depends on loaded layers)
-        if self.configuration.add_plugin_dir_to_python_path:
+        add_plugin_dir_to_python_path = \
+            self.__cached_add_plugin_dir_to_python_path
+        if add_plugin_dir_to_python_path is None:
+            add_plugin_dir_to_python_path = \
+                self.configuration.add_plugin_dir_to_python_path
+        if add_plugin_dir_to_python_path:
             old_python_path = os.environ.get("PYTHONPATH", None)
             if old_python_path:
                 res["PYTHONPATH"] = self.home + ":" + old_python_path
@@ -157,6 +278,40 @@ class Plugin(object):
                 res["PYTHONPATH"] = self.home
         return res
 
+    def __read_env_cache(self):
+        content = read_env_cache(self.home)
+        if content is None:
+            return None
+        fingerprint, h, res, add_plugin_dir_to_python_path = content
+        # the stored fingerprint includes the paths of all inputs
+        # (dependencies included) so we don't have to resolve them again
+        if not is_fingerprint_unchanged(fingerprint):
+            # some inputs were touched, let's compare their content
+            # (inputs list can also be different)
+            paths = self.get_configuration_input_paths()
+            fingerprint = self.get_configuration_fingerprint(paths)
+            if h != self.get_configuration_hash(paths):
+                return None
+            try:
+                # the next read will take the fast path
+                self.__write_env_cache(fingerprint, h, res,
+                                       add_plugin_dir_to_python_path)
+            except Exception:
+                pass
+        self.__cached_add_plugin_dir_to_python_path = \
+            add_plugin_dir_to_python_path
+        return res
+
+    def __write_env_cache(self, fingerprint, h, res,
+                          add_plugin_dir_to_python_path):
+        tmpname = "%s/.configuration_cache.%s" % \
+            (self.home, get_unique_hexa_identifier())
+        with open(tmpname, "wb") as f:
+            f.write(pickle.dumps([fingerprint, h, res,
+                                  add_plugin_dir_to_python_path]))
+        os.rename(tmpname, "%s/.configuration_cache" % self.home)
+        Path('%s/.configuration_cache' % self.home).touch()
+
     def _get_plugin_env_dict(self, add_current_envs=True,
                              set_tmp_dir=True,
                              cache=False):
@@ -165,57 +320,37 @@ class Plugin(object):
                 raise Exception(
                     "cache=True is not compatible with add_current_envs=False "
                     "or set_tmp_dir=False")
-            try:
-                with open("%s/.configuration_cache" % self.home, "rb") as f:
-                    h, res = pickle.loads(f.read())
-                    if h == self.get_configuration_hash():
-                        res["%s_CURRENT_PLUGIN_CACHE" % MFMODULE] = "1"
-                        tmpdir = res["TMPDIR"]
-                        if tmpdir != "" and not os.path.exists(tmpdir):
-                            mkdir_p(tmpdir, nodebug=True, nowarning=True)
-                        return res
-            except Exception:
-                pass
-        lines = []
-        res = {}
-        try:
-            # FIXME: shoud be better to parse this file in layerapi2
-            with open("%s/.layerapi2_dependencies" % self.home, "r") as f:
-                lines = f.readlines()
-        except Exception:
-            pass
-        for line in lines:
-            tmp = line.strip()
-            if tmp.startswith('-'):
-                tmp = tmp[1:]
-            if tmp.startswith("plugin_"):
-                home = layerapi2_label_to_plugin_home(self.plugins_base_dir,
-                                                      tmp)
-                if home is None:
-                    continue
-                try:
-                    p = Plugin(self.plugins_base_dir, home)
-                    p.load()
-                except Exception:
-                    continue
-                res.update(p.get_plugin_env_dict(add_current_envs=False))
-        env_var_dict = self.configuration.get_configuration_env_dict(
-            ignore_keys_starting_with="_")
+            with phase("env.cache_read", self.name):
+                res = self.__read_env_cache()
+            if res is not None:
+                res["%s_CURRENT_PLUGIN_CACHE" % MFMODULE] = "1"
+                tmpdir = res["TMPDIR"]
+                if tmpdir != "" and not os.path.exists(tmpdir):
+                    mkdir_p(tmpdir, nodebug=True, nowarning=True)
+                return res
+            # the fingerprint is computed before reading any input (so a
+            # change during the computation will invalidate the cache)
+            paths = self.get_configuration_input_paths()
+            fingerprint = self.get_configuration_fingerprint(paths)
+        # (memoized) env fragments of plugin dependencies
+        with phase("env.dependencies", self.name):
+            res = self.dependency_graph.get_dependencies_env_dict(self.home)
+        with phase("env.configuration", self.name):
+            env_var_dict = self.configuration.get_configuration_env_dict(
+                ignore_keys_starting_with="_")
         res.update(env_var_dict)
-        if add_current_envs:
-            res.update(get_current_envs(self.name, self.home))
-        if set_tmp_dir:
-            tmpdir = os.path.join(MFMODULE_RUNTIME_HOME, "tmp", self.name)
-            if mkdir_p(tmpdir, nodebug=True, nowarning=True):
-                res["TMPDIR"] = tmpdir
+        with phase("env.current", self.name):
+            if add_current_envs:
+                res.update(get_current_envs(self.name, self.home))
+            if set_tmp_dir:
+                tmpdir = os.path.join(MFMODULE_RUNTIME_HOME, "tmp", self.name)
+                if mkdir_p(tmpdir, nodebug=True, nowarning=True):
+                    res["TMPDIR"] = tmpdir
         if cache:
-            h = self.get_configuration_hash()
-            tmpname = "%s/.configuration_cache.%s" % \
-                (self.home, get_unique_hexa_identifier())
-            with open(tmpname, "wb") as f:
-                f.write(pickle.dumps([h, res]))
-            os.rename(tmpname, "%s/.configuration_cache" % self.home)
-            Path('%s/.configuration_cache' % self.home).touch()
+            with phase("env.cache_write", self.name):
+                self.__write_env_cache(
+                    fingerprint, self.get_configuration_hash(paths), res,
+                    self.configuration.add_plugin_dir_to_python_path)
         return res
 
     def plugin_env_context(self, **kwargs):
@@ -279,50 +414,74 @@ class Plugin(object):
         shutil.copytree(self.home, os.path.join(tmpdir, "metwork_plugin"),
                         symlinks=True)
 
-    def build(self):
-        self.load()
-        pwd = os.getcwd()
-        tmpdir = os.path.join(MFMODULE_RUNTIME_HOME, "tmp",
-                              "plugin_%s" % get_unique_hexa_identifier())
-        filename = f"{self.name}-{self.version}-{self.release}." \
-            f"metwork.{MFMODULE_LOWERCASE}.plugin"
-        mkdir_p_or_die(tmpdir)
-        shutil.copytree(self.home, os.path.join(tmpdir, "metwork_plugin"),
-                        symlinks=True)
-        matches = None
+    def _get_ignore_matches(self):
+        # returns a function which returns True for paths ignored by the
+        # .releaseignore file (or None if there is no such file)
         ignore_filepath = os.path.join(self.home, ".releaseignore")
-        if os.path.isfile(ignore_filepath):
-            try:
-                matches = parse_gitignore(ignore_filepath)
-            except Exception as e:
-                raise BadPlugin("bad %s file" % ignore_filepath,
-                                original_exception=e)
-        root = os.path.join(tmpdir, "metwork_plugin")
-        if matches is not None:
-            for r, d, f in os.walk(root, topdown=False):
-                for fle in f:
-                    full_path = os.path.join(r, fle)
-                    path = self.home + full_path[len(root):]
-                    if matches(path):
-                        try:
-                            os.unlink(full_path)
-                        except Exception:
-                            pass
-                for flder in d:
-                    full_path = os.path.join(r, flder)
-                    path = self.home + full_path[len(root):]
-                    if matches(path) and not os.listdir(full_path):
-                        shutil.rmtree(full_path, ignore_errors=True)
+        if not os.path.isfile(ignore_filepath):
+            return None
+        try:
+            return parse_gitignore(ignore_filepath)
+        except Exception as e:
+            raise BadPlugin("bad %s file" % ignore_filepath,
+                            original_exception=e)
+
+    def _get_build_entries(self, matches=None):
+        # walk the plugin home only once to get the list of
+        # (path, arcname) to put in the plugin file, the list of files
+        # (for .files.json) and the total size
+        res = [(self.home, "metwork_plugin")]
         files = []
         total_size = 0
-        for r, d, f in os.walk(os.path.join(tmpdir, "metwork_plugin")):
-            for fle in f:
-                path = os.path.join(r, fle)
-                files.append("metwork_plugin/" + path[len(root) + 1:])
+        for root, dirs, fles in os.walk(self.home):
+            # ignored directories are pruned (so they are never walked),
+            # as with git, their content can't be re-included
+            dirs[:] = sorted(x for x in dirs if matches is None or
+                             not matches(os.path.join(root, x)))
+            if root == self.home:
+                # these files are generated by build() (or at runtime)
+                fles = [x for x in fles
+                        if x not in GENERATED_FILENAMES and
+                        x != os.path.basename(PLUGIN_FILE_INDEX) and
+                        not x.startswith(RUNTIME_PREFIXES)]
+            for flder in dirs:
+                # (symlinks to directories are not followed by os.walk)
+                path = os.path.join(root, flder)
+                res.append((path, "metwork_plugin/" +
+                            path[len(self.home) + 1:]))
+            for fle in sorted(fles):
+                path = os.path.join(root, fle)
+                if matches is not None and matches(path):
+                    continue
+                arcname = "metwork_plugin/" + path[len(self.home) + 1:]
+                res.append((path, arcname))
+                files.append(arcname)
                 if not os.path.islink(path):
                     total_size = total_size + os.path.getsize(path)
-        with open("%s/metwork_plugin/.files.json" % tmpdir, "w") as f:
-            f.write(json.dumps(files, indent=4))
+        return (res, files, total_size)
+
+    def build(self, compression=None, level=None):
+        """Build a plugin file from the plugin home.
+
+        The plugin file is created in the current working directory.
+
+        Args:
+            compression (string): compression codec name (see
+                mfplugin.compression.get_available_codecs(), default to
+                mfplugin.compression.DEFAULT_CODEC).
+            level (int): compression level (default to the codec one).
+
+        Returns:
+            (string): the plugin file path.
+
+        """
+        codec = get_codec(compression or DEFAULT_CODEC)
+        self.load()
+        pwd = os.getcwd()
+        filename = f"{self.name}-{self.version}-{self.release}." \
+            f"metwork.{MFMODULE_LOWERCASE}.plugin"
+        entries, files, total_size = \
+            self._get_build_entries(self._get_ignore_matches())
 
         # utcnow() is deprecated  and should be replaced by now(datetime.UTC)
         #   (for python >= 3.11)
@@ -342,20 +501,87 @@ class Plugin(object):
             "license": self.configuration.license,
             "packager": self.configuration.packager,
             "vendor": self.configuration.vendor,
-            "url": self.configuration.url
+            "url": self.configuration.url,
+            "compression": codec.name
+        }
+        with open(os.path.join(self.home, ".layerapi2_label"), "r") as f:
+            label = f.read().strip()
+        index = {
+            "format_version": PLUGIN_FILE_FORMAT_VERSION,
+            "label": label,
+            "metadata": metadata,
+            "files": files
         }
-        with open("%s/metwork_plugin/.metadata.json" % tmpdir, "w") as f:
-            f.write(json.dumps(metadata, indent=4))
         plugin_path = os.path.abspath(f"{pwd}/{filename}")
-        cmd = f"cd {tmpdir} && tar -cvf plugin.tar metwork_plugin && " \
-            f"gzip -f plugin.tar && " \
-            f"mv plugin.tar.gz {plugin_path}"
-        BashWrapperOrRaise(cmd, CantBuildPlugin)
-        if not os.path.isfile(plugin_path):
-            raise CantBuildPlugin("can't find plugin file: %s" % plugin_path)
-        shutil.rmtree(tmpdir, True)
+        tmp_path = "%s.%s" % (plugin_path, get_unique_hexa_identifier())
+        try:
+            # members are streamed directly from the plugin home
+            with open_tarfile(tmp_path, "w", compression=codec.name,
+                              level=level) as tf:
+                # the index must be the first member (see PluginFile)
+                _add_bytes_to_tarfile(tf, PLUGIN_FILE_INDEX,
+                                      json.dumps(index))
+                manifest_files = {}
+                for path, arcname in entries:
+                    _add_path_to_tarfile(tf, path, arcname, manifest_files)
+                _add_bytes_to_tarfile(tf, "metwork_plugin/.files.json",
+                                      json.dumps(files, indent=4))
+                _add_bytes_to_tarfile(tf, "metwork_plugin/.metadata.json",
+                                      json.dumps(metadata, indent=4))
+                # digests are computed while streaming, so the manifest
+                # must be the last member
+                manifest = {"algorithm": MANIFEST_ALGORITHM,
+                            "files": manifest_files}
+                _add_bytes_to_tarfile(tf, "metwork_plugin/%s" %
+                                      MANIFEST_FILENAME,
+                                      json.dumps(manifest, indent=4))
+            os.rename(tmp_path, plugin_path)
+        except Exception as e:
+            try:
+                os.unlink(tmp_path)
+            except Exception:
+                pass
+            raise CantBuildPlugin("can't build plugin file: %s" %
+                                  plugin_path, original_exception=e)
         return plugin_path
 
+    def verify(self, workers=None):
+        """Check the installed files against the plugin manifest.
+
+        Args:
+            workers (int): number of threads used to hash files (default
+                to the number of cpus).
+
+        Returns:
+            (dict): a dict with "missing", "modified" and "extra" keys
+            (sorted lists of "metwork_plugin/..." paths, like in
+            .files.json).
+
+        Raises:
+            BadPlugin: if the plugin is not installed, is dev linked or if
+                the manifest is missing (plugin built by an older version).
+
+        """
+        self.load()
+        if self.is_dev_linked or not self.is_installed:
+            raise BadPlugin("only installed (and not dev linked) plugins "
+                            "can be verified")
+        filepath = os.path.join(self.home, MANIFEST_FILENAME)
+        if not os.path.isfile(filepath):
+            raise BadPlugin("%s is missing => the plugin file was probably "
+                            "built by an older version" % filepath)
+        try:
+            with open(filepath, "r") as f:
+                manifest = json.loads(f.read())
+        except Exception as e:
+            raise BadPlugin("can't read/decode %s file" % filepath,
+                            original_exception=e)
+        if manifest.get("algorithm") != MANIFEST_ALGORITHM:
+            raise BadPlugin("unsupported manifest algorithm in %s" %
+                            filepath)
+        return verify_tree(self.home, manifest, workers=workers,
+                           matches=self._get_ignore_matches())
+
     def _load_files(self):
         if self._files is not None:
             return
@@ -380,52 +606,52 @@ class Plugin(object):
             raise BadPlugin("can't decode %s file" % filepath,
                             original_exception=e)
 
-    @property
+    @loaded_property
     def configuration(self):
         self.load()
         return self._configuration
 
-    @property
+    @loaded_property
     def layerapi2_layer_name(self):
         self.load()
         return self._layerapi2_layer_name
 
-    @property
+    @loaded_property
     def format_version(self):
         self.load()
         return self._format_version
 
-    @property
+    @loaded_property
     def version(self):
         self.load()
         return self._version
 
-    @property
+    @loaded_property
     def release(self):
         self.load()
         return self._release
 
-    @property
+    @loaded_property
     def build_host(self):
         self.load()
         return self._build_host
 
-    @property
+    @loaded_property
     def build_date(self):
         self.load()
         return self._build_date
 
-    @property
+    @loaded_property
     def size(self):
         self.load()
         return self._size
 
-    @property
+    @loaded_property
     def is_installed(self):
         self.load()
         return self._is_installed
 
-    @property
+    @loaded_property
     def files(self):
         self.load()
         self._load_files()  # not included in load() for perfs reasons
@@ -0,0 +1,224 @@
+"""Opt-in phase level timing instrumentation.
+
+Profiling is disabled by default (then phase() returns a shared no-op
+context manager, so instrumented code paths are not slowed down). It can
+be enabled with MFPLUGIN_PROFILE=1 env var (then a report is printed on
+stderr at exit) or with enable() (see plugins.profile command).
+
+Timings are aggregated by (plugin name, phase name). Phases can be nested,
+the recorded time of a phase excludes the time spent in its sub-phases
+(so timings can be summed).
+
+"""
+import os
+import sys
+import time
+import atexit
+import threading
+from functools import wraps
+
+MFPLUGIN_PROFILE = os.environ.get("MFPLUGIN_PROFILE", "0")
+__pdoc__ = {
+    "MFPLUGIN_PROFILE": False
+}
+_ENABLED = MFPLUGIN_PROFILE not in ("", "0")
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_RECORDS = {}
+
+
+class _NullPhase(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+
+    __slots__ = ("name", "plugin", "_start", "_children")
+
+    def __init__(self, name, plugin):
+        self.name = name
+        self.plugin = plugin
+        self._start = None
+        self._children = 0.0
+
+    def __enter__(self):
+        _get_stack().append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self._start
+        stack = _get_stack()
+        stack.pop()
+        if stack:
+            stack[-1]._children += elapsed
+        add_record(self.name, elapsed - self._children, plugin=self.plugin)
+        return False
+
+
+def _get_stack():
+    if not hasattr(_LOCAL, "stack"):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+
+def is_enabled():
+    """Return True if profiling is enabled."""
+    return _ENABLED
+
+
+def enable():
+    """Enable profiling."""
+    global _ENABLED
+    _ENABLED = True
+
+
+def disable():
+    """Disable profiling (already recorded timings are kept)."""
+    global _ENABLED
+    _ENABLED = False
+
+
+def reset():
+    """Forget all recorded timings."""
+    with _LOCK:
+        _RECORDS.clear()
+
+
+def phase(name, plugin=None):
+    """Return a context manager which times a phase.
+
+    Args:
+        name (string): the phase name (for example "configuration.parse").
+        plugin (string): the plugin name (None for global phases).
+
+    Returns:
+        a context manager (a no-op one if profiling is disabled).
+
+    """
+    if not _ENABLED:
+        return _NULL_PHASE
+    return _Phase(name, plugin)
+
+
+def profiled(name):
+    """Decorator which times a (global) phase for each call.
+
+    Args:
+        name (string): the phase name.
+
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return f(*args, **kwargs)
+            with _Phase(name, None):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_record(name, elapsed, plugin=None):
+    """Add a timing.
+
+    Args:
+        name (string): the phase name.
+        elapsed (float): the elapsed time (in seconds).
+        plugin (string): the plugin name (None for global phases).
+
+    """
+    key = (plugin, name)
+    with _LOCK:
+        record = _RECORDS.get(key)
+        if record is None:
+            _RECORDS[key] = [1, elapsed]
+        else:
+            record[0] += 1
+            record[1] += elapsed
+
+
+def get_records():
+    """Return recorded timings.
+
+    Returns:
+        (list): list of dicts with "plugin", "phase", "count" and
+        "total_ms" keys, sorted by decreasing total time.
+
+    """
+    with _LOCK:
+        items = list(_RECORDS.items())
+    res = [{"plugin": plugin, "phase": name, "count": count,
+            "total_ms": round(total * 1000.0, 3)}
+           for (plugin, name), (count, total) in items]
+    return sorted(res, key=lambda x: (-x["total_ms"], x["phase"]))
+
+
+def format_report(records=None, top=10):
+    """Format recorded timings as a human readable report.
+
+    The report contains a per-plugin / per-phase breakdown, totals by
+    phase and the slowest (plugin, phase) couples.
+
+    Args:
+        records (list): get_records() result (if None, get_records() is
+            called).
+        top (int): number of slowest (plugin, phase) couples to display.
+
+    Returns:
+        (string): the report.
+
+    """
+    if records is None:
+        records = get_records()
+    lines = []
+    by_plugin = {}
+    by_phase = {}
+    for record in records:
+        plugin = record["plugin"] or "(global)"
+        by_plugin.setdefault(plugin, []).append(record)
+        tmp = by_phase.setdefault(record["phase"], [0, 0.0])
+        tmp[0] += record["count"]
+        tmp[1] += record["total_ms"]
+    lines.append("=== per plugin breakdown (ms, exclusive) ===")
+    for plugin in sorted(by_plugin.keys(),
+                         key=lambda x: -sum(y["total_ms"]
+                                            for y in by_plugin[x])):
+        total = sum(x["total_ms"] for x in by_plugin[plugin])
+        lines.append("%s: %.3f" % (plugin, total))
+        for record in by_plugin[plugin]:
+            lines.append("    %-32s %10.3f (x%i)" %
+                         (record["phase"], record["total_ms"],
+                          record["count"]))
+    lines.append("")
+    lines.append("=== per phase totals (ms, exclusive) ===")
+    for name, (count, total) in sorted(by_phase.items(),
+                                       key=lambda x: -x[1][1]):
+        lines.append("%-36s %10.3f (x%i)" % (name, total, count))
+    lines.append("")
+    lines.append("=== %i slowest offenders (ms) ===" % top)
+    for record in records[0:top]:
+        lines.append("%-36s %10.3f %s" % (record["phase"],
+                                          record["total_ms"],
+                                          record["plugin"] or "(global)"))
+    return "\n".join(lines)
+
+
+def _print_report_at_exit():
+    records = get_records()
+    if records:
+        print(format_report(records), file=sys.stderr)
+
+
+if _ENABLED:
+    atexit.register(_print_report_at_exit)
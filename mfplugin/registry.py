@@ -0,0 +1,291 @@
+import os
+import json
+import filelock
+from mfutil import get_unique_hexa_identifier
+from mfplugin.utils import layerapi2_label_to_plugin_name, \
+    validate_plugin_name, get_plugin_lock_path
+from mfplugin.profiling import phase
+
+__pdoc__ = {
+    "get_plugins_registry": False
+}
+REGISTRY_FILENAME = ".plugins_registry.json"
+REGISTRY_FORMAT_VERSION = 1
+_REGISTRIES = {}
+
+
+def get_plugins_registry(plugins_base_dir):
+    """Get the (process wide) registry object of a plugins base directory.
+
+    Args:
+        plugins_base_dir (string): the plugins base directory path.
+
+    Returns:
+        (PluginsRegistry): the registry object.
+
+    """
+    key = os.path.abspath(plugins_base_dir)
+    if key not in _REGISTRIES:
+        _REGISTRIES[key] = PluginsRegistry(key)
+    return _REGISTRIES[key]
+
+
+def _sorted(entries):
+    # valid entries sorted by name first, then bad ones sorted by home
+    return sorted(entries, key=lambda x: ("error" in x, x.get("name", ""),
+                                          x["home"]))
+
+
+def _get_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+class PluginsRegistry(object):
+    """On-disk index of the plugins installed in a plugins base directory.
+
+    Each entry is a dict with following keys: name, label, home, version,
+    release, is_dev_linked. Directories which are not valid plugins are
+    also registered (see bad_entries) to be able to report them.
+
+    The registry is stored in the plugins base directory itself
+    (REGISTRY_FILENAME file). It is considered as valid only if its mtime
+    is the same than the plugins base directory one (so any change in the
+    plugins base directory not done by the registry owner invalidates it).
+    If it is not valid, the plugins base directory is scanned again.
+
+    The registry file is only written with the plugin management lock
+    acquired.
+
+    """
+
+    def __init__(self, plugins_base_dir):
+        self.plugins_base_dir = os.path.abspath(plugins_base_dir)
+        """Plugins base directory (absolute string)."""
+        self.path = os.path.join(self.plugins_base_dir, REGISTRY_FILENAME)
+        """Registry file path (string)."""
+        self._entries = None
+        self._stamp = None
+        self._by_name = {}
+        self._by_label = {}
+
+    def _read_entry(self, dname):
+        if dname == "base":
+            # special directory (not a plugin one)
+            return None
+        if dname.startswith("."):
+            # hidden file or directory (registry, staging directory...)
+            return None
+        home = os.path.join(self.plugins_base_dir, dname)
+        if not os.path.isdir(home):
+            return None
+        llfpath = os.path.join(home, ".layerapi2_label")
+        try:
+            with open(llfpath, "r") as f:
+                label = f.read().strip()
+        except Exception:
+            return {"home": home, "error": "can't read %s file" % llfpath}
+        try:
+            name = layerapi2_label_to_plugin_name(label)
+            validate_plugin_name(name)
+        except Exception as e:
+            return {"home": home, "error": str(e)}
+        is_dev_linked = os.path.islink(home)
+        version = None
+        release = None
+        if is_dev_linked:
+            version = "dev_link"
+            release = "dev_link"
+        else:
+            try:
+                with open(os.path.join(home, ".metadata.json"), "r") as f:
+                    metadata = json.loads(f.read())
+                version = metadata["version"]
+                release = metadata["release"]
+            except Exception:
+                pass
+        return {
+            "name": name,
+            "label": label,
+            "home": home,
+            "version": version,
+            "release": release,
+            "is_dev_linked": is_dev_linked
+        }
+
+    def _scan(self):
+        entries = []
+        for dname in os.listdir(self.plugins_base_dir):
+            entry = self._read_entry(dname)
+            if entry is not None:
+                entries.append(entry)
+        return _sorted(entries)
+
+    def _read(self, stamp):
+        registry_stamp = _get_stamp(self.path)
+        if registry_stamp is None or registry_stamp[1] != stamp[1]:
+            return None
+        try:
+            with open(self.path, "r") as f:
+                content = json.loads(f.read())
+        except Exception:
+            return None
+        if content.get("format_version") != REGISTRY_FORMAT_VERSION:
+            return None
+        if content.get("base_ino") != stamp[0]:
+            return None
+        return content["entries"]
+
+    def _set_entries(self, entries, stamp):
+        self._entries = entries
+        self._stamp = stamp
+        self._by_name = {}
+        self._by_label = {}
+        for entry in entries:
+            if "error" in entry:
+                continue
+            self._by_name.setdefault(entry["name"], entry)
+            self._by_label.setdefault(entry["label"], entry)
+
+    def load(self):
+        """Load the registry (if needed).
+
+        If the registry file is missing or outdated, the plugins base
+        directory is scanned and (if the plugin management lock is free)
+        the registry file is rebuilt.
+
+        """
+        stamp = _get_stamp(self.plugins_base_dir)
+        if stamp is None:
+            self._set_entries([], None)
+            return
+        if self._entries is not None and stamp == self._stamp:
+            return
+        with phase("registry.read"):
+            entries = self._read(stamp)
+        if entries is not None:
+            self._set_entries(entries, stamp)
+            return
+        with phase("registry.scan"):
+            entries = self._scan()
+        self._set_entries(entries, stamp)
+        with phase("registry.save"):
+            self._save_if_unlocked()
+
+    def _save_if_unlocked(self):
+        lock = filelock.FileLock(get_plugin_lock_path(), timeout=0)
+        try:
+            with lock.acquire():
+                if _get_stamp(self.plugins_base_dir) == self._stamp:
+                    self.save()
+        except filelock.Timeout:
+            # someone is installing/uninstalling plugins
+            pass
+        except OSError:
+            # (read only user, read only plugins base dir...) readers must
+            # never fail because they can't save the registry
+            pass
+
+    def save(self):
+        """Write the registry file.
+
+        The plugin management lock must be acquired by the caller.
+
+        Returns:
+            (boolean): True if the registry file was written.
+
+        """
+        if self._entries is None:
+            return False
+        tmppath = os.path.join(self.plugins_base_dir, "%s.%s" %
+                               (REGISTRY_FILENAME,
+                                get_unique_hexa_identifier()))
+        stamp = _get_stamp(self.plugins_base_dir)
+        if stamp is None:
+            return False
+        content = {
+            "format_version": REGISTRY_FORMAT_VERSION,
+            "base_ino": stamp[0],
+            "entries": self._entries
+        }
+        try:
+            with open(tmppath, "w") as f:
+                f.write(json.dumps(content, indent=4))
+            os.rename(tmppath, self.path)
+            stamp = _get_stamp(self.plugins_base_dir)
+            os.utime(self.path, ns=(stamp[1], stamp[1]))
+        except Exception:
+            try:
+                os.unlink(tmppath)
+            except Exception:
+                pass
+            return False
+        self._stamp = stamp
+        return True
+
+    def update(self, name):
+        """Update (or add) the entry of the given plugin.
+
+        The plugin must be in a directory named after the plugin name.
+        The registry file is not written (see save()).
+
+        Args:
+            name (string): the plugin name.
+
+        """
+        if self._entries is None:
+            self.load()
+        home = os.path.join(self.plugins_base_dir, name)
+        entries = [x for x in self._entries
+                   if x.get("name") != name and x["home"] != home]
+        entry = self._read_entry(name)
+        if entry is not None:
+            entries.append(entry)
+        self._set_entries(_sorted(entries), self._stamp)
+
+    def get_home(self, label):
+        """Find the plugin home corresponding to the given layerapi2 label.
+
+        Args:
+            label (string): the label to search.
+
+        Returns:
+            (string): plugin home (absolute directory path) or None.
+
+        """
+        self.load()
+        entry = self._by_label.get(label)
+        if entry is None:
+            return None
+        return entry["home"]
+
+    def get_entry(self, name):
+        """Get the registry entry of the given plugin name.
+
+        Args:
+            name (string): the plugin name.
+
+        Returns:
+            (dict): the registry entry or None.
+
+        """
+        self.load()
+        return self._by_name.get(name)
+
+    @property
+    def entries(self):
+        """Valid entries (list of dicts), sorted by plugin name."""
+        self.load()
+        return [x for x in self._entries if "error" not in x]
+
+    @property
+    def bad_entries(self):
+        """Directories which are not valid plugins.
+
+        This is a list of dicts with following keys: home, error.
+        """
+        self.load()
+        return [x for x in self._entries if "error" in x]
@@ -0,0 +1,160 @@
+"""Process wide, TTL cached and concurrent hostname resolution.
+
+Hostnames found in plugin configurations (*_hostname and *_hostnames
+options) are resolved with a shared HostnameResolver (see
+get_resolver()), so plugins loaded in the same process (for example by a
+PluginsManager) share resolutions.
+
+Successful resolutions are cached for MFPLUGIN_DNS_CACHE_TTL seconds (60
+by default), failed ones for MFPLUGIN_DNS_NEGATIVE_CACHE_TTL seconds (5
+by default). Cache misses are resolved concurrently with at most
+MFPLUGIN_DNS_WORKERS threads (8 by default). A TTL of 0 disables the
+corresponding cache.
+
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from mfplugin.utils import resolve
+
+MFPLUGIN_DNS_CACHE_TTL = os.environ.get("MFPLUGIN_DNS_CACHE_TTL", "60")
+MFPLUGIN_DNS_NEGATIVE_CACHE_TTL = \
+    os.environ.get("MFPLUGIN_DNS_NEGATIVE_CACHE_TTL", "5")
+MFPLUGIN_DNS_WORKERS = os.environ.get("MFPLUGIN_DNS_WORKERS", "8")
+__pdoc__ = {
+    "MFPLUGIN_DNS_CACHE_TTL": False,
+    "MFPLUGIN_DNS_NEGATIVE_CACHE_TTL": False,
+    "MFPLUGIN_DNS_WORKERS": False
+}
+_RESOLVER = None
+_RESOLVER_LOCK = threading.Lock()
+
+
+def _to_number(value, default, klass=float):
+    try:
+        return klass(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class HostnameResolver(object):
+    """Hostname resolver with a TTL cache and a bounded thread pool.
+
+    Args:
+        ttl (float): cache duration (in seconds) of successful
+            resolutions.
+        negative_ttl (float): cache duration (in seconds) of failed
+            resolutions.
+        workers (int): maximum number of concurrent resolutions.
+        resolve_function: function used to resolve a hostname (returns
+            None if the resolution failed), default to
+            mfplugin.utils.resolve.
+
+    """
+
+    def __init__(self, ttl=60.0, negative_ttl=5.0, workers=8,
+                 resolve_function=None):
+        self.ttl = ttl
+        """Cache duration of successful resolutions (float, seconds)."""
+        self.negative_ttl = negative_ttl
+        """Cache duration of failed resolutions (float, seconds)."""
+        self.workers = max(1, workers)
+        """Maximum number of concurrent resolutions (int)."""
+        self._resolve_function = resolve_function \
+            if resolve_function is not None else resolve
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forget all cached resolutions."""
+        with self._lock:
+            self._cache = {}
+
+    def _get_cached(self, hostname, now):
+        try:
+            value, expires = self._cache[hostname]
+        except KeyError:
+            return (False, None)
+        if expires <= now:
+            return (False, None)
+        return (True, value)
+
+    def _set_cached(self, hostname, value, now):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl > 0:
+            self._cache[hostname] = (value, now + ttl)
+
+    def resolve(self, hostname):
+        """Resolve a hostname.
+
+        Args:
+            hostname (string): the hostname.
+
+        Returns:
+            (string): the resolved value (None if the resolution failed).
+
+        """
+        return self.resolve_many([hostname])[hostname]
+
+    def resolve_many(self, hostnames):
+        """Resolve several hostnames (concurrently for cache misses).
+
+        Args:
+            hostnames (iterable): the hostnames (duplicates are resolved
+                only once).
+
+        Returns:
+            (dict): hostname => resolved value (None if the resolution
+            failed).
+
+        """
+        res = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for hostname in hostnames:
+                if hostname in res:
+                    continue
+                found, value = self._get_cached(hostname, now)
+                if found:
+                    res[hostname] = value
+                else:
+                    res[hostname] = None
+                    missing.append(hostname)
+        if not missing:
+            return res
+        if len(missing) == 1 or self.workers == 1:
+            values = [self._resolve_function(x) for x in missing]
+        else:
+            workers = min(self.workers, len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                values = list(executor.map(self._resolve_function, missing))
+        now = time.monotonic()
+        with self._lock:
+            for hostname, value in zip(missing, values):
+                res[hostname] = value
+                self._set_cached(hostname, value, now)
+        return res
+
+
+def get_resolver():
+    """Get the process wide HostnameResolver.
+
+    It is configured with MFPLUGIN_DNS_CACHE_TTL,
+    MFPLUGIN_DNS_NEGATIVE_CACHE_TTL and MFPLUGIN_DNS_WORKERS env vars.
+
+    Returns:
+        (HostnameResolver): the resolver.
+
+    """
+    global _RESOLVER
+    if _RESOLVER is None:
+        with _RESOLVER_LOCK:
+            if _RESOLVER is None:
+                _RESOLVER = HostnameResolver(
+                    ttl=_to_number(MFPLUGIN_DNS_CACHE_TTL, 60.0),
+                    negative_ttl=_to_number(MFPLUGIN_DNS_NEGATIVE_CACHE_TTL,
+                                            5.0),
+                    workers=_to_number(MFPLUGIN_DNS_WORKERS, 8, int))
+    return _RESOLVER
@@ -0,0 +1,233 @@
+"""Compiled configuration schemas.
+
+A configuration schema (see Configuration.get_schema()) is a cerberus
+schema where keys are section names or section name patterns (fnmatch
+style, for example "app_*") and values are section rule sets.
+
+Instead of expanding the patterns (with deep copies) and building a new
+cerberus validator for each validation, a CompiledSchema builds one
+reusable validator per section rule set (and per thread) and validates a
+document section after section.
+
+"""
+import copy
+import json
+import fnmatch
+import hashlib
+import threading
+from mfplugin.utils import lazy_module
+
+cerberus = lazy_module("cerberus")
+
+COMPILABLE_SECTION_RULES = ("required", "type", "allow_unknown", "schema")
+"""Section rules supported by the section after section validation.
+
+Schemas with other section rules are validated with a single cerberus
+validator (on the expanded schema).
+"""
+
+
+def _schema_default(obj):
+    # callables (cerberus coerce functions) are identified by their names
+    return "%s.%s" % (getattr(obj, "__module__", ""),
+                      getattr(obj, "__qualname__", repr(obj)))
+
+
+def get_schema_digest(schema):
+    """Return a digest of a cerberus schema.
+
+    Args:
+        schema (dict): the schema.
+
+    Returns:
+        (string): the digest (hexa string).
+
+    """
+    tmp = json.dumps(schema, sort_keys=True, default=_schema_default)
+    return hashlib.md5(tmp.encode("utf8")).hexdigest()
+
+
+def get_public_schema(schema):
+    """Return the public part of a schema.
+
+    Sections and keys starting with "_" are removed (as well as sections
+    without a "schema" rule).
+
+    Args:
+        schema (dict): the schema.
+
+    Returns:
+        (dict): the public schema.
+
+    """
+    public_schema = {}
+    for section in schema.keys():
+        if section.startswith('_'):
+            continue
+        if 'schema' not in schema[section]:
+            continue
+        public_schema[section] = \
+            {x: y for x, y in schema[section].items() if x != "schema"}
+        public_schema[section]['schema'] = {}
+        for key in schema[section]['schema'].keys():
+            if key.startswith('_'):
+                continue
+            public_schema[section]['schema'][key] = \
+                schema[section]['schema'][key]
+    return public_schema
+
+
+def _is_pattern(key):
+    return "*" in key or "?" in key
+
+
+def _is_compilable(rules):
+    return isinstance(rules, dict) and rules.get("type") == "dict" and \
+        "schema" in rules and \
+        all(x in COMPILABLE_SECTION_RULES for x in rules.keys())
+
+
+class CompiledSchema(object):
+    """Reusable validation engine for a configuration schema.
+
+    Args:
+        schema (dict): the configuration schema (not modified).
+        public (boolean): if True, only the public part of the schema is
+            used (see get_public_schema()).
+
+    """
+
+    def __init__(self, schema, public=False):
+        if public:
+            schema = get_public_schema(schema)
+        self.schema = copy.deepcopy(schema)
+        """The (copied) schema."""
+        self.digest = get_schema_digest(self.schema)
+        """Digest of the schema (see get_schema_digest())."""
+        self.public = public
+        """Is it a public schema? (boolean)."""
+        self._exact = {x: y for x, y in self.schema.items()
+                       if not _is_pattern(x)}
+        self._patterns = [(x, y) for x, y in self.schema.items()
+                          if _is_pattern(x)]
+        self._compilable = all(_is_compilable(x)
+                               for x in self.schema.values())
+        self._local = threading.local()
+
+    def get_section_key(self, section):
+        """Return the schema key matching a section name.
+
+        As with the former pattern expansion, the last matching pattern
+        wins over the exact key.
+
+        Args:
+            section (string): the section name.
+
+        Returns:
+            (string): the schema key (None if the section is unknown).
+
+        """
+        res = section if section in self._exact else None
+        for pattern, _ in self._patterns:
+            if fnmatch.fnmatch(section, pattern):
+                res = pattern
+        return res
+
+    def expand(self, sections):
+        """Return the schema expanded for a list of section names.
+
+        Args:
+            sections (list): section names.
+
+        Returns:
+            (dict): the schema (without patterns).
+
+        """
+        res = copy.deepcopy(self._exact)
+        for section in sections:
+            key = self.get_section_key(section)
+            if key is not None and _is_pattern(key):
+                res[section] = copy.deepcopy(self.schema[key])
+        return res
+
+    def _get_validator(self, key):
+        validators = getattr(self._local, "validators", None)
+        if validators is None:
+            validators = {}
+            self._local.validators = validators
+        if key not in validators:
+            rules = self.schema[key]
+            validators[key] = cerberus.Validator(
+                rules["schema"],
+                allow_unknown=rules.get("allow_unknown", False),
+                require_all=True)
+        return validators[key]
+
+    def validate(self, document):
+        """Validate and normalize a document.
+
+        Args:
+            document (dict): section name => dict of (string) values.
+
+        Returns:
+            (tuple): (status, errors, normalized document) tuple, errors
+            use the cerberus format (normalized document is None if
+            status is False).
+
+        """
+        if not self._compilable:
+            return self._validate_expanded(document)
+        errors = {}
+        res = {}
+        for section, values in document.items():
+            key = self.get_section_key(section)
+            if key is None:
+                errors[section] = ["unknown field"]
+                continue
+            v = self._get_validator(key)
+            if v.validate(values):
+                res[section] = v.document
+            else:
+                errors[section] = [v.errors]
+        for key, rules in self._exact.items():
+            if key not in document and rules.get("required", True):
+                errors[key] = ["required field"]
+        if errors:
+            return (False, errors, None)
+        return (True, {}, res)
+
+    def _validate_expanded(self, document):
+        v = cerberus.Validator()
+        v.allow_unknown = False
+        v.require_all = True
+        if not v.validate(document, self.expand(document.keys())):
+            return (False, v.errors, None)
+        return (True, {}, v.normalized(v.document))
+
+
+_COMPILED_SCHEMAS = {}
+
+
+def get_compiled_schema(configuration, public=False):
+    """Get the (memoized) compiled schema of a configuration object.
+
+    The schema is compiled only once per configuration class (so
+    Configuration.get_schema() overrides must return the same schema for
+    all instances of a class).
+
+    Args:
+        configuration (Configuration): the configuration object.
+        public (boolean): if True, the public schema is returned.
+
+    Returns:
+        (CompiledSchema): the compiled schema.
+
+    """
+    key = (configuration.__class__, public)
+    try:
+        return _COMPILED_SCHEMAS[key]
+    except KeyError:
+        pass
+    res = CompiledSchema(configuration.get_schema(), public=public)
+    _COMPILED_SCHEMAS[key] = res
+    return res
@@ -0,0 +1,261 @@
+"""Frozen and serializable snapshots of loaded plugins.
+
+A snapshot (PluginSnapshot, ConfigurationSnapshot, CommandSnapshot) is an
+immutable (slots based) copy of the state of a loaded object: metadata,
+final configuration document and commands. It does not depend on the
+plugin files anymore, so it can be shipped to another process or cached.
+
+Snapshots can be converted to dicts of plain (json and marshal
+compatible) values with to_dict() and serialized with dumps() / loads()
+(json or marshal bytes).
+
+"""
+import json
+import marshal
+from types import MappingProxyType
+
+SNAPSHOT_FORMAT_VERSION = 1
+"""Format version of serialized snapshots."""
+SNAPSHOT_FORMATS = ("json", "marshal")
+"""Available serialization formats."""
+MARSHAL_MAGIC = b"MFPSNAPM"
+"""Magic bytes at the beginning of marshal serialized snapshots."""
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({x: _freeze(y) for x, y in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(x) for x in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, (dict, MappingProxyType)):
+        return {x: _thaw(y) for x, y in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(x) for x in value]
+    return value
+
+
+class _Snapshot(object):
+
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            object.__setattr__(self, name, _freeze(kwargs[name]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is frozen" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is frozen" % self.__class__.__name__)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, x) == getattr(other, x)
+                   for x in self.__slots__)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (self.__class__.from_dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join("%s=%r" % (x, getattr(self, x))
+                                     for x in self.__slots__[0:2]))
+
+    def to_dict(self):
+        """Return the snapshot as a dict of plain values.
+
+        Returns:
+            (dict): the snapshot (json and marshal compatible).
+
+        """
+        return {x: _thaw(getattr(self, x)) for x in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, dct):
+        """Make a snapshot from a to_dict() result.
+
+        Args:
+            dct (dict): the to_dict() result.
+
+        Returns:
+            the snapshot.
+
+        """
+        return cls(**dct)
+
+
+class CommandSnapshot(_Snapshot):
+    """Frozen snapshot of a Command (App, ExtraDaemon...)."""
+
+    __slots__ = ("type", "name", "plugin_name", "plugin_home",
+                 "cmd_and_args", "circus_cmd_and_args", "numprocesses",
+                 "graceful_timeout", "max_age", "rlimit_as", "rlimit_nofile",
+                 "rlimit_stack", "rlimit_fsize", "debug",
+                 "log_split_stdout_stderr", "log_split_multiple_workers")
+
+    @classmethod
+    def from_command(cls, command):
+        """Make the snapshot of a command.
+
+        Args:
+            command (Command): the command.
+
+        Returns:
+            (CommandSnapshot): the snapshot.
+
+        """
+        return cls(**{x: getattr(command, x) for x in cls.__slots__})
+
+
+class ConfigurationSnapshot(_Snapshot):
+    """Frozen snapshot of a loaded Configuration.
+
+    The document attribute is the final document (with resolved derived
+    fields) as a read-only mapping.
+
+    """
+
+    __slots__ = ("plugin_name", "plugin_home", "version", "release",
+                 "summary", "license", "maintainer", "vendor", "url",
+                 "add_plugin_dir_to_python_path", "paths", "document",
+                 "apps", "extra_daemons")
+
+    def __init__(self, **kwargs):
+        kwargs["apps"] = tuple(x if isinstance(x, CommandSnapshot)
+                               else CommandSnapshot.from_dict(x)
+                               for x in kwargs["apps"])
+        kwargs["extra_daemons"] = \
+            tuple(x if isinstance(x, CommandSnapshot)
+                  else CommandSnapshot.from_dict(x)
+                  for x in kwargs["extra_daemons"])
+        _Snapshot.__init__(self, **kwargs)
+
+    def to_dict(self):
+        res = _Snapshot.to_dict(self)
+        res["apps"] = [x.to_dict() for x in self.apps]
+        res["extra_daemons"] = [x.to_dict() for x in self.extra_daemons]
+        return res
+
+    @classmethod
+    def from_configuration(cls, configuration):
+        """Make the snapshot of a configuration.
+
+        Args:
+            configuration (Configuration): the configuration.
+
+        Returns:
+            (ConfigurationSnapshot): the snapshot.
+
+        """
+        configuration.load()
+        configuration.resolve_all()
+        kwargs = {x: getattr(configuration, x) for x in cls.__slots__
+                  if x not in ("document", "apps", "extra_daemons")}
+        kwargs["document"] = configuration._doc
+        kwargs["apps"] = [CommandSnapshot.from_command(x)
+                          for x in configuration.apps]
+        kwargs["extra_daemons"] = [CommandSnapshot.from_command(x)
+                                   for x in configuration.extra_daemons]
+        return cls(**kwargs)
+
+
+class PluginSnapshot(_Snapshot):
+    """Frozen snapshot of a loaded Plugin (including its configuration)."""
+
+    __slots__ = ("name", "home", "plugins_base_dir", "version", "release",
+                 "build_host", "build_date", "size", "format_version",
+                 "is_installed", "is_dev_linked", "layerapi2_layer_name",
+                 "configuration")
+
+    def __init__(self, **kwargs):
+        if not isinstance(kwargs["configuration"], ConfigurationSnapshot):
+            kwargs["configuration"] = \
+                ConfigurationSnapshot.from_dict(kwargs["configuration"])
+        _Snapshot.__init__(self, **kwargs)
+
+    def to_dict(self):
+        res = _Snapshot.to_dict(self)
+        res["configuration"] = self.configuration.to_dict()
+        return res
+
+    @classmethod
+    def from_plugin(cls, plugin):
+        """Make the snapshot of a plugin.
+
+        Args:
+            plugin (Plugin): the plugin.
+
+        Returns:
+            (PluginSnapshot): the snapshot.
+
+        Raises:
+            BadPlugin: if the plugin can't be loaded.
+
+        """
+        plugin.load_full()
+        kwargs = {x: getattr(plugin, x) for x in cls.__slots__
+                  if x != "configuration"}
+        kwargs["configuration"] = \
+            ConfigurationSnapshot.from_configuration(plugin.configuration)
+        return cls(**kwargs)
+
+
+def dumps(snapshots, fmt="json"):
+    """Serialize plugin snapshots.
+
+    Args:
+        snapshots (iterable): PluginSnapshot objects.
+        fmt (string): serialization format ("json" or "marshal", marshal
+            is faster but only readable by the same python version).
+
+    Returns:
+        (bytes): the serialized snapshots.
+
+    Raises:
+        ValueError: if the format is unknown.
+
+    """
+    content = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "plugins": [x.to_dict() for x in snapshots]
+    }
+    if fmt == "json":
+        return json.dumps(content).encode("utf8")
+    if fmt == "marshal":
+        return MARSHAL_MAGIC + marshal.dumps(content)
+    raise ValueError("unknown snapshot format: %s" % fmt)
+
+
+def loads(data):
+    """Deserialize plugin snapshots (serialized with dumps()).
+
+    The format is automatically detected.
+
+    Args:
+        data (bytes): the serialized snapshots.
+
+    Returns:
+        (list): PluginSnapshot objects.
+
+    Raises:
+        ValueError: if data can't be decoded.
+
+    """
+    if data.startswith(MARSHAL_MAGIC):
+        try:
+            content = marshal.loads(data[len(MARSHAL_MAGIC):])
+        except (EOFError, TypeError) as e:
+            raise ValueError("can't decode snapshots: %s" % e)
+    else:
+        content = json.loads(data.decode("utf8"))
+    if not isinstance(content, dict) or \
+            content.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError("unsupported snapshot format version")
+    return [PluginSnapshot.from_dict(x) for x in content["plugins"]]
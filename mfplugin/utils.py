@@ -1,20 +1,92 @@
 import re
 import os
 import json
+import sys
 import importlib
+import types
+import threading
+import shlex
+from collections import ChainMap
 from mfutil import BashWrapperException, BashWrapper, get_ipv4_for_hostname, \
     mkdir_p_or_die
 
 __pdoc__ = {
-    "PluginEnvContextManager": False
+    "PluginEnvContextManager": False,
+    "lazy_module": False
 }
 MFMODULE = os.environ.get('MFMODULE', 'GENERIC')
 MFMODULE_RUNTIME_HOME = os.environ.get("MFMODULE_RUNTIME_HOME", "/tmp")
 MFMODULE_LOWERCASE = os.environ.get('MFMODULE_LOWERCASE', 'generic')
 PLUGIN_NAME_REGEXP = "^[A-Za-z0-9_-]+$"
+_LAZY_MODULES_LOCK = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    # proxy of a not yet imported module (see lazy_module())
+
+    def __getattr__(self, attr):
+        # (only called for attributes which are not in the proxy __dict__)
+        with _LAZY_MODULES_LOCK:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_module(name):
+    # the module is really imported at first attribute access
+    # (importlib.util.LazyLoader is not used as its module swap at first
+    # access is not thread safe before python 3.12)
+    if name in sys.modules:
+        return sys.modules[name]
+    return _LazyModule(name)
+
+
+class loaded_property(object):
+    """Read-only property whose value is fixed once the object is loaded.
+
+    The decorated function (which must call self.load()) is called at
+    first access only, its result is stored in the instance __dict__. As
+    this is a non-data descriptor, next accesses are plain attribute
+    lookups (no function call, no load() check).
+
+    Stored values are forgotten by reset_loaded_properties() (to call
+    when the object is reloaded).
+
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        # (concurrent first accesses compute the same value)
+        value = self.func(instance)
+        instance.__dict__[self.name] = value
+        return value
+
+
+def reset_loaded_properties(instance):
+    """Forget loaded_property values stored in an instance.
+
+    Args:
+        instance: the object.
+
+    """
+    for klass in type(instance).__mro__:
+        for name, value in vars(klass).items():
+            if isinstance(value, loaded_property):
+                instance.__dict__.pop(name, None)
 
 
 class PluginEnvContextManager(object):
+    # os.environ is process wide: prefer get_env_overlay() (to read) or
+    # explicit env for subprocesses when possible
 
     __env_dict = None
     __saved_environ = None
@@ -32,6 +104,36 @@ class PluginEnvContextManager(object):
         os.environ.update(self.__saved_environ)
 
 
+def get_env_overlay(env_dict, base=None):
+    """Return a read-only view of an env with some overridden values.
+
+    Nothing is copied or mutated (so this is thread safe and cheap).
+
+    Args:
+        env_dict (dict): overridden env vars.
+        base (mapping): the base env (default to os.environ).
+
+    Returns:
+        (mapping): the env view.
+
+    """
+    return ChainMap(env_dict, base if base is not None else os.environ)
+
+
+def get_shell_env_prefix(env_dict):
+    """Return a shell prefix which sets env vars for a single command.
+
+    Args:
+        env_dict (dict): env vars to set.
+
+    Returns:
+        (string): the prefix (for example "FOO=bar ").
+
+    """
+    return "".join("%s=%s " % (x, shlex.quote(y))
+                   for x, y in env_dict.items())
+
+
 def validate_plugin_name(plugin_name):
     """Validate a plugin name.
 
@@ -106,8 +208,9 @@ def layerapi2_label_file_to_plugin_name(llf_path):
 def layerapi2_label_to_plugin_home(plugins_base_dir, label):
     """Find the plugin home corresponding to the given layerapi2 label.
 
-    We search in plugins_base_dir for a directory (not recursively) with
-    the corresponding label value.
+    The lookup is done in the plugins registry of plugins_base_dir
+    (see mfplugin.registry). The directory is only scanned (not
+    recursively) if the registry is missing or outdated.
 
     If we found nothing, None is returned.
 
@@ -119,24 +222,8 @@ def layerapi2_label_to_plugin_home(plugins_base_dir, label):
         (string): plugin home (absolute directory path) or None.
 
     """
-    for d in os.listdir(plugins_base_dir):
-        if d == "base":
-            continue
-        fd = os.path.abspath(os.path.join(plugins_base_dir, d))
-        if not os.path.isdir(fd):
-            continue
-        llf = os.path.join(fd, ".layerapi2_label")
-        if not os.path.isfile(llf):
-            continue
-        try:
-            with open(llf, 'r') as f:
-                c = f.read().strip()
-        except Exception:
-            continue
-        if c == label:
-            return fd
-    # not found
-    return None
+    from mfplugin.registry import get_plugins_registry
+    return get_plugins_registry(plugins_base_dir).get_home(label)
 
 
 def inside_a_plugin_env():
@@ -148,14 +235,18 @@ def inside_a_plugin_env():
     return ("%s_CURRENT_PLUGIN_NAME" % MFMODULE) in os.environ
 
 
-def validate_configparser(v, cpobj, schema, public=False):
+def configparser_to_document(cpobj, public=False):
     document = {}
     for section in cpobj.sections():
         document[section] = {}
         for key in cpobj.options(section):
             if not public or not key.startswith('_'):
                 document[section][key] = cpobj.get(section, key)
-    return v.validate(document, schema)
+    return document
+
+
+def validate_configparser(v, cpobj, schema, public=False):
+    return v.validate(configparser_to_document(cpobj, public=public), schema)
 
 
 def cerberus_errors_to_human_string(v_errors):
@@ -263,6 +354,18 @@ class BadPluginFile(MFPluginException):
     pass
 
 
+class PluginDependencyCycle(MFPluginException):
+    """Exception raised when there is a cycle in plugin dependencies."""
+
+    pass
+
+
+class UnsupportedCompression(MFPluginException):
+    """Exception raised when a compression codec is unknown/unavailable."""
+
+    pass
+
+
 def get_default_plugins_base_dir():
     """Return the default plugins base directory path.
 
@@ -41,6 +41,10 @@ setup(
             "plugins.install = mfplugin.cli_tools.plugins_install:main",
             "plugins.uninstall = mfplugin.cli_tools.plugins_uninstall:main",
             "plugins.repackage = mfplugin.cli_tools.plugins_repackage:main",
+            "plugins.verify = mfplugin.cli_tools.plugins_verify:main",
+            "plugins.profile = mfplugin.cli_tools.plugins_profile:main",
+            "plugins.compile_env = "
+            "mfplugin.cli_tools.plugins_compile_env:main",
             "plugins_validate_name = "
             "mfplugin.cli_tools.plugins_validate_name:main",
         ]
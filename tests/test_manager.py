@@ -1,8 +1,28 @@
+import io
 import os
+import sys
+import json
+import tarfile
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import pytest
 # common import must be before mfplugin.* imports
 from common import with_empty_base, BASE, get_plugin_filepath
+from mfplugin import manager
 from mfplugin.manager import PluginsManager
 from mfplugin.compat import get_installed_plugins, get_plugin_info
+from mfplugin.plugin import Plugin
+from mfplugin.file import PluginFile
+from mfplugin.compression import get_available_codecs
+from mfplugin.env_snapshot import get_plugin_env_from_snapshot
+from mfplugin.env_cache import get_plugin_env_from_cache
+from mfplugin.registry import _get_stamp
+from mfplugin import profiling, configuration, registry
+from mfplugin.utils import AlreadyInstalledPlugin, NotInstalledPlugin, \
+    UnsupportedCompression, PluginDependencyCycle, CantUninstallPlugin, \
+    BadPluginFile, \
+    lazy_module
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 MFMODULE = os.environ.get("MFMODULE", "GENERIC")
@@ -141,3 +161,489 @@ def test_plugin_env_context():
         os.environ["MFCONFIG"] = old
     assert "GENERIC_CURRENT_PLUGIN_CUSTOM_FOO" not in os.environ
     assert "GENERIC_CURRENT_PLUGIN_NAME" not in os.environ
+
+
+@with_empty_base
+def test_registry():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    assert os.path.isfile(x.registry.path)
+    entry = x.registry.get_entry("plugin1")
+    assert entry["version"] == "1.2.3"
+    assert entry["release"] == "1"
+    assert not entry["is_dev_linked"]
+    assert entry["home"] == x.plugins["plugin1"].home
+    assert x.registry.get_home("plugin_plugin2@generic") == \
+        x.plugins["plugin2"].home
+    assert x.registry.get_home("plugin_foo@generic") is None
+    x.uninstall_plugin("plugin1")
+    assert x.registry.get_entry("plugin1") is None
+    assert len(x.registry.entries) == 1
+
+
+@with_empty_base
+def test_registry_rebuild():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    # a change made outside the manager must invalidate the registry
+    os.rename(os.path.join(BASE, "plugin2"), os.path.join(BASE, "foo"))
+    assert x.registry.get_entry("plugin2")["home"] == \
+        os.path.join(BASE, "foo")
+    os.unlink(x.registry.path)
+    assert x.get_plugin("plugin2").home == os.path.join(BASE, "foo")
+    # readers never fail because they can't save the registry
+    os.unlink(x.registry.path)
+    get_plugin_lock_path = registry.get_plugin_lock_path
+    registry.get_plugin_lock_path = lambda: "/dev/null/lock"
+    try:
+        y = PluginsManager(plugins_base_dir=BASE)
+        assert y.get_plugin("plugin2").home == os.path.join(BASE, "foo")
+    finally:
+        registry.get_plugin_lock_path = get_plugin_lock_path
+    assert not os.path.exists(x.registry.path)
+
+
+@with_empty_base
+def test_parallel_load_full():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    y = PluginsManager(plugins_base_dir=BASE, workers=2)
+    y.load_full()
+    assert list(y.plugins.keys()) == ["plugin1", "plugin2"]
+    for name in ("plugin1", "plugin2"):
+        x.plugins[name].load_full()
+        assert y.plugins[name].configuration._doc == \
+            x.plugins[name].configuration._doc
+        assert y.plugins[name].version == x.plugins[name].version
+
+
+@with_empty_base
+def test_snapshot():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    snapshots = x.get_snapshots()
+    assert sorted(snapshots.keys()) == ["plugin1", "plugin2"]
+    assert snapshots["plugin2"].version == "4.5.6"
+    assert snapshots["plugin1"].configuration.document == \
+        x.plugins["plugin1"].configuration._doc
+    for fmt in ("json", "marshal"):
+        path = os.path.join(BASE, "snapshot.%s" % fmt)
+        assert x.dump_snapshot(path, fmt=fmt) == ["plugin1", "plugin2"]
+        assert x.load_snapshot(path) == snapshots
+        os.unlink(path)
+
+
+@with_empty_base
+def test_lazy_plugins_mapping():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    os.mkdir(os.path.join(BASE, "notaplugin"))
+    y = PluginsManager(plugins_base_dir=BASE)
+    assert sorted(y.plugins.keys()) == ["plugin1", "plugin2"]
+    assert "plugin1" in y.plugins
+    assert "notaplugin" not in y.plugins
+    assert len(y.plugins) == 2
+    assert len(y.plugins._plugins) == 0
+    assert y.plugins["plugin2"].version == "4.5.6"
+    assert list(y.plugins._plugins.keys()) == ["plugin2"]
+    assert [p.name for p in y.plugins.values()] == ["plugin1", "plugin2"]
+
+
+@with_empty_base
+def test_plugins_mapping_bad_entry():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    # the registry (still valid for the base dir) lists plugin2 but the
+    # plugin can't be built anymore
+    os.unlink(os.path.join(BASE, "plugin2", ".layerapi2_label"))
+    y = PluginsManager(plugins_base_dir=BASE)
+    assert y.registry.get_entry("plugin2") is not None
+    assert "plugin2" not in y.plugins
+    assert len(y.plugins) == 1
+    assert list(y.plugins) == ["plugin1"]
+    assert len(y.plugins) == len(list(y.plugins.values()))
+    z = PluginsManager(plugins_base_dir=BASE)
+    assert len(z.plugins) == len(list(z.plugins)) == 1
+    assert "plugin2" not in z.plugins
+    # (no Plugin object is built for that)
+    assert len(z.plugins._plugins) == 0
+
+
+@with_empty_base
+def test_refresh():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    plugin2 = x.plugins["plugin2"]
+    x.uninstall_plugin("plugin1")
+    assert x.plugins["plugin2"] is plugin2
+    home = os.path.join(CURRENT_DIR, "data", "plugin1")
+    x.develop_plugin(home)
+    assert x.plugins["plugin2"] is plugin2
+    assert x.plugins["plugin1"].is_dev_linked
+    os.utime(os.path.join(plugin2.home, ".metadata.json"),
+             ns=(0, 0))
+    assert x.refresh() == ([], [], ["plugin2"])
+    assert x.plugins["plugin2"] is not plugin2
+    assert x.plugins["plugin2"].version == "4.5.6"
+
+
+@with_empty_base
+def test_install_uninstall_plugins():
+    x = PluginsManager(plugins_base_dir=BASE)
+    paths = [get_plugin_filepath(BASE, "plugin1"),
+             get_plugin_filepath(BASE, "plugin2")]
+    res = x.install_plugins(paths, workers=2)
+    assert res == {paths[0]: None, paths[1]: None}
+    assert sorted(x.plugins.keys()) == ["plugin1", "plugin2"]
+    assert x.plugins["plugin2"].version == "4.5.6"
+    # (staging directories are not created in the plugins base dir)
+    assert [y for y in os.listdir(os.path.dirname(BASE))
+            if ".install_" in y] == []
+    stamp = _get_stamp(BASE)
+    res = x.install_plugins(paths)
+    assert isinstance(res[paths[0]], AlreadyInstalledPlugin)
+    assert _get_stamp(BASE) == stamp
+    # already installed plugins are not extracted
+    open_tarfile = manager.open_tarfile
+    manager.open_tarfile = None
+    try:
+        with pytest.raises(AlreadyInstalledPlugin):
+            x.install_plugin(paths[0])
+    finally:
+        manager.open_tarfile = open_tarfile
+    # replace (a single lock and a single conf_monitor notification)
+    x.uninstall_plugin("plugin2")
+    plugin1_home = x.plugins["plugin1"].home
+    os.utime(os.path.join(plugin1_home, ".metadata.json"), ns=(0, 0))
+    touches = []
+    touch = manager._touch_conf_monitor_control_file
+    manager._touch_conf_monitor_control_file = lambda: touches.append(1)
+    try:
+        res = x.replace_plugins(paths, workers=2)
+    finally:
+        manager._touch_conf_monitor_control_file = touch
+    assert res == {paths[0]: None, paths[1]: None}
+    assert len(touches) == 1
+    assert sorted(x.plugins.keys()) == ["plugin1", "plugin2"]
+    assert os.stat(os.path.join(plugin1_home,
+                                ".metadata.json")).st_mtime_ns != 0
+    [os.unlink(y) for y in paths]
+    res = x.uninstall_plugins(["plugin1", "plugin2", "foo"], workers=2)
+    assert res["plugin1"] is None
+    assert res["plugin2"] is None
+    assert isinstance(res["foo"], NotInstalledPlugin)
+    assert len(x.plugins) == 0
+
+
+@with_empty_base
+def test_uninstall_plugins_errors():
+    x = PluginsManager(plugins_base_dir=BASE)
+    x.develop_plugin(os.path.join(CURRENT_DIR, "data", "plugin2"))
+    # duplicates are ignored
+    res = x.uninstall_plugins(["plugin2", "plugin2"], workers=2)
+    assert res == {"plugin2": None}
+    _install_two_plugin(x)
+    remove_plugin_files = x._remove_plugin_files
+
+    def failing_remove_plugin_files(plugin):
+        if plugin.name == "plugin1":
+            raise OSError("foo")
+        remove_plugin_files(plugin)
+
+    x._remove_plugin_files = failing_remove_plugin_files
+    # a failure doesn't stop the uninstallation of other plugins
+    res = x.uninstall_plugins(["plugin1", "plugin2"], workers=2)
+    assert isinstance(res["plugin1"], CantUninstallPlugin)
+    assert res["plugin2"] is None
+    assert list(x.plugins.keys()) == ["plugin1"]
+
+
+def _rewrite_plugin_file(path, new_path, index=None):
+    # index=None => old plugin file format (without index)
+    with tarfile.open(path, "r:gz") as tf:
+        with tarfile.open(new_path, "w:gz") as new:
+            for member in tf:
+                if member.name == "metwork_plugin/.plugin_index.json":
+                    if index is None:
+                        continue
+                    content = json.dumps(index).encode("utf8")
+                    member.size = len(content)
+                    new.addfile(member, io.BytesIO(content))
+                    continue
+                fileobj = tf.extractfile(member) if member.isfile() \
+                    else None
+                new.addfile(member, fileobj)
+
+
+@with_empty_base
+def test_install_plugin_file_formats():
+    x = PluginsManager(plugins_base_dir=BASE)
+    path = get_plugin_filepath(BASE, "plugin1")
+    old_path = path + ".old"
+    bad_path = path + ".bad"
+    try:
+        _rewrite_plugin_file(path, old_path)
+        with tarfile.open(path, "r:gz") as tf:
+            index = json.loads(tf.extractfile(
+                "metwork_plugin/.plugin_index.json").read())
+        index["label"] = "plugin_foo@generic"
+        _rewrite_plugin_file(path, bad_path, index=index)
+        # the index must match the plugin content
+        with pytest.raises(BadPluginFile):
+            x.install_plugin(bad_path)
+        assert len(x.plugins) == 0
+        assert [y for y in os.listdir(os.path.dirname(BASE))
+                if ".install_" in y] == []
+        # old plugin file format (metadata read from extracted files)
+        x.install_plugin(old_path)
+        assert x.plugins["plugin1"].version == "1.2.3"
+        with pytest.raises(AlreadyInstalledPlugin):
+            x.install_plugin(old_path)
+    finally:
+        for y in (path, old_path, bad_path):
+            if os.path.exists(y):
+                os.unlink(y)
+
+
+@with_empty_base
+def test_install_plugin_new_name():
+    x = PluginsManager(plugins_base_dir=BASE)
+    package_filepath = get_plugin_filepath(BASE, "plugin1")
+    x.install_plugin(package_filepath, new_name="foo")
+    os.unlink(package_filepath)
+    assert list(x.plugins.keys()) == ["foo"]
+    assert x.plugins["foo"].version == "1.2.3"
+    assert x.plugins["foo"].is_installed
+    assert sorted(os.listdir(BASE)) == [".plugins_registry.json", "foo"]
+    # the rewritten label is not reported as modified
+    assert x.plugins["foo"].verify() == {"missing": [], "modified": [],
+                                         "extra": []}
+
+
+@with_empty_base
+def test_install_plugin_compression():
+    x = PluginsManager(plugins_base_dir=BASE)
+    home = os.path.join(CURRENT_DIR, "data", "plugin1")
+    for codec in get_available_codecs():
+        package_filepath = Plugin(BASE, home).build(compression=codec)
+        try:
+            plugin_file = PluginFile(package_filepath)
+            assert plugin_file.compression == codec
+            assert plugin_file.name == "plugin1"
+            x.install_plugin(package_filepath)
+        finally:
+            os.unlink(package_filepath)
+        assert x.plugins["plugin1"].is_installed
+        x.uninstall_plugin("plugin1")
+    with pytest.raises(UnsupportedCompression):
+        Plugin(BASE, home).build(compression="foo")
+
+
+@with_empty_base
+def test_verify_plugin():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    plugin = x.plugins["plugin1"]
+    assert plugin.verify() == {"missing": [], "modified": [], "extra": []}
+    # (ignored files and directories created at runtime are not walked)
+    os.mkdir(os.path.join(plugin.home, "foo.tobeignored"))
+    with open(os.path.join(plugin.home, "foo.tobeignored", "foo"), "w") as f:
+        f.write("foo")
+    assert plugin.verify() == {"missing": [], "modified": [], "extra": []}
+    shutil.rmtree(os.path.join(plugin.home, "foo.tobeignored"))
+    with open(os.path.join(plugin.home, "config.ini"), "a") as f:
+        f.write("\n")
+    os.unlink(os.path.join(plugin.home, ".releaseignore"))
+    with open(os.path.join(plugin.home, "foo"), "w") as f:
+        f.write("foo")
+    assert plugin.verify(workers=1) == {
+        "missing": ["metwork_plugin/.releaseignore"],
+        "modified": ["metwork_plugin/config.ini"],
+        "extra": ["metwork_plugin/foo"]
+    }
+
+
+@with_empty_base
+def test_cache_fingerprint():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    home = x.plugins["plugin1"].home
+    key = "%s_CURRENT_PLUGIN_CACHE" % MFMODULE
+    x.plugins["plugin1"].get_plugin_env_dict(cache=True)
+    # same fingerprint => no content hash
+    get_configuration_hash = Plugin.get_configuration_hash
+    Plugin.get_configuration_hash = None
+    try:
+        e = Plugin(BASE, home).get_plugin_env_dict(cache=True)
+    finally:
+        Plugin.get_configuration_hash = get_configuration_hash
+    assert key in e
+    assert e["PYTHONPATH"].startswith(home)
+    # same content but different fingerprint => still a cache hit
+    os.utime(os.path.join(home, "config.ini"), ns=(0, 0))
+    assert key in Plugin(BASE, home).get_plugin_env_dict(cache=True)
+    # different content => cache miss
+    with open(os.path.join(home, "config.ini"), "a") as f:
+        f.write("foo3=bar3\n")
+    e = Plugin(BASE, home).get_plugin_env_dict(cache=True)
+    assert key not in e
+    assert e["GENERIC_CURRENT_PLUGIN_CUSTOM_FOO3"] == "bar3"
+
+
+@with_empty_base
+def test_cache_dependencies():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    home1 = x.plugins["plugin1"].home
+    home2 = x.plugins["plugin2"].home
+    key = "%s_CURRENT_PLUGIN_CACHE" % MFMODULE
+    with open(os.path.join(home2, ".layerapi2_dependencies"), "w") as f:
+        f.write("plugin_plugin1@generic\n-plugin_plugin3@generic\n")
+    paths = Plugin(BASE, home2).get_configuration_input_paths()
+    assert os.path.join(home1, "config.ini") in paths
+    assert os.path.join(BASE, "plugin3", ".layerapi2_label") in paths
+    e = Plugin(BASE, home2).get_plugin_env_dict(cache=True)
+    assert e["GENERIC_CURRENT_PLUGIN_CUSTOM_FOO"] == "bar"
+    assert key in Plugin(BASE, home2).get_plugin_env_dict(cache=True)
+    # a change in a dependency configuration invalidates the cache
+    with open(os.path.join(home1, "config.ini"), "a") as f:
+        f.write("foo3=bar3\n")
+    e = Plugin(BASE, home2).get_plugin_env_dict(cache=True)
+    assert key not in e
+    assert e["GENERIC_CURRENT_PLUGIN_CUSTOM_FOO3"] == "bar3"
+    # so does the dependency uninstallation
+    x.uninstall_plugin("plugin1")
+    e = Plugin(BASE, home2).get_plugin_env_dict(cache=True)
+    assert key not in e
+    assert "GENERIC_CURRENT_PLUGIN_CUSTOM_FOO" not in e
+
+
+@with_empty_base
+def test_dependency_graph():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    home1 = x.plugins["plugin1"].home
+    home2 = x.plugins["plugin2"].home
+    with open(os.path.join(home2, ".layerapi2_dependencies"), "w") as f:
+        f.write("plugin_plugin1@generic\nplugin_plugin3@generic\n")
+    x.refresh()
+    assert x.dependency_graph.get_dependencies(home2) == [
+        ("plugin_plugin1@generic", "plugin1", home1),
+        ("plugin_plugin3@generic", "plugin3", None)
+    ]
+    e = x.plugins["plugin2"].get_plugin_env_dict()
+    assert e["GENERIC_CURRENT_PLUGIN_CUSTOM_FOO"] == "bar"
+    assert e["GENERIC_CURRENT_PLUGIN_NAME"] == "plugin2"
+    # the env fragment of plugin1 is memoized
+    assert home1 in x.dependency_graph._fragments
+    with open(os.path.join(home1, ".layerapi2_dependencies"), "w") as f:
+        f.write("plugin_plugin2@generic\n")
+    x.refresh()
+    with pytest.raises(PluginDependencyCycle):
+        x.plugins["plugin2"].get_plugin_env_dict()
+
+
+@with_empty_base
+def test_env_snapshot():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    key = "%s_CURRENT_PLUGIN_CACHE" % MFMODULE
+    assert get_plugin_env_from_snapshot("plugin1", BASE) is None
+    assert x.compile_env_snapshot() == ["plugin1", "plugin2"]
+    # the registry is still valid
+    assert x.registry._read(_get_stamp(BASE)) is not None
+    snapshot = get_plugin_env_from_snapshot("plugin1", BASE)
+    home = x.plugins["plugin1"].home
+    assert snapshot["home"] == home
+    assert snapshot["layer"] == "plugin_plugin1@generic"
+    env = x.plugins["plugin1"].get_plugin_env_dict()
+    assert snapshot["env"][key] == "1"
+    del snapshot["env"][key]
+    assert snapshot["env"] == env
+    assert get_plugin_env_from_snapshot("foo", BASE) is None
+    # a registry save (by a reader) does not invalidate the snapshot
+    os.unlink(x.registry.path)
+    PluginsManager(plugins_base_dir=BASE).registry.load()
+    assert os.path.isfile(x.registry.path)
+    assert get_plugin_env_from_snapshot("plugin1", BASE) is not None
+    # a configuration change invalidates the plugin entry
+    with open(os.path.join(home, "config.ini"), "a") as f:
+        f.write("foo3=bar3\n")
+    assert get_plugin_env_from_snapshot("plugin1", BASE) is None
+    assert get_plugin_env_from_snapshot("plugin2", BASE) is not None
+    # a plugin uninstallation invalidates the whole snapshot
+    x.uninstall_plugin("plugin1")
+    assert get_plugin_env_from_snapshot("plugin2", BASE) is None
+
+
+def test_lazy_module_threads():
+    sys.modules.pop("colorsys", None)
+    module = lazy_module("colorsys")
+    assert "colorsys" not in sys.modules
+    # the first access can be concurrent
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        res = set(executor.map(lambda x: module.rgb_to_hsv(1, 0, 0),
+                               range(0, 32)))
+    assert res == {(0.0, 1.0, 1.0)}
+    assert "colorsys" in sys.modules
+
+
+@with_empty_base
+def test_env_cache_fast_path():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    key = "%s_CURRENT_PLUGIN_CACHE" % MFMODULE
+    assert get_plugin_env_from_cache("plugin1", BASE) is None
+    env = x.plugins["plugin1"].get_plugin_env_dict(cache=True)
+    cached = get_plugin_env_from_cache("plugin1", BASE)
+    assert cached["home"] == x.plugins["plugin1"].home
+    assert cached["layer"] == "plugin_plugin1@generic"
+    assert cached["env"][key] == "1"
+    del cached["env"][key]
+    assert cached["env"] == env
+    assert get_plugin_env_from_cache("foo", BASE) is None
+    # the wrapper fast path doesn't import heavy modules
+    root = os.path.dirname(CURRENT_DIR)
+    penv = dict(os.environ)
+    penv["PYTHONPATH"] = root
+    p = subprocess.run([sys.executable, "-X", "importtime", "-m",
+                        "mfplugin.cli_tools.plugin_wrapper", "--bash-cmds",
+                        "--plugins-base-dir", BASE, "plugin1", "true"],
+                       env=penv, stdout=subprocess.PIPE,
+                       stderr=subprocess.PIPE, universal_newlines=True)
+    assert p.returncode == 0
+    assert key in p.stdout
+    for module in ("mfplugin.plugin", "mfplugin.configuration", "cerberus"):
+        assert module not in p.stderr
+
+
+@with_empty_base
+def test_profiling():
+    x = PluginsManager(plugins_base_dir=BASE)
+    _install_two_plugin(x)
+    assert not profiling.is_enabled()
+    profiling.reset()
+    profiling.enable()
+    configuration.DOCUMENT_CACHE_DIR = os.path.join(BASE, "document_cache")
+    try:
+        y = PluginsManager(plugins_base_dir=BASE)
+        y.load_full()
+        y.plugins["plugin1"].get_plugin_env_dict()
+    finally:
+        configuration.DOCUMENT_CACHE_DIR = None
+        profiling.disable()
+    records = profiling.get_records()
+    profiling.reset()
+    phases = set((r["plugin"], r["phase"]) for r in records)
+    assert (None, "manager.load_full") in phases
+    for name in ("plugin1", "plugin2"):
+        assert (name, "plugin.load") in phases
+        assert (name, "configuration.cache_read") in phases
+    # the final document is only needed for the env
+    assert ("plugin1", "configuration.final_document") in phases
+    assert ("plugin2", "configuration.final_document") not in phases
+    assert ("plugin1", "env.configuration") in phases
+    assert "slowest offenders" in profiling.format_report(records)
+    # disabled => nothing is recorded
+    y.plugins["plugin1"].get_plugin_env_dict()
+    assert profiling.get_records() == []
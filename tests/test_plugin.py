@@ -1,9 +1,24 @@
 import os
+import json
+import pickle
+import shutil
+import stat
+import time
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 # common import must be before mfplugin* imports
 from common import with_empty_base, BASE, get_plugin_filepath
 from mfplugin.plugin import Plugin
-from mfplugin.utils import BadPlugin
+from mfplugin.file import PluginFile
+from mfplugin.app import App
+from mfplugin import configuration, snapshot
+from mfplugin.manager import PluginsManager
+from mfplugin.configuration import Configuration, get_document_cache_path
+from mfplugin.schema import CompiledSchema
+from mfplugin.resolver import HostnameResolver
+from mfplugin.utils import BadPlugin, PluginEnvContextManager, \
+    get_env_overlay
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
@@ -13,7 +28,354 @@ def test_build_plugin():
     # this is going to build a plugin
     package_path = get_plugin_filepath(BASE, "plugin1")
     assert package_path.endswith(".plugin")
+    with tarfile.open(package_path, "r:gz") as tf:
+        names = tf.getnames()
+        files = json.loads(tf.extractfile(
+            "metwork_plugin/.files.json").read())
+        metadata = json.loads(tf.extractfile(
+            "metwork_plugin/.metadata.json").read())
     os.unlink(package_path)
+    assert names[0] == "metwork_plugin/.plugin_index.json"
+    assert names[1] == "metwork_plugin"
+    assert "metwork_plugin/config.ini" in names
+    assert "metwork_plugin/toto.tobeignored" not in names
+    assert "metwork_plugin/config.ini" in files
+    assert "metwork_plugin/toto.tobeignored" not in files
+    assert "metwork_plugin/.files.json" not in files
+    assert metadata["version"] == "1.2.3"
+
+
+@with_empty_base
+def test_build_prunes_ignored_dirs():
+    home = os.path.join(BASE, "src", "plugin1")
+    shutil.copytree(os.path.join(CURRENT_DIR, "data", "plugin1"), home)
+    with open(os.path.join(home, ".releaseignore"), "a") as f:
+        f.write("node_modules/\n")
+    os.makedirs(os.path.join(home, "node_modules", "foo"))
+    os.makedirs(os.path.join(home, "lib"))
+    for path in ("node_modules/foo/a.js", "lib/a.py"):
+        with open(os.path.join(home, path), "w") as f:
+            f.write("foo")
+    x = Plugin(BASE, home)
+    matches = x._get_ignore_matches()
+    checked = []
+
+    def spy(path):
+        checked.append(path[len(home) + 1:])
+        return matches(path)
+
+    entries, files, _ = x._get_build_entries(spy)
+    assert files == sorted(files)
+    assert "metwork_plugin/lib/a.py" in files
+    assert not [y for y in files if "node_modules" in y]
+    # the ignored directory is never walked
+    assert "node_modules" in checked
+    assert not [y for y in checked if y.startswith("node_modules/")]
+
+
+@with_empty_base
+def test_plugin_file_index():
+    package_path = get_plugin_filepath(BASE, "plugin1")
+    old_path = package_path + ".old"
+    # old plugin file format (without index)
+    with tarfile.open(package_path, "r:gz") as tf:
+        with tarfile.open(old_path, "w:gz") as old:
+            for member in tf:
+                if member.name == "metwork_plugin/.plugin_index.json":
+                    continue
+                fileobj = tf.extractfile(member) if member.isfile() \
+                    else None
+                old.addfile(member, fileobj)
+    try:
+        new_file = PluginFile(package_path)
+        old_file = PluginFile(old_path)
+        assert new_file.file_format_version == 2
+        assert old_file.file_format_version == 1
+        for attr in ("name", "version", "release", "build_date", "files"):
+            assert getattr(new_file, attr) == getattr(old_file, attr)
+    finally:
+        os.unlink(package_path)
+        os.unlink(old_path)
+
+
+@with_empty_base
+def test_document_cache():
+    home = os.path.join(BASE, "src", "plugin1")
+    shutil.copytree(os.path.join(CURRENT_DIR, "data", "plugin1"), home)
+    # (no cache without MFMODULE_RUNTIME_HOME)
+    assert configuration.DOCUMENT_CACHE_DIR is None
+    assert get_document_cache_path(home) is None
+    configuration.DOCUMENT_CACHE_DIR = os.path.join(BASE, "document_cache")
+    try:
+        _test_document_cache(home)
+    finally:
+        configuration.DOCUMENT_CACHE_DIR = None
+
+
+def _test_document_cache(home):
+    cache_path = get_document_cache_path(home)
+
+    def get_doc():
+        x = Plugin(BASE, home)
+        x.load_full()
+        return x.configuration._doc
+
+    # no cache for not installed plugins
+    assert get_doc()["custom"]["foo"] == "bar"
+    assert not os.path.exists(cache_path)
+    PluginsManager(plugins_base_dir=BASE).develop_plugin(home)
+    assert get_doc()["custom"]["foo"] == "bar"
+    assert os.path.isfile(cache_path)
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(cache_path)).st_mode) & \
+        0o077 == 0
+    # (nothing is written in the plugin home)
+    assert not [x for x in os.listdir(home)
+                if x.startswith(".configuration_cache")]
+    # cache hit => no validation
+    validate = Configuration._Configuration__validate
+    Configuration._Configuration__validate = None
+    try:
+        assert get_doc()["custom"]["foo"] == "bar"
+    finally:
+        Configuration._Configuration__validate = validate
+    # configuration change => cache miss
+    with open(os.path.join(home, "config.ini"), "a") as f:
+        f.write("foo4={{MFPLUGIN_TEST_DOCUMENT_CACHE}}\n")
+    assert get_doc()["custom"]["foo4"] == ""
+    # env var used in the configuration change => cache miss
+    os.environ["MFPLUGIN_TEST_DOCUMENT_CACHE"] = "bar4"
+    try:
+        assert get_doc()["custom"]["foo4"] == "bar4"
+    finally:
+        del os.environ["MFPLUGIN_TEST_DOCUMENT_CACHE"]
+    assert get_doc()["custom"]["foo4"] == ""
+    # cache files writable by others are never read
+    os.chmod(cache_path, 0o666)
+    Configuration._Configuration__validate = None
+    try:
+        with pytest.raises(TypeError):
+            get_doc()
+    finally:
+        Configuration._Configuration__validate = validate
+    os.unlink(cache_path)
+
+
+@with_empty_base
+def test_env_overlay():
+    home = os.path.join(BASE, "src", "plugin1")
+    shutil.copytree(os.path.join(CURRENT_DIR, "data", "plugin1"), home)
+    with open(os.path.join(home, "config.ini"), "a") as f:
+        f.write("foo4={{GENERIC_CURRENT_PLUGIN_NAME}}\n")
+    os.environ["GENERIC_CURRENT_PLUGIN_DIR"] = "/foo"
+    before = dict(os.environ)
+    try:
+        x = Plugin(BASE, home)
+        x.load_full()
+        # current plugin env vars are available in the configuration...
+        assert x.configuration._doc["custom"]["foo4"] == "plugin1"
+        # ...but os.environ is never modified
+        assert dict(os.environ) == before
+        overlay = get_env_overlay({"GENERIC_CURRENT_PLUGIN_DIR": home})
+        assert overlay["GENERIC_CURRENT_PLUGIN_DIR"] == home
+        assert overlay["PATH"] == os.environ["PATH"]
+        # the public context manager restores the whole env
+        with PluginEnvContextManager({"GENERIC_CURRENT_PLUGIN_DIR": home,
+                                      "MFPLUGIN_TEST_ENV_OVERLAY": "foo"}):
+            assert os.environ["GENERIC_CURRENT_PLUGIN_DIR"] == home
+            os.environ["MFPLUGIN_TEST_ENV_OVERLAY2"] = "bar"
+            os.environ["PATH"] = "/foo"
+        assert dict(os.environ) == before
+    finally:
+        del os.environ["GENERIC_CURRENT_PLUGIN_DIR"]
+
+
+def test_loaded_properties():
+    x = Plugin(BASE, os.path.join(CURRENT_DIR, "data", "plugin1"))
+    assert "version" not in x.__dict__
+    assert x.version == "1.2.3"
+    # next accesses are plain attribute lookups
+    assert x.__dict__["version"] == "1.2.3"
+    configuration = x.configuration
+    assert configuration.apps is configuration.apps
+    assert "apps" in configuration.__dict__
+    x.reload()
+    assert "version" not in x.__dict__
+    assert x.configuration is not configuration
+    assert x.version == "1.2.3"
+
+
+@with_empty_base
+def test_snapshot():
+    home = os.path.join(BASE, "src", "plugin1")
+    shutil.copytree(os.path.join(CURRENT_DIR, "data", "plugin1"), home)
+    with open(os.path.join(home, "config.ini"), "a") as f:
+        f.write("\n[app_foo]\n_cmd_and_args=foo {app_name}\n"
+                "numprocesses=2\nlog_split_stdout_stderr=0\n"
+                "log_split_multiple_workers=0\n")
+    x = Plugin(BASE, home)
+    s = x.get_snapshot()
+    assert (s.name, s.version) == ("plugin1", "1.2.3")
+    assert s.configuration.document == x.configuration._doc
+    app = s.configuration.apps[0]
+    assert app == x.configuration.apps[0].get_snapshot()
+    assert (app.type, app.name, app.numprocesses) == ("app", "foo", 2)
+    assert app.circus_cmd_and_args.endswith("-- foo foo")
+    with pytest.raises(AttributeError):
+        s.version = "foo"
+    with pytest.raises(TypeError):
+        s.configuration.document["custom"]["foo"] = "foo"
+    for fmt in ("json", "marshal"):
+        assert snapshot.loads(snapshot.dumps([s], fmt=fmt)) == [s]
+    assert pickle.loads(pickle.dumps(s)) == s
+    assert x._get_debug()["configuration"] == s.configuration.to_dict()
+
+
+def test_command():
+    fragment = {"_cmd_and_args": "foo", "numprocesses": 2,
+                "log_split_stdout_stderr": False,
+                "log_split_multiple_workers": False, "graceful_timeout": 10,
+                "max_age": 0, "rlimit_as": 0, "rlimit_nofile": 0,
+                "rlimit_stack": 0, "rlimit_fsize": 0, "debug": False}
+    custom = {"foo": "bar"}
+    app = App("/tmp", "plugin1", "foo", fragment, custom)
+    assert not hasattr(app, "__dict__")
+    assert (app.type, app.cmd_and_args, app.numprocesses) == \
+        ("app", "foo", 2)
+    app2 = app.duplicate("foo2")
+    assert (app2.type, app2.name, app2.numprocesses) == ("app", "foo2", 2)
+    # fragments are shared between duplicates (as read-only mappings)
+    assert app2._custom_fragment is app._custom_fragment
+    assert app2._doc_fragment is app._doc_fragment
+    assert app2._custom_fragment["foo"] == "bar"
+    with pytest.raises(TypeError):
+        app2._custom_fragment["foo"] = "bar2"
+    with pytest.raises(TypeError):
+        app._doc_fragment["numprocesses"] = 3
+
+
+class HookConfiguration(Configuration):
+
+    def after_load(self):
+        # (legacy hooks read current plugin env vars in os.environ)
+        name = os.environ.get("GENERIC_CURRENT_PLUGIN_NAME")
+        time.sleep(0.01)
+        self.seen = (name, os.environ.get("GENERIC_CURRENT_PLUGIN_NAME"))
+
+
+def test_overridden_hooks_env():
+    before = dict(os.environ)
+    configurations = [
+        HookConfiguration(x, os.path.join(CURRENT_DIR, "data", x))
+        for x in ("plugin1", "plugin2") * 4]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda x: x.load(), configurations))
+    for c in configurations:
+        assert c.seen == (c.plugin_name, c.plugin_name)
+    assert dict(os.environ) == before
+
+
+class ExtraSectionConfiguration(Configuration):
+
+    def get_schema(self):
+        schema = Configuration.get_schema(self)
+        schema["extra_*"] = {"required": False, "type": "dict",
+                             "schema": {"foo": {"type": "string"}}}
+        return schema
+
+
+def test_compiled_schema():
+    home = os.path.join(CURRENT_DIR, "data", "plugin1")
+    c1 = Configuration("plugin1", home)
+    c2 = ExtraSectionConfiguration("plugin1", home)
+    s1 = c1.get_compiled_schema()
+    s2 = c2.get_compiled_schema()
+    # compiled once per configuration class
+    assert s1 is Configuration("plugin1", home).get_compiled_schema()
+    assert s1.digest != s2.digest
+    assert s1.get_section_key("app_foo") == "app_*"
+    assert s1.get_section_key("extra_foo") is None
+    assert s2.get_section_key("extra_foo") == "extra_*"
+    keys = ("_version", "_summary", "_license", "_url", "_maintainer",
+            "_vendor")
+    general = {x: "foo" for x in keys}
+    document = {"general": general, "extra_foo": {"foo": "bar"}}
+    status, errors, _ = s1.validate(document)
+    assert status is False
+    assert errors == {"extra_foo": ["unknown field"]}
+    status, errors, normalized = s2.validate(document)
+    assert status is True
+    assert normalized["extra_foo"] == {"foo": "bar"}
+    # same results with the (fallback) expanded schema validation
+    assert s1.validate(document) == s1._validate_expanded(document)
+    assert s2.validate(document) == s2._validate_expanded(document)
+    del document["general"]
+    status, errors, _ = CompiledSchema(c2.get_schema()).validate(document)
+    assert errors == {"general": ["required field"]}
+
+
+def test_hostname_resolver():
+    calls = []
+
+    def fake_resolve(hostname):
+        calls.append(hostname)
+        time.sleep(0.2)
+        return None if hostname.startswith("bad") else "10.0.0.1"
+
+    resolver = HostnameResolver(ttl=60, negative_ttl=0, workers=4,
+                                resolve_function=fake_resolve)
+    hostnames = ["host%i" % i for i in range(0, 4)] + ["host0", "bad"]
+    before = time.monotonic()
+    res = resolver.resolve_many(hostnames)
+    # resolved concurrently (and only once)
+    assert time.monotonic() - before < 0.6
+    assert sorted(calls) == sorted(set(hostnames))
+    assert res["host3"] == "10.0.0.1"
+    assert res["bad"] is None
+    # positive results are cached, negative ones are not (negative_ttl=0)
+    calls[:] = []
+    assert resolver.resolve_many(hostnames) == res
+    assert calls == ["bad"]
+    resolver.clear()
+    assert resolver.resolve("host1") == "10.0.0.1"
+    assert calls == ["bad", "host1"]
+
+
+@with_empty_base
+def test_hostnames_in_configuration():
+    home = os.path.join(BASE, "src", "plugin1")
+    shutil.copytree(os.path.join(CURRENT_DIR, "data", "plugin1"), home)
+    with open(os.path.join(home, "config.ini"), "a") as f:
+        f.write("foo_hostname=localhost\n")
+        f.write("foo_hostnames=127.0.0.1;localhost;/tmp/socket\n")
+    resolved = []
+
+    def fake_resolve(hostname):
+        resolved.append(hostname)
+        return "127.0.0.1" if hostname == "localhost" else hostname
+
+    resolver = HostnameResolver(resolve_function=fake_resolve)
+    get_resolver = configuration.get_resolver
+    configuration.get_resolver = lambda: resolver
+    try:
+        x = Plugin(BASE, home)
+        # loading, checking and listing don't resolve hostnames
+        x.load_full()
+        assert x.version == "1.2.3"
+        assert resolved == []
+        custom = x.configuration._get_section("custom")
+        assert sorted(resolved) == ["/tmp/socket", "127.0.0.1", "localhost"]
+        assert custom["foo_hostname_ip"] == "127.0.0.1"
+        assert custom["foo_hostnames_ips"] == \
+            "127.0.0.1;127.0.0.1;/tmp/socket"
+        x.configuration.resolve_all()
+        assert x.configuration._doc["custom"] == custom
+        assert len(resolved) == 3
+        env = x.get_plugin_env_dict()
+        assert env["GENERIC_CURRENT_PLUGIN_CUSTOM_FOO_HOSTNAME_IP"] == \
+            "127.0.0.1"
+    finally:
+        configuration.get_resolver = get_resolver
 
 
 @with_empty_base